@@ -1,5 +1,204 @@
+import asyncio
+import itertools
+import time
+
 import streamlit as st
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+
+from utils.clients import key_fingerprint
+from utils.corpus import format_passages, get_corpus
+from utils.documents import (
+    UPLOAD_TYPES,
+    WHOLE_DOCUMENT_MAX_BYTES,
+    format_chunks,
+    load_uploaded_document,
+    render_used_chunks,
+)
+from utils.llm_cache import make_key
+from utils.map_reduce import DEFAULT_CONCURRENCY, map_reduce
+from utils.metrics import log_metrics
+from utils.singleflight import llm_flight
+from utils.tokens import (
+    count_tokens,
+    fit_sections,
+    log_prompt_tokens,
+    prompt_budget,
+    truncate_tokens,
+)
+
+# Map-reduce answers: section size per map prompt, and a cap on map calls per question
+MAP_SECTION_CHARS = 6000
+MAX_MAP_SECTIONS = 200
+# Tokens of the fixed instructions wrapped around the document text and question
+PROMPT_OVERHEAD_TOKENS = 50
+
+
+def context_budget(question):
+    """
+    Return the tokens left for document text once the question is accounted for.
+    """
+    return prompt_budget("gpt-3.5-turbo", reserved=count_tokens(question) + PROMPT_OVERHEAD_TOKENS)
+
+
+def answer_with_map_reduce(document_index, question, concurrency):
+    """
+    Answer a question over the whole document with parallel map-reduce.
+
+    Every section is answered on its own with at most `concurrency` requests in
+    flight, then the partial answers are combined hierarchically. Progress and
+    partial answers are shown while the calls complete. Sections whose request
+    fails (after the client's own retries) are skipped and listed.
+    """
+    sections = list(
+        itertools.islice(document_index.iter_sections(MAP_SECTION_CHARS), MAX_MAP_SECTIONS + 1)
+    )
+    if not sections:
+        st.info("The document has no text to answer from.")
+        return
+    if len(sections) > MAX_MAP_SECTIONS:
+        st.warning(f"Only the first {MAX_MAP_SECTIONS} sections are used.")
+        sections = sections[:MAX_MAP_SECTIONS]
+
+    progress = st.progress(0.0, text="Reading the document...")
+    partial_answers = st.expander("Partial answers")
+
+    def on_progress(stage, done, total, index, result):
+        progress.progress(done / total, text=f"{stage}: {done}/{total}")
+        if stage == "map":
+            partial_answers.markdown(f"**Part {index + 1}**\n\n{result}")
+
+    skipped = []
+
+    def on_map_error(index, error):
+        skipped.append(index)
+        partial_answers.markdown(f"**Part {index + 1}** failed: {error}")
+
+    async def run():
+        async with AsyncOpenAI(api_key=openai_api_key) as async_client:
+
+            async def complete(content):
+                response = await async_client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=[{"role": "user", "content": content}],
+                )
+                return response.choices[0].message.content
+
+            async def map_section(index, section):
+                return await complete(
+                    f"Here's part {index + 1} of {len(sections)} of a document: {section} "
+                    f"\n\n---\n\n Using only this part, {question}"
+                )
+
+            async def reduce_answers(partials):
+                joined = "\n\n".join(f"- {partial}" for partial in partials)
+                return await complete(
+                    f"Here are answers to the same question, each based on a different part "
+                    f"of one document:\n\n{joined} \n\n---\n\n Combine them into one answer to: {question}"
+                )
+
+            return await map_reduce(
+                sections,
+                map_section,
+                reduce_answers,
+                concurrency=concurrency,
+                on_progress=on_progress,
+                on_map_error=on_map_error,
+            )
+
+    started = time.perf_counter()
+    try:
+        answer = asyncio.run(run())
+    except Exception as e:
+        progress.empty()
+        st.error(f"Could not combine the partial answers: {e}")
+        return
+    elapsed = time.perf_counter() - started
+    progress.empty()
+    if answer is None:
+        st.error("Every section failed; no answer could be made.")
+    else:
+        st.write(answer)
+    if skipped:
+        parts = ", ".join(str(index + 1) for index in sorted(skipped))
+        st.warning(f"Skipped {len(skipped)} of {len(sections)} sections that failed: {parts}.")
+    st.caption(f"{len(sections)} sections · {concurrency} in parallel · {elapsed:.1f}s")
+    log_metrics(
+        "map_reduce_answer",
+        sections=len(sections),
+        skipped_sections=len(skipped),
+        concurrency=concurrency,
+        total_latency=round(elapsed, 4),
+    )
+
+
+def answer_from_corpus(client):
+    """
+    Answer questions over every document ingested into the persistent corpus.
+
+    Uploaded documents are indexed once; re-uploading a changed document only
+    re-indexes that document, and identical content is skipped.
+    """
+    corpus = get_corpus()
+    uploaded_files = st.file_uploader(
+        "Add documents to the corpus", type=UPLOAD_TYPES, accept_multiple_files=True
+    )
+    if uploaded_files and st.button("Ingest"):
+        with st.spinner("Indexing documents..."):
+            for uploaded_file in uploaded_files:
+                status = corpus.ingest(uploaded_file.name, uploaded_file)
+                st.write(f"`{uploaded_file.name}`: {status}")
+
+    documents = corpus.documents()
+    with st.expander(f"{len(documents)} documents in the corpus"):
+        st.dataframe(documents, use_container_width=True)
+
+    top_k = st.slider("Passages to send", 1, 10, 4)
+    question = st.text_area(
+        "Now ask a question about the documents!",
+        placeholder="How do I reset my password?",
+        disabled=not documents,
+    )
+    if not question:
+        return
+
+    started = time.perf_counter()
+    hits = corpus.search(question, k=top_k)
+    search_ms = (time.perf_counter() - started) * 1000
+    if not hits:
+        st.info("No passage in the corpus matches this question.")
+        return
+    # Lower-ranked passages are trimmed first when they exceed the context window
+    budget = context_budget(question)
+    texts, _ = fit_sections([(hit["text"], hit["score"]) for hit in hits], budget)
+    hits = [{**hit, "text": text} for hit, text in zip(hits, texts) if text]
+    passages = st.expander(f"Used {len(hits)} passages · searched in {search_ms:.0f} ms")
+    for hit in hits:
+        passages.markdown(
+            f"**{hit['document']}** · chunk {hit['chunk_no'] + 1} · score {hit['score']:.2f}"
+        )
+        passages.text(hit["text"])
+
+    messages = [
+        {
+            "role": "user",
+            "content": (
+                f"Here are the passages from our documents most relevant to the question:\n\n"
+                f"{format_passages(hits)} \n\n---\n\n {question}"
+            ),
+        }
+    ]
+    log_prompt_tokens("corpus_qa_prompt", "gpt-3.5-turbo", messages, budget)
+    # Only sessions using the same API key share a request (and its errors)
+    stream = llm_flight.do_stream(
+        f"{key_fingerprint(client.api_key)}:{make_key('gpt-3.5-turbo', messages)}",
+        lambda: client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=messages,
+            stream=True,
+        ),
+    )
+    st.write_stream(stream)
+
 
 # Show title and description.
 st.title("📄 Document question answering")
@@ -19,10 +218,30 @@ else:
     # Create an OpenAI client.
     client = OpenAI(api_key=openai_api_key)
 
+    # The corpus keeps documents indexed across sessions, for questions over many files.
+    source = st.radio("Documents", ("Single upload", "Corpus"), horizontal=True)
+    if source == "Corpus":
+        answer_from_corpus(client)
+        st.stop()
+
     # Let the user upload a file via `st.file_uploader`.
     uploaded_file = st.file_uploader(
-        "Upload a document (.txt or .md)", type=("txt", "md")
+        "Upload a document (.txt, .md, .log, ...)", type=UPLOAD_TYPES
+    )
+
+    # Retrieval sends only the chunks relevant to the question, so prompt size
+    # stays flat as documents grow.
+    # Map-reduce reads the whole document in parallel, for summaries of long documents.
+    answer_mode = st.radio(
+        "Answer mode",
+        ("Relevant chunks", "Whole document", "Map-reduce"),
+        horizontal=True,
+        disabled=not uploaded_file,
     )
+    if answer_mode == "Map-reduce":
+        concurrency = st.slider("Parallel requests", 1, 16, DEFAULT_CONCURRENCY)
+    else:
+        top_k = st.slider("Chunks to send", 1, 10, 4, disabled=answer_mode != "Relevant chunks")
 
     # Ask the user for a question via `st.text_area`.
     question = st.text_area(
@@ -34,20 +253,49 @@ else:
     if uploaded_file and question:
 
         # Process the uploaded file and question.
-        document = uploaded_file.read().decode()
-        messages = [
-            {
-                "role": "user",
-                "content": f"Here's a document: {document} \n\n---\n\n {question}",
-            }
-        ]
-
-        # Generate an answer using the OpenAI API.
-        stream = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            stream=True,
-        )
+        document_index = load_uploaded_document(uploaded_file)
+        if answer_mode == "Map-reduce":
+            answer_with_map_reduce(document_index, question, concurrency)
+        else:
+            if (
+                answer_mode == "Whole document"
+                and document_index.size_bytes > WHOLE_DOCUMENT_MAX_BYTES
+            ):
+                st.warning("This document is too large to send whole; using the relevant chunks.")
+                answer_mode = "Relevant chunks"
+            budget = context_budget(question)
+            if answer_mode == "Relevant chunks":
+                hits = document_index.search(question, k=top_k)
+                # Lower-scoring chunks are trimmed first when they exceed the context window
+                chunks, _ = fit_sections([(chunk, score) for _, chunk, score in hits], budget)
+                hits = [
+                    (chunk_no, chunk, score)
+                    for (chunk_no, _, score), chunk in zip(hits, chunks)
+                    if chunk
+                ]
+                render_used_chunks(st, hits, len(document_index))
+                content = (
+                    f"Here are the parts of a document most relevant to the question:\n\n"
+                    f"{format_chunks(hits)} \n\n---\n\n {question}"
+                )
+            else:
+                text = truncate_tokens(document_index.text, budget)
+                if len(text) < len(document_index.text):
+                    st.warning("The document was cut to fit the model's context window.")
+                content = f"Here's a document: {text} \n\n---\n\n {question}"
+            messages = [{"role": "user", "content": content}]
+            log_prompt_tokens("document_qa_prompt", "gpt-3.5-turbo", messages, budget)
+
+            # Generate an answer using the OpenAI API. Identical in-flight questions
+            # from other sessions with the same API key share the same upstream stream.
+            stream = llm_flight.do_stream(
+                f"{key_fingerprint(openai_api_key)}:{make_key('gpt-3.5-turbo', messages)}",
+                lambda: client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=messages,
+                    stream=True,
+                ),
+            )
 
-        # Stream the response to the app using `st.write_stream`.
-        st.write_stream(stream)
+            # Stream the response to the app using `st.write_stream`.
+            st.write_stream(stream)
@@ -1,16 +1,46 @@
+import time
+
 import streamlit as st
 import anthropic
 
+from utils.clients import key_fingerprint
+from utils.documents import (
+    DEFAULT_TOP_K,
+    UPLOAD_TYPES,
+    WHOLE_DOCUMENT_MAX_BYTES,
+    format_chunks,
+    load_uploaded_document,
+    render_used_chunks,
+)
+from utils.llm_cache import make_key
+from utils.metrics import StreamTimer, iter_anthropic_text, log_metrics, tokens_per_second
+from utils.singleflight import llm_flight, render_flight_stats
+
 with st.sidebar:
     anthropic_api_key = st.text_input(
         "Anthropic API Key", key="file_qa_api_key", type="password"
     )
     "[View the source code](https://github.com/streamlit/llm-examples/blob/main/pages/1_File_Q%26A.py)"
     "[![Open in GitHub Codespaces](https://github.com/codespaces/badge.svg)](https://codespaces.new/streamlit/llm-examples?quickstart=1)"
+    render_flight_stats(st.sidebar)
+    stream_answer = st.checkbox("Stream the answer", value=True)
+    max_tokens = st.slider("Max answer tokens", 50, 1000, 300, step=50)
+
+
+@st.cache_resource(max_entries=16)
+def get_anthropic_client(api_key):
+    # One client (and HTTP connection pool) per API key, reused across reruns
+    return anthropic.Client(api_key=api_key)
 
 
 st.title("📝 File Q&A with Anthropic")
-uploaded_file = st.file_uploader("Upload an article", type=("txt", "md"))
+uploaded_file = st.file_uploader("Upload an article", type=UPLOAD_TYPES)
+answer_mode = st.radio(
+    "Answer mode",
+    ("Relevant chunks", "Whole article"),
+    horizontal=True,
+    disabled=not uploaded_file,
+)
 question = st.text_input(
     "Ask something about the article",
     placeholder="Can you give me a short summary?",
@@ -22,16 +52,64 @@ if uploaded_file and question and not anthropic_api_key:
     st.info("Please add your Anthropic API key to continue.")
 
 if uploaded_file and question and anthropic_api_key:
-    article = uploaded_file.read().decode()
+    article_index = load_uploaded_document(uploaded_file)
+    if (
+        answer_mode == "Whole article"
+        and article_index.size_bytes > WHOLE_DOCUMENT_MAX_BYTES
+    ):
+        st.warning("This article is too large to send whole; using the relevant chunks.")
+        answer_mode = "Relevant chunks"
+    if answer_mode == "Relevant chunks":
+        # Send only the chunks relevant to the question instead of the whole article
+        hits = article_index.search(question, k=DEFAULT_TOP_K)
+        render_used_chunks(st, hits, len(article_index))
+        article = format_chunks(hits)
+    else:
+        article = article_index.text
     prompt = f"""{anthropic.HUMAN_PROMPT} Here's an article:\n\n<article>
     {article}\n\n</article>\n\n{question}{anthropic.AI_PROMPT}"""
 
-    client = anthropic.Client(api_key=anthropic_api_key)
-    response = client.completions.create(
-        prompt=prompt,
-        stop_sequences=[anthropic.HUMAN_PROMPT],
-        model="claude-v1",  # "claude-2" for Claude 2 model
-        max_tokens_to_sample=100,
-    )
+    client = get_anthropic_client(anthropic_api_key)
+    params = {
+        "stop_sequences": [anthropic.HUMAN_PROMPT],
+        "model": "claude-v1",  # "claude-2" for Claude 2 model
+        "max_tokens_to_sample": max_tokens,
+    }
+    key = make_key(params["model"], [{"role": "user", "content": prompt}], **params)
+    # Only sessions using the same API key share a request (and its errors)
+    key = f"{key_fingerprint(anthropic_api_key)}:{key}"
     st.write("### Answer")
-    st.write(response.completion)
+    started = time.perf_counter()
+    # Identical questions about the same article share one in-flight request
+    if stream_answer:
+        stream = llm_flight.do_stream(
+            key, lambda: client.completions.create(prompt=prompt, stream=True, **params)
+        )
+        usage = {}
+        timer = StreamTimer(iter_anthropic_text(stream), started=started, usage=usage)
+        answer = st.write_stream(timer)
+        # Text completions report no usage; count the answer with the Claude tokenizer
+        usage["output_tokens"] = client.count_tokens(answer)
+        metrics = timer.metrics
+    else:
+        response = llm_flight.do(
+            key, lambda: client.completions.create(prompt=prompt, **params)
+        )
+        st.write(response.completion)
+        elapsed = round(time.perf_counter() - started, 4)
+        output_tokens = client.count_tokens(response.completion)
+        metrics = {
+            "time_to_first_token": elapsed,
+            "total_latency": elapsed,
+            "output_tokens": output_tokens,
+            # Without a stream the generation time includes the wait for the first token
+            "tokens_per_second": tokens_per_second(output_tokens, elapsed),
+        }
+
+    log_metrics("file_qa_answer", model=params["model"], stream=stream_answer, **metrics)
+    rate = metrics["tokens_per_second"]
+    st.caption(
+        f"First token {metrics['time_to_first_token']:.2f}s · "
+        f"total {metrics['total_latency']:.2f}s"
+        + (f" · {metrics['output_tokens']} tokens, {rate:.1f} tokens/s" if rate else "")
+    )
@@ -1,9 +1,36 @@
+import time
+
 import streamlit as st
 
 from langchain.agents import initialize_agent, AgentType
 from langchain.callbacks import StreamlitCallbackHandler
-from langchain.chat_models import ChatOpenAI
-from langchain.tools import DuckDuckGoSearchRun
+
+from utils.chat_history import ChatHistory
+from utils.chat_view import render_chat_history
+from utils.clients import get_agent, get_chat_model, render_client_pool_stats
+from utils.metrics import log_metrics
+from utils.search import (
+    DEFAULT_SEARCH_BACKEND,
+    SEARCH_BACKENDS,
+    SearchStats,
+    search_tool,
+    track_search_stats,
+)
+from utils.session_store import load_conversation, render_session_stats, start_new_session
+from utils.tokens import fit_messages, log_prompt_tokens, prompt_budget
+
+# Tokens taken by the agent's own instructions, tool descriptions and scratchpad
+AGENT_SCAFFOLD_TOKENS = 2000
+
+
+def build_search_agent(llm, backend):
+    return initialize_agent(
+        [search_tool(backend)],
+        llm,
+        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+        handle_parsing_errors=True,
+    )
+
 
 with st.sidebar:
     openai_api_key = st.text_input(
@@ -12,6 +39,23 @@ with st.sidebar:
     "[Get an OpenAI API key](https://platform.openai.com/account/api-keys)"
     "[View the source code](https://github.com/streamlit/llm-examples/blob/main/pages/2_Chat_with_search.py)"
     "[![Open in GitHub Codespaces](https://github.com/codespaces/badge.svg)](https://codespaces.new/streamlit/llm-examples?quickstart=1)"
+    # Older turns are folded into a summary written in the background after each answer
+    summarize_history = st.checkbox(
+        "Summarize older turns", key="search_summarize_history", value=True
+    )
+    # "fixture" answers from a local corpus, for offline runs and tests
+    search_backend = st.selectbox(
+        "Search backend",
+        SEARCH_BACKENDS,
+        index=SEARCH_BACKENDS.index(DEFAULT_SEARCH_BACKEND),
+        key="search_backend",
+    )
+    # Conversations are kept on disk, so a reload with the same URL restores them
+    if st.button("New chat", key="search_new_chat"):
+        start_new_session()
+        st.rerun()
+    render_client_pool_stats(st.sidebar)
+    render_session_stats(st.sidebar)
 
 st.title("🔎 LangChain - Chat with search")
 
@@ -20,37 +64,81 @@ In this example, we're using `StreamlitCallbackHandler` to display the thoughts
 Try more LangChain 🤝 Streamlit Agent examples at [github.com/langchain-ai/streamlit-agent](https://github.com/langchain-ai/streamlit-agent).
 """
 
-if "messages" not in st.session_state:
-    st.session_state["messages"] = [
+messages = load_conversation("chat_with_search")
+if not messages:
+    messages.append(
         {
             "role": "assistant",
             "content": "Hi, I'm a chatbot who can search the web. How can I help you?",
         }
-    ]
+    )
+# The summary belongs to one conversation; "New chat" starts a fresh one
+history_key = f"search_history_{messages.conversation_id}"
+if history_key not in st.session_state:
+    st.session_state[history_key] = ChatHistory()
+stats_key = f"search_stats_{messages.conversation_id}"
+if stats_key not in st.session_state:
+    st.session_state[stats_key] = SearchStats()
+search_stats = st.session_state[stats_key]
 
-for msg in st.session_state.messages:
-    st.chat_message(msg["role"]).write(msg["content"])
+# Only the latest messages are rendered; older ones load on demand
+render_chat_history(messages, key=f"search_chat_view_{messages.conversation_id}")
 
 if prompt := st.chat_input(placeholder="Who won the Women's U.S. Open in 2018?"):
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    messages.append({"role": "user", "content": prompt})
     st.chat_message("user").write(prompt)
 
     if not openai_api_key:
         st.info("Please add your OpenAI API key to continue.")
         st.stop()
 
-    llm = ChatOpenAI(
-        model_name="gpt-3.5-turbo", openai_api_key=openai_api_key, streaming=True
-    )
-    search = DuckDuckGoSearchRun(name="Search")
-    search_agent = initialize_agent(
-        [search],
-        llm,
-        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-        handle_parsing_errors=True,
+    # Built once per API key and shared by every session; callbacks are per run
+    llm = get_chat_model(openai_api_key, "gpt-3.5-turbo", streaming=True)
+    search_agent = get_agent(
+        f"search_{search_backend}",
+        openai_api_key,
+        "gpt-3.5-turbo",
+        lambda chat_model: build_search_agent(chat_model, search_backend),
+        streaming=True,
     )
     with st.chat_message("assistant"):
         st_cb = StreamlitCallbackHandler(st.container(), expand_new_thoughts=False)
-        response = search_agent.run(st.session_state.messages, callbacks=[st_cb])
-        st.session_state.messages.append({"role": "assistant", "content": response})
+        history = st.session_state[history_key]
+        context = history.context(messages) if summarize_history else messages
+        # Older turns are dropped once the conversation outgrows the context window
+        budget = prompt_budget("gpt-3.5-turbo", reserved=AGENT_SCAFFOLD_TOKENS)
+        request_messages = fit_messages(context, budget)
+        prompt_tokens = log_prompt_tokens(
+            "chat_search_prompt", "gpt-3.5-turbo", request_messages, budget
+        )
+        started = time.perf_counter()
+        searches, search_seconds = search_stats.searches, search_stats.seconds
+        # Searches are cached across sessions; the stats stay per conversation
+        with track_search_stats(search_stats):
+            response = search_agent.run(request_messages, callbacks=[st_cb])
+        turn_latency = time.perf_counter() - started
+        log_metrics(
+            "chat_turn",
+            page="chat_with_search",
+            history="summary" if summarize_history else "full",
+            turn=len(messages) // 2,
+            prompt_tokens=prompt_tokens,
+            latency=round(turn_latency, 4),
+            searches=search_stats.searches - searches,
+            search_latency=round(search_stats.seconds - search_seconds, 4),
+            search_hit_rate=round(search_stats.hit_rate, 4),
+        )
+        messages.append({"role": "assistant", "content": response})
         st.write(response)
+        st.caption(f"{prompt_tokens} history tokens · {turn_latency:.2f}s")
+
+    if summarize_history:
+        history.schedule_summary(
+            messages, lambda prompt_messages: llm.invoke(prompt_messages).content
+        )
+
+if search_stats.searches:
+    st.sidebar.caption(
+        f"Searches this conversation: {search_stats.searches} · "
+        f"{search_stats.hit_rate:.0%} cached · {search_stats.seconds:.2f}s searching"
+    )
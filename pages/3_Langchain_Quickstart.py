@@ -1,17 +1,48 @@
 import streamlit as st
-from langchain.llms import OpenAI
+
+from utils.batch import render_batch_prompts
+from utils.clients import get_langchain_llm, key_fingerprint, render_client_pool_stats
+from utils.llm_cache import get_llm_cache, render_cache_stats
+
+# Answers are sampled at temperature 0.7, so reuse is an opt-in sidebar option and
+# short-lived; by default every user gets a fresh answer
+RESPONSE_CACHE_TTL = 60 * 60
 
 st.title("🦜🔗 Langchain Quickstart App")
 
 with st.sidebar:
     openai_api_key = st.text_input("OpenAI API Key", type="password")
     "[Get an OpenAI API key](https://platform.openai.com/account/api-keys)"
+    reuse_cached = st.checkbox("Reuse cached answers", value=False)
+    render_cache_stats(st.sidebar)
+    render_client_pool_stats(st.sidebar)
+
+
+def complete(input_text):
+    # Shared by every session using this key, so its connections stay warm
+    llm = get_langchain_llm(openai_api_key, temperature=0.7)
+    return get_llm_cache().get_or_call(
+        llm.model_name,
+        [{"role": "user", "content": input_text}],
+        lambda: llm(input_text),
+        ttl=RESPONSE_CACHE_TTL,
+        cache_nondeterministic=reuse_cached,
+        scope=key_fingerprint(openai_api_key),
+        temperature=llm.temperature,
+    )
 
 
 def generate_response(input_text):
-    llm = OpenAI(temperature=0.7, openai_api_key=openai_api_key)
-    st.info(llm(input_text))
+    st.info(complete(input_text))
+
 
+# Batch mode answers many prompts (lines or a CSV) concurrently
+mode = st.radio("Mode", ("Single prompt", "Batch"), horizontal=True)
+if mode == "Batch":
+    if not openai_api_key:
+        st.info("Please add your OpenAI API key to continue.")
+    render_batch_prompts(complete, key="quickstart_batch", disabled=not openai_api_key)
+    st.stop()
 
 with st.form("my_form"):
     text = st.text_area(
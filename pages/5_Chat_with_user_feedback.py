@@ -1,7 +1,16 @@
-from openai import OpenAI
+import time
+
 import streamlit as st
 from streamlit_feedback import streamlit_feedback
-import trubrics
+
+from utils.chat_history import ChatHistory
+from utils.chat_view import render_chat_history
+from utils.clients import get_openai_client, key_fingerprint, render_client_pool_stats
+from utils.feedback_spool import get_feedback_spool, get_trubrics_uploader
+from utils.llm_cache import get_llm_cache, render_cache_stats
+from utils.metrics import log_metrics
+from utils.session_store import load_conversation, render_session_stats, start_new_session
+from utils.tokens import fit_messages, log_prompt_tokens, prompt_budget
 
 with st.sidebar:
     openai_api_key = st.text_input(
@@ -10,6 +19,18 @@ with st.sidebar:
     "[Get an OpenAI API key](https://platform.openai.com/account/api-keys)"
     "[View the source code](https://github.com/streamlit/llm-examples/blob/main/pages/5_Chat_with_user_feedback.py)"
     "[![Open in GitHub Codespaces](https://github.com/codespaces/badge.svg)](https://codespaces.new/streamlit/llm-examples?quickstart=1)"
+    # Older turns are folded into a summary written in the background after each answer
+    summarize_history = st.checkbox(
+        "Summarize older turns", key="feedback_summarize_history", value=True
+    )
+    render_cache_stats(st.sidebar)
+    # Conversations are kept on disk, so a reload with the same URL restores them
+    if st.button("New chat", key="feedback_new_chat"):
+        start_new_session()
+        st.session_state["response"] = None
+        st.rerun()
+    render_client_pool_stats(st.sidebar)
+    render_session_stats(st.sidebar)
 
 st.title("📝 Chat with feedback (Trubrics)")
 
@@ -18,19 +39,23 @@ In this example, we're using [streamlit-feedback](https://github.com/trubrics/st
 from the user about the LLM responses.
 """
 
-if "messages" not in st.session_state:
-    st.session_state.messages = [
+messages = load_conversation("chat_with_feedback")
+if not messages:
+    messages.append(
         {
             "role": "assistant",
             "content": "How can I help you? Leave feedback to help me improve!",
         }
-    ]
+    )
 if "response" not in st.session_state:
     st.session_state["response"] = None
+# The summary belongs to one conversation; "New chat" starts a fresh one
+history_key = f"feedback_history_{messages.conversation_id}"
+if history_key not in st.session_state:
+    st.session_state[history_key] = ChatHistory()
 
-messages = st.session_state.messages
-for msg in messages:
-    st.chat_message(msg["role"]).write(msg["content"])
+# Only the latest messages are rendered; older ones load on demand
+render_chat_history(messages, key=f"feedback_chat_view_{messages.conversation_id}")
 
 if prompt := st.chat_input(placeholder="Tell me a joke about sharks"):
     messages.append({"role": "user", "content": prompt})
@@ -39,12 +64,52 @@ if prompt := st.chat_input(placeholder="Tell me a joke about sharks"):
     if not openai_api_key:
         st.info("Please add your OpenAI API key to continue.")
         st.stop()
-    client = OpenAI(api_key=openai_api_key)
-    response = client.chat.completions.create(model="gpt-3.5-turbo", messages=messages)
-    st.session_state["response"] = response.choices[0].message.content
+    # Shared by every session using this key, so its connections stay warm
+    client = get_openai_client(openai_api_key)
+
+    history = st.session_state[history_key]
+    context = history.context(messages) if summarize_history else messages
+    # Older turns are dropped once the conversation outgrows the context window
+    budget = prompt_budget("gpt-3.5-turbo")
+    request_messages = fit_messages(context, budget)
+    prompt_tokens = log_prompt_tokens(
+        "chat_feedback_prompt", "gpt-3.5-turbo", request_messages, budget
+    )
+
+    def call():
+        response = client.chat.completions.create(
+            model="gpt-3.5-turbo", messages=request_messages
+        )
+        return response.choices[0].message.content
+
+    started = time.perf_counter()
+    # Replies are sampled, so the cache passes them through instead of replaying one
+    st.session_state["response"] = get_llm_cache().get_or_call(
+        "gpt-3.5-turbo", request_messages, call, scope=key_fingerprint(openai_api_key)
+    )
+    turn_latency = time.perf_counter() - started
+    log_metrics(
+        "chat_turn",
+        page="chat_with_feedback",
+        history="summary" if summarize_history else "full",
+        turn=len(messages) // 2,
+        prompt_tokens=prompt_tokens,
+        latency=round(turn_latency, 4),
+    )
     with st.chat_message("assistant"):
         messages.append({"role": "assistant", "content": st.session_state["response"]})
         st.write(st.session_state["response"])
+        st.caption(f"{prompt_tokens} prompt tokens · {turn_latency:.2f}s")
+
+    if summarize_history:
+
+        def summarize(prompt_messages):
+            response = client.chat.completions.create(
+                model="gpt-3.5-turbo", messages=prompt_messages
+            )
+            return response.choices[0].message.content
+
+        history.schedule_summary(messages, summarize)
 
 if st.session_state["response"]:
     feedback = streamlit_feedback(
@@ -55,16 +120,39 @@ if st.session_state["response"]:
     # This app is logging feedback to Trubrics backend, but you can send it anywhere.
     # The return value of streamlit_feedback() is just a dict.
     # Configure your own account at https://trubrics.streamlit.app/
-    if feedback and "TRUBRICS_EMAIL" in st.secrets:
-        config = trubrics.init(
-            email=st.secrets.TRUBRICS_EMAIL,
-            password=st.secrets.TRUBRICS_PASSWORD,
-        )
-        collection = trubrics.collect(
-            component_name="default",
-            model="gpt",
-            response=feedback,
-            metadata={"chat": messages},
+    # Feedback is spooled locally and uploaded by a background worker, so the
+    # page never waits on Trubrics. The component keeps returning the same
+    # value on reruns, so each feedback key is spooled once.
+    spooled = st.session_state.setdefault("spooled_feedback", set())
+    feedback_key = f"feedback_{len(messages)}"
+    if feedback and feedback_key not in spooled:
+        spooled.add(feedback_key)
+        # Only the rated turn; copying the whole conversation reads every older message
+        get_feedback_spool().append(
+            component="default", model="gpt", response=feedback, metadata={"chat": messages[-2:]}
         )
-        trubrics.save(config, collection)
+        try:
+            upload = "TRUBRICS_EMAIL" in st.secrets
+        except FileNotFoundError:
+            # No secrets.toml: the feedback stays in the local spool
+            upload = False
+        if upload:
+            get_trubrics_uploader(
+                st.secrets.TRUBRICS_EMAIL,
+                st.secrets.TRUBRICS_PASSWORD,
+                st.secrets.get("TRUBRICS_PROJECT", "default"),
+            ).notify()
         st.toast("Feedback recorded!", icon="📝")
+
+with st.expander("Feedback summary"):
+    summary = get_feedback_spool().summary()
+    columns = st.columns(len(summary["scores"]) or 1)
+    for column, (score, count) in zip(columns, summary["scores"].items()):
+        column.metric(score or "No score", count)
+    st.caption(
+        f"Uploaded {summary['uploaded']} · pending {summary['pending']} · "
+        f"failed {summary['failed']}"
+    )
+    recent = get_feedback_spool().recent()
+    if recent:
+        st.dataframe(recent, use_container_width=True)
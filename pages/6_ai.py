@@ -1,12 +1,30 @@
 import streamlit as st
 import json
+import time
 import openai
 
+from utils.bm25 import BM25Index
+from utils.clients import key_fingerprint
+from utils.llm_cache import get_llm_cache, make_key, render_cache_stats
+from utils.metrics import StreamTimer, iter_openai_text, log_metrics
+from utils.session_store import load_conversation, start_new_session
+from utils.singleflight import llm_flight, render_flight_stats
+from utils.tokens import fit_sections, log_prompt_tokens, prompt_budget
+
 # Ensure that you have set your OpenAI API key appropriately
 # You can set it via the openai.api_key variable, or set the OPENAI_API_KEY environment variable
 # Example: openai.api_key = 'your-api-key'
 # Do not include your API key directly in the code for security reasons
 
+# Retrieval settings: the first evaluation sees at most CANDIDATE_POOL_SIZE products,
+# and the pool halves every round until MIN_CANDIDATES remain.
+CANDIDATE_POOL_SIZE = 20
+MIN_CANDIDATES = 3
+MAX_DESCRIPTION_CHARS = 300
+
+# Tokens of the fixed instructions around the measured prompt sections
+PROMPT_OVERHEAD_TOKENS = 200
+
 
 def load_products():
     """
@@ -20,41 +38,208 @@ def load_products():
     return products
 
 
-def initialize_session_state(products):
+@st.cache_resource
+def load_product_catalog():
     """
-    Initialize session state variables.
+    Load the product catalog and build a BM25 index over it once per process.
 
-    Args:
+    Returns:
         products (list): List of product dictionaries.
+        product_index (BM25Index): Index whose doc ids are positions in `products`.
+    """
+    products = load_products()
+    product_index = BM25Index()
+    for product in products:
+        product_index.add(f"{product['name']}\n{product['description']}")
+    return products, product_index
+
+
+@st.cache_resource
+def get_openai_client():
+    """
+    Create one OpenAI client per process from openai.api_key or OPENAI_API_KEY.
+
+    Returns:
+        client (openai.OpenAI): Shared OpenAI client.
+    """
+    return openai.OpenAI(api_key=openai.api_key)
+
+
+def create_json_completion(messages, **params):
+    """
+    Request a JSON answer from OpenAI's API through the shared response cache.
+
+    Questions and scores are sampled, so every user gets a fresh answer and the
+    cache only counts them as bypassed. The response is parsed before any caching,
+    so malformed output is never reused.
+
+    Args:
+        messages (list): Chat messages.
+        **params: Parameters passed to `chat.completions.create`.
+
+    Returns:
+        output (dict): The parsed JSON response.
+    """
+
+    client = get_openai_client()
+
+    def call():
+        response = client.chat.completions.create(model="gpt-4", messages=messages, **params)
+        return json.loads(response.choices[0].message.content)
+
+    return get_llm_cache().get_or_call(
+        "gpt-4", messages, call, scope=key_fingerprint(client.api_key), **params
+    )
+
+
+def initialize_session_state():
+    """
+    Initialize session state variables.
     """
     if "qa_history" not in st.session_state:
-        st.session_state.qa_history = []
+        # Persisted per session id in the URL, so a reload keeps the answers
+        st.session_state.qa_history = load_conversation("recommender")
+        # Scores after every answer and the final result, so a reload does not
+        # pay for the evaluation again
+        st.session_state.recommendation_progress = load_conversation("recommender_progress")
+    if "candidates" not in st.session_state:
+        # None means the whole catalog is still in play
+        st.session_state.candidates = None
     if "recommendation_score" not in st.session_state:
-        # Initialize recommendation scores for each product
-        st.session_state.recommendation_score = {
-            product["name"]: 0 for product in products
-        }
+        # Scores are only kept for the current candidates
+        st.session_state.recommendation_score = {}
     if "question_count" not in st.session_state:
-        st.session_state.question_count = 0
+        st.session_state.question_count = len(st.session_state.qa_history)
     if "finished" not in st.session_state:
         st.session_state.finished = False
 
 
-def evaluate_recommendation(qa_history, products):
+def reset_recommendation():
+    """
+    Start over with a new session; the finished one stays on disk.
+    """
+    start_new_session()
+    for key in (
+        "qa_history",
+        "recommendation_progress",
+        "candidates",
+        "recommendation_score",
+        "question_count",
+        "finished",
+        "final_recommendation",
+    ):
+        st.session_state.pop(key, None)
+
+
+def save_progress():
+    """
+    Record the scores, candidates and final result after the current answer.
     """
-    Evaluate the recommendation scores for each product using OpenAI's API.
+    st.session_state.recommendation_progress.append(
+        {
+            "round": len(st.session_state.qa_history),
+            "candidates": st.session_state.candidates,
+            "scores": dict(st.session_state.recommendation_score),
+            "finished": st.session_state.finished,
+            "final_recommendation": st.session_state.get("final_recommendation"),
+        }
+    )
+
+
+def restore_progress(qa_history, products, product_index):
+    """
+    Restore the state of a reloaded session.
+
+    Uses the progress saved after the last answer, and only evaluates again for
+    sessions saved before progress was recorded.
+
+    Args:
+        qa_history (list): Restored question-answer history.
+        products (list): List of product dictionaries.
+        product_index (BM25Index): Index built by `load_product_catalog`.
+    """
+    progress = st.session_state.recommendation_progress
+    saved = progress[-1] if len(progress) else None
+    if saved is not None and saved["round"] == len(qa_history):
+        st.session_state.candidates = saved["candidates"]
+        st.session_state.recommendation_score = saved["scores"]
+        st.session_state.finished = saved["finished"]
+        if saved["final_recommendation"]:
+            st.session_state.final_recommendation = saved["final_recommendation"]
+        return
+    evaluate_recommendation(qa_history, products, product_index)
+    if (
+        st.session_state.question_count >= 5
+        or max(st.session_state.recommendation_score.values(), default=0) >= 5
+    ):
+        st.session_state.finished = True
+    save_progress()
+
+
+def select_candidates(qa_history, products, product_index):
+    """
+    Narrow the candidate pool to the products most relevant to the QA history.
+
+    The pool shrinks every round, so the evaluation prompt stays bounded no matter
+    how large the catalog is.
+
+    Args:
+        qa_history (list): List of dictionaries containing previous questions and answers.
+        products (list): List of product dictionaries.
+        product_index (BM25Index): Index built by `load_product_catalog`.
+
+    Returns:
+        candidates (list): Positions in `products` of the selected candidates, best first.
+    """
+    pool = st.session_state.candidates
+    if pool is None:
+        pool = range(len(products))
+    k = max(MIN_CANDIDATES, CANDIDATE_POOL_SIZE >> max(len(qa_history) - 1, 0))
+
+    query = "\n".join(f"{qa['question']} {qa['answer']}" for qa in qa_history)
+    hits = product_index.search(query, k=k, candidates=set(pool))
+
+    # Keep the products the model already favours, even if their descriptions
+    # do not share keywords with the latest answer.
+    scores = st.session_state.recommendation_score
+    leaders = sorted(
+        (i for i in pool if scores.get(products[i]["name"], 0) > 0),
+        key=lambda i: scores[products[i]["name"]],
+        reverse=True,
+    )[: k // 2]
+
+    candidates = []
+    for i in [*leaders, *(doc_id for doc_id, _ in hits), *pool]:
+        if i not in candidates:
+            candidates.append(i)
+        if len(candidates) >= k:
+            break
+    return candidates
+
+
+def evaluate_recommendation(qa_history, products, product_index):
+    """
+    Evaluate the recommendation scores for the top-k candidate products using OpenAI's API.
 
     Args:
         qa_history (list): List of dictionaries containing previous questions and answers.
         products (list): List of product dictionaries.
+        product_index (BM25Index): Index built by `load_product_catalog`.
     """
+    # Retrieve the candidates for this round and drop scores for everything else
+    candidates = select_candidates(qa_history, products, product_index)
+    st.session_state.candidates = candidates
+    candidate_products = [products[i] for i in candidates]
+    st.session_state.recommendation_score = {
+        p["name"]: st.session_state.recommendation_score.get(p["name"], 0)
+        for p in candidate_products
+    }
+
     # Construct product descriptions
-    product_descriptions = "\n".join(
-        [
-            f"Product Name: {p['name']}\nDescription: {p['description']}"
-            for p in products
-        ]
-    )
+    product_descriptions = [
+        f"Product Name: {p['name']}\nDescription: {p['description'][:MAX_DESCRIPTION_CHARS]}"
+        for p in candidate_products
+    ]
     # Construct QA history
     qa_history_str = "\n".join(
         [f"Q: {qa['question']}\nA: {qa['answer']}" for qa in qa_history]
@@ -67,6 +252,21 @@ def evaluate_recommendation(qa_history, products):
         ]
     )
 
+    # Fit the prompt in the context window: the weakest candidates' descriptions
+    # are trimmed first, the QA history last.
+    budget = prompt_budget("gpt-4", response_tokens=500, reserved=PROMPT_OVERHEAD_TOKENS)
+    texts, _ = fit_sections(
+        [
+            *((description, -rank) for rank, description in enumerate(product_descriptions)),
+            (recommendation_scores_str, 1),
+            (qa_history_str, 2),
+        ],
+        budget,
+        "gpt-4",
+    )
+    *product_descriptions, recommendation_scores_str, qa_history_str = texts
+    product_descriptions = "\n".join(text for text in product_descriptions if text)
+
     # Construct messages for OpenAI API
     messages = [
         {
@@ -89,20 +289,18 @@ def evaluate_recommendation(qa_history, products):
         },
     ]
 
+    log_prompt_tokens("recommendation_score_prompt", "gpt-4", messages, budget)
+
     # Call the OpenAI API
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=messages,
-            max_tokens=500,
-            temperature=0.5,
+        updated_scores = create_json_completion(
+            messages, max_tokens=500, temperature=0.5
         )
-        # Parse the response
-        updated_scores = json.loads(response["choices"][0]["message"]["content"])
 
-        # Update the recommendation scores
+        # Update the recommendation scores, ignoring products outside the candidates
         for product_name, score in updated_scores.items():
-            st.session_state.recommendation_score[product_name] = score
+            if product_name in st.session_state.recommendation_score:
+                st.session_state.recommendation_score[product_name] = score
     except Exception as e:
         st.error(f"Error in evaluating recommendation: {e}")
 
@@ -147,17 +345,18 @@ def generate_qa(qa_history, products):
         },
     ]
 
+    log_prompt_tokens(
+        "recommendation_question_prompt",
+        "gpt-4",
+        messages,
+        prompt_budget("gpt-4", response_tokens=500),
+    )
+
     # Call the OpenAI API
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=messages,
-            max_tokens=500,
-            temperature=0.7,
+        output = create_json_completion(
+            messages, max_tokens=500, temperature=0.7
         )
-        # Parse the response
-        content = response["choices"][0]["message"]["content"]
-        output = json.loads(content)
         question = output["question"]
         answers = output["answers"]
         return question, answers
@@ -179,7 +378,10 @@ def display_qa_history():
 
 def generate_final_recommendation(qa_history, products):
     """
-    Generate the final recommendation using OpenAI's API.
+    Stream the final recommendation from OpenAI's API to the page.
+
+    The reason is rendered token by token while it is generated, then cached in
+    session state together with its latency metrics so reruns do not call the API again.
 
     Args:
         qa_history (list): List of dictionaries containing previous questions and answers.
@@ -189,6 +391,10 @@ def generate_final_recommendation(qa_history, products):
         recommended_product_name (str): The name of the recommended product.
         reason (str): The reason for the recommendation.
     """
+    if not st.session_state.recommendation_score:
+        st.error("Recommended product not found.")
+        return None, None
+
     # Get the product with the highest recommendation score
     recommended_product_name = max(
         st.session_state.recommendation_score,
@@ -207,13 +413,17 @@ def generate_final_recommendation(qa_history, products):
     qa_history_str = "\n".join(
         [f"Q: {qa['question']}\nA: {qa['answer']}" for qa in qa_history]
     )
+    budget = prompt_budget("gpt-4", response_tokens=150, reserved=PROMPT_OVERHEAD_TOKENS)
+    (product_description, qa_history_str), _ = fit_sections(
+        [(product_description, 1), (qa_history_str, 0)], budget, "gpt-4"
+    )
 
     messages = [
         {
             "role": "system",
             "content": (
                 "You are an AI assistant that provides a final product recommendation to the user, along with a personalized reason based on their previous answers. "
-                "Provide the reason in JSON format without any additional explanation."
+                "Provide only the reason as plain text without any additional explanation."
             ),
         },
         {
@@ -221,51 +431,101 @@ def generate_final_recommendation(qa_history, products):
             "content": (
                 f"Recommended product:\n{product_description}\n\n"
                 f"User's previous question-answer history:\n{qa_history_str}\n\n"
-                "Provide a personalized recommendation reason to the user. "
-                'Output in the following JSON format:\n{\n  "reason": "Your personalized reason for the recommendation"\n}'
+                "Provide a personalized recommendation reason to the user."
             ),
         },
     ]
 
-    # Call the OpenAI API
+    log_prompt_tokens("final_recommendation_prompt", "gpt-4", messages, budget)
+
+    # Call the OpenAI API and stream the reason to the page
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=messages,
-            max_tokens=150,
-            temperature=0.7,
+        st.write(f"**추천 상품명:** {recommended_product_name}")
+        st.write("**이유:**")
+        params = {"max_tokens": 150, "temperature": 0.7}
+        started = time.perf_counter()
+        client = get_openai_client()
+        # Sessions finishing with the same history and API key share one upstream stream
+        stream = llm_flight.do_stream(
+            f"{key_fingerprint(client.api_key)}:{make_key('gpt-4', messages, **params)}",
+            lambda: client.chat.completions.create(
+                model="gpt-4",
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                **params,
+            ),
         )
-        # Parse the response
-        content = response["choices"][0]["message"]["content"]
-        output = json.loads(content)
-        reason = output["reason"]
-        return recommended_product_name, reason
+        usage = {}
+        timer = StreamTimer(iter_openai_text(stream, usage), started=started, usage=usage)
+        reason = st.write_stream(timer)
     except Exception as e:
         st.error(f"Error in generating final recommendation: {e}")
         return None, None
 
+    log_metrics("final_recommendation", model="gpt-4", **timer.metrics)
+    st.session_state.final_recommendation = {
+        "product_name": recommended_product_name,
+        "reason": reason,
+        "metrics": timer.metrics,
+    }
+    save_progress()
+    display_recommendation_metrics(timer.metrics)
+    return recommended_product_name, reason
+
+
+def display_final_recommendation():
+    """
+    Display the cached final recommendation.
+    """
+    final = st.session_state.final_recommendation
+    st.write(f"**추천 상품명:** {final['product_name']}")
+    st.write(f"**이유:** {final['reason']}")
+    display_recommendation_metrics(final["metrics"])
+
+
+def display_recommendation_metrics(metrics):
+    """
+    Display the latency of the final recommendation.
+
+    Args:
+        metrics (dict): Metrics recorded by `StreamTimer`.
+    """
+    st.caption(
+        f"첫 토큰까지 {metrics['time_to_first_token']:.2f}초 · "
+        f"전체 {metrics['total_latency']:.2f}초"
+    )
+
 
 def main():
     """
     Main function to run the Streamlit app.
     """
     st.title("상품 추천 시스템")
+    # Answers are kept on disk, so a reload with the same URL restores them
+    if st.sidebar.button("새로 시작", key="recommender_restart"):
+        reset_recommendation()
+        st.rerun()
+    render_cache_stats(st.sidebar)
+    render_flight_stats(st.sidebar)
 
-    # Load products
-    products = load_products()
+    # Load products and the candidate index
+    products, product_index = load_product_catalog()
 
     # Initialize session state
-    initialize_session_state(products)
+    initialize_session_state()
+    if st.session_state.qa_history and not st.session_state.recommendation_score:
+        # Restored after a reload
+        restore_progress(st.session_state.qa_history, products, product_index)
 
     if st.session_state.finished:
         st.header("최종 추천 결과")
-        # Generate final recommendation
-        recommended_product_name, reason = generate_final_recommendation(
-            st.session_state.qa_history, products
-        )
-        if recommended_product_name and reason:
-            st.write(f"**추천 상품명:** {recommended_product_name}")
-            st.write(f"**이유:** {reason}")
+        if "final_recommendation" in st.session_state:
+            display_final_recommendation()
+        else:
+            # Generate final recommendation once; reruns reuse the cached result
+            generate_final_recommendation(st.session_state.qa_history, products)
+        if "final_recommendation" in st.session_state:
             # Display previous QA history
             display_qa_history()
     else:
@@ -274,7 +534,7 @@ def main():
 
         if st.session_state.question_count >= 5:
             st.session_state.finished = True
-            st.experimental_rerun()
+            st.rerun()
         else:
             # Generate question and answers
             question, answers = generate_qa(st.session_state.qa_history, products)
@@ -296,14 +556,17 @@ def main():
                     st.session_state.question_count += 1
 
                     # Evaluate recommendation
-                    evaluate_recommendation(st.session_state.qa_history, products)
+                    evaluate_recommendation(
+                        st.session_state.qa_history, products, product_index
+                    )
 
                     # Check if recommendation score exceeds threshold (e.g., 5)
                     if max(st.session_state.recommendation_score.values()) >= 5:
                         st.session_state.finished = True
+                    save_progress()
 
                     # Rerun to update the UI
-                    st.experimental_rerun()
+                    st.rerun()
             else:
                 st.error("질문을 생성하는 데 실패했습니다.")
 
@@ -2,11 +2,18 @@ import streamlit as st
 import openai
 import json
 
+from utils.clients import key_fingerprint
+from utils.llm_cache import get_llm_cache, render_cache_stats
+from utils.singleflight import render_flight_stats
+
 # OpenAI API 키 설정
 openai.api_key = 'YOUR_OPENAI_API_KEY'
 
 st.title("OpenAI Structured Output with Streamlit")
 
+render_cache_stats(st.sidebar)
+render_flight_stats(st.sidebar)
+
 st.sidebar.header("Function Definition")
 
 # 함수 이름 입력
@@ -56,19 +63,29 @@ if st.button("Generate Response"):
             {"role": "user", "content": user_prompt}
         ]
 
-        # OpenAI API 호출
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo-0613",  # 또는 사용 가능한 다른 모델
-            messages=messages,
+        # OpenAI API 호출 (기본 temperature로 샘플링하므로 캐시에서 재사용하지 않음)
+        def call():
+            response = openai.chat.completions.create(
+                model="gpt-3.5-turbo-0613",  # 또는 사용 가능한 다른 모델
+                messages=messages,
+                functions=functions,
+                function_call="auto"
+            )
+            return response.choices[0].message.model_dump(exclude_none=True)
+
+        response_message = get_llm_cache().get_or_call(
+            "gpt-3.5-turbo-0613",
+            messages,
+            call,
             functions=functions,
-            function_call="auto"
+            function_call="auto",
+            scope=key_fingerprint(openai.api_key),
         )
 
         # 응답 출력
-        response_message = response['choices'][0]['message']
 
         st.subheader("Assistant's Response:")
-        st.write(response_message['content'])
+        st.write(response_message.get('content'))
 
         if 'function_call' in response_message:
             st.subheader("Function Call:")
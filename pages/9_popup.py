@@ -1,6 +1,9 @@
 import streamlit as st
 from langchain.llms import OpenAI
 
+from utils.batch import render_batch_prompts
+from utils.clients import get_langchain_llm
+
 st.title("🦜🔗 Langchain Quickstart App")
 
 with st.sidebar:
@@ -13,6 +16,19 @@ def generate_response(input_text):
     st.info(llm(input_text))
 
 
+def complete(input_text):
+    # Pooled, so concurrent batch prompts share one client and its connections
+    return get_langchain_llm(openai_api_key, temperature=0.7)(input_text)
+
+
+# Batch mode answers many prompts (lines or a CSV) concurrently
+mode = st.radio("Mode", ("Single prompt", "Batch"), horizontal=True)
+if mode == "Batch":
+    if not openai_api_key:
+        st.info("Please add your OpenAI API key to continue.")
+    render_batch_prompts(complete, key="popup_batch", disabled=not openai_api_key)
+    st.stop()
+
 with st.form("my_form"):
     text = st.text_area(
         "Enter text:", "What are 3 key advice for learning how to code?"
@@ -1,7 +1,4 @@
-import yaml
 import streamlit as st
-from yaml.loader import SafeLoader
-import streamlit_authenticator as stauth
 from streamlit_authenticator.utilities import (
     CredentialsError,
     ForgotError,
@@ -12,6 +9,10 @@ from streamlit_authenticator.utilities import (
     UpdateError,
 )
 
+from utils.auth_config import get_auth_config, render_auth_config_stats
+from utils.credential_store import SQLiteAuthenticate, get_credential_store
+from utils.password_hashing import render_password_hash_stats
+
 # Show title and description.
 st.title("📄 Document question answering")
 st.write(
@@ -19,17 +20,22 @@ st.write(
     "To use this app, you need to provide an OpenAI API key, which you can get [here](https://platform.openai.com/account/api-keys). "
 )
 
-# Loading config file
-config_path = "config.yaml"
-with open(config_path, "r", encoding="utf-8") as file:
-    config = yaml.load(file, Loader=SafeLoader)
+# Loading config file once per process; every session shares it
+auth_config = get_auth_config("config.yaml")
+config = auth_config.get()
 
 # Hashing all plain text passwords once
 # Hasher.hash_passwords(config['credentials'])
 
+# Users live in an indexed SQLite table (data/credentials.sqlite3). The
+# `credentials` section of config.yaml is only a seed imported on the first start:
+# later sign-ups and password changes are not written back to it
+credential_store = get_credential_store()
+credential_store.migrate(auth_config.detach("credentials"))
+
 # Creating the authenticator object
-authenticator = stauth.Authenticate(
-    config["credentials"],
+authenticator = SQLiteAuthenticate(
+    credential_store,
     config["cookie"]["name"],
     config["cookie"]["key"],
     config["cookie"]["expiry_days"],
@@ -107,6 +113,7 @@ if st.session_state["authentication_status"]:
     except UpdateError as e:
         st.error(e)
 
-# Saving config file
-with open(config_path, "w", encoding="utf-8") as file:
-    yaml.dump(config, file, default_flow_style=False)
+# Saving config file, only when the authenticator changed it
+auth_config.save_if_changed()
+render_auth_config_stats(st.sidebar, auth_config)
+render_password_hash_stats(st.sidebar)
@@ -0,0 +1,290 @@
+"""인증 흐름 동시 세션 부하 테스트.
+
+Streamlit `AppTest` 세션 N개(기본 20개)를 동시에 띄워 가입 → 로그인 → 로그아웃 →
+공유 계정 로그인 실패 → 로그인 → 비밀번호 재설정 → 로그아웃 → 새 비밀번호로 로그인을
+단계별로 함께 실행합니다. 실제 설정 파일 대신 임시 디렉터리에 복사한 config.yaml을 사용합니다.
+
+AppTest는 한 프로세스에서 동시에 여러 개를 실행할 수 없어 세션마다 프로세스를 하나씩 띄우고,
+단계마다 모든 세션이 모인 뒤 함께 시작합니다. 그래서 프로세스별 캐시(설정, 해시 작업자 풀,
+로그인 실패 제한)는 세션마다 따로이고, 파일(config.yaml, SQLite)만 공유합니다.
+
+단계마다 지연 시간 p50/p95/최대, 오류 수, 작업 하나당 파일 I/O (쓰기·읽기 호출 수와 KB,
+/proc/self/io)를 보고하고, 끝나면 저장된 결과를 검사해 사라진 갱신(lost update)을 셉니다.
+
+- 가입한 사용자가 없거나 최종 비밀번호가 맞지 않으면 사라진 갱신
+- 공유 계정(jsmith)의 failed_login_attempts 증가분이 "틀림" 응답 수보다 적으면 그 차이만큼
+
+    python test/auth/auth_load_test.py --sessions 20
+    git show ae68de9:streamlit_app.py > /tmp/yaml_app.py && \\
+        python test/auth/auth_load_test.py --script /tmp/yaml_app.py   # 기존 config.yaml 방식과 비교
+"""
+
+import argparse
+import collections
+import multiprocessing
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+import bcrypt
+import yaml
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+
+from streamlit.logger import set_log_level
+from streamlit.testing.v1 import AppTest
+from streamlit_authenticator import params
+
+from utils.credential_store import CREDENTIAL_STORE_PATH, CredentialStore
+
+warnings.filterwarnings("ignore")
+SHARED_USER = "jsmith"
+PASSWORD = "First@Pass1"
+NEW_PASSWORD = "Second@Pass2"
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def read_io():
+    """이 프로세스의 누적 파일 I/O (Linux /proc/self/io). 없으면 빈 dict."""
+    try:
+        with open("/proc/self/io", encoding="ascii") as f:
+            return {key: int(value) for key, value in (line.split(": ") for line in f)}
+    except OSError:
+        return {}
+
+
+def text_input(at, form, label):
+    return next(w for w in at.text_input if w.form_id == form and w.label == label)
+
+
+def submit(at, form):
+    return next(w for w in at.button if w.form_id == form)
+
+
+def messages(at):
+    return [e.value for e in at.success] + [e.value for e in at.error]
+
+
+class Session:
+    """AppTest 세션 하나. 각 단계는 (성공 여부, 설명)을 돌려줍니다."""
+
+    def __init__(self, script, index, timeout):
+        self.index = index
+        self.username = f"load{index:04d}"
+        self.at = AppTest.from_file(script, default_timeout=timeout)
+        self.shared_denied = False
+
+    def open(self):
+        self.at.run()
+        return not self.at.exception, "page opened"
+
+    def register(self):
+        at = self.at
+        text_input(at, "Register user", "Name").input("Load Test User")
+        text_input(at, "Register user", "Email").input(f"{self.username}@example.com")
+        text_input(at, "Register user", "Username").input(self.username)
+        text_input(at, "Register user", "Password").input(PASSWORD)
+        text_input(at, "Register user", "Repeat password").input(PASSWORD)
+        text_input(at, "Register user", "Captcha").input(at.session_state["register_user_captcha"])
+        submit(at, "Register user").click().run()
+        return "User registered successfully" in messages(at), messages(at)
+
+    def login(self, username=None, password=PASSWORD):
+        at = self.at
+        text_input(at, "Login", "Username").input(username or self.username)
+        text_input(at, "Login", "Password").input(password)
+        submit(at, "Login").click().run()
+        return bool(at.session_state["authentication_status"]), messages(at)
+
+    def fail_shared_login(self):
+        ok, shown = self.login(SHARED_USER, "wrong password")
+        # Rate limiting ("Too many failed login attempts") does not count a failure
+        self.shared_denied = "Username/password is incorrect" in shown
+        return not ok, shown
+
+    def reset_password(self):
+        at = self.at
+        text_input(at, "Reset password", "Current password").input(PASSWORD)
+        text_input(at, "Reset password", "New password").input(NEW_PASSWORD)
+        text_input(at, "Reset password", "Repeat password").input(NEW_PASSWORD)
+        submit(at, "Reset password").click().run()
+        return "Password modified successfully" in messages(at), messages(at)
+
+    def logout(self):
+        next(w for w in self.at.button if w.label == "Logout").click().run()
+        # The login form was skipped in the run that logged out; it shows on the next one
+        self.at.run()
+        return self.at.session_state["authentication_status"] is None, messages(self.at)
+
+    def login_again(self):
+        return self.login(password=NEW_PASSWORD)
+
+
+PHASES = (
+    ("open", Session.open),
+    ("register", Session.register),
+    ("login", Session.login),
+    ("logout", Session.logout),
+    ("failed login", Session.fail_shared_login),
+    ("login", Session.login),
+    ("reset password", Session.reset_password),
+    ("logout", Session.logout),
+    ("login new password", Session.login_again),
+)
+
+
+def run_session(index, script, timeout, login_sleep, barrier, results):
+    """세션 프로세스 하나: 단계마다 모든 세션을 기다렸다가 실행하고 기록을 보냅니다."""
+    params.LOGIN_SLEEP_TIME = login_sleep
+    set_log_level("error")
+    session = Session(script, index, timeout)
+    records = []
+    for _, step in PHASES:
+        try:
+            barrier.wait(timeout * 2)
+        except threading.BrokenBarrierError:
+            records.append((0.0, False, "another session stopped", {}))
+            continue
+        io_before = read_io()
+        started = time.perf_counter()
+        try:
+            ok, detail = step(session)
+            if session.at.exception:
+                ok, detail = False, session.at.exception[0].message
+        except Exception as e:
+            ok, detail = False, repr(e)
+        latency = time.perf_counter() - started
+        io_after = read_io()
+        io = {key: io_after[key] - io_before.get(key, 0) for key in io_after}
+        records.append((latency, ok, str(detail), io))
+    results.put((index, records, session.shared_denied))
+
+
+def run_sessions(args, script):
+    """세션 프로세스를 모두 띄우고, 세션별 (단계 기록, 공유 계정 거절 여부)를 돌려줍니다."""
+    barrier = multiprocessing.Barrier(args.sessions)
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=run_session,
+            args=(i, script, args.timeout, args.login_sleep, barrier, results),
+        )
+        for i in range(args.sessions)
+    ]
+    for process in processes:
+        process.start()
+    collected = {}
+    while len(collected) < len(processes):
+        try:
+            index, records, shared_denied = results.get(timeout=5)
+            collected[index] = (records, shared_denied)
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                break
+    for process in processes:
+        process.join()
+    failed = [(0.0, False, "session process died", {})] * len(PHASES)
+    return [collected.get(i, (failed, False)) for i in range(args.sessions)]
+
+
+def stored_users():
+    """가입·갱신 결과가 실제로 저장된 곳에서 사용자를 읽습니다."""
+    if os.path.exists(CREDENTIAL_STORE_PATH):
+        store = CredentialStore(CREDENTIAL_STORE_PATH)
+        return lambda username: store.get_user(username)
+    with open("config.yaml", "r", encoding="utf-8") as f:
+        usernames = yaml.safe_load(f)["credentials"]["usernames"]
+    return usernames.get
+
+
+def count_lost_updates(sessions, shared_failures_before):
+    """세션별 (단계 기록, 공유 계정 거절 여부)로 사라진 갱신을 셉니다."""
+    lookup = stored_users()
+    lost_users = 0
+    lost_passwords = 0
+    for index in range(len(sessions)):
+        user = lookup(f"load{index:04d}")
+        if user is None:
+            lost_users += 1
+        elif not bcrypt.checkpw(NEW_PASSWORD.encode(), user["password"].encode()):
+            lost_passwords += 1
+    expected = sum(shared_denied for _, shared_denied in sessions)
+    shared = lookup(SHARED_USER) or {}
+    counted = (shared.get("failed_login_attempts") or 0) - shared_failures_before
+    return {
+        "missing users": lost_users,
+        "stale passwords": lost_passwords,
+        "lost failed-attempt increments": max(expected - counted, 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sessions", type=int, default=20, help="동시 세션 수")
+    parser.add_argument(
+        "--script", default=os.path.join(REPO_ROOT, "streamlit_app.py"), help="테스트할 앱 스크립트"
+    )
+    parser.add_argument("--config", default=os.path.join(REPO_ROOT, "config.yaml"))
+    parser.add_argument(
+        "--login-sleep",
+        type=float,
+        default=params.LOGIN_SLEEP_TIME,
+        help="로그인 위젯이 실행마다 기다리는 시간 (초, streamlit-authenticator 기본값 1초)",
+    )
+    parser.add_argument("--timeout", type=float, default=300, help="세션 실행 한 번의 제한 시간 (초)")
+    args = parser.parse_args()
+    params.LOGIN_SLEEP_TIME = args.login_sleep
+    script = os.path.abspath(args.script)
+
+    with tempfile.TemporaryDirectory() as directory:
+        shutil.copy(args.config, os.path.join(directory, "config.yaml"))
+        # The app opens config.yaml and .cache/ relative to the working directory
+        os.chdir(directory)
+        with open("config.yaml", "r", encoding="utf-8") as f:
+            shared_before = yaml.safe_load(f)["credentials"]["usernames"][SHARED_USER]
+        shared_failures_before = shared_before.get("failed_login_attempts") or 0
+
+        print(f"{args.sessions} sessions · {os.path.basename(script)}", flush=True)
+        sessions = run_sessions(args, script)
+        print(
+            f"{'phase':<20}{'p50(s)':>8}{'p95(s)':>8}{'max(s)':>8}{'errors':>8}"
+            f"{'writes/op':>11}{'wKB/op':>9}{'reads/op':>10}{'rKB/op':>9}"
+        )
+        errors = []
+        for phase, (name, _) in enumerate(PHASES):
+            records = [session_records[phase] for session_records, _ in sessions]
+            latencies = [latency for latency, _, _, _ in records]
+            failed = [(i, detail) for i, (_, ok, detail, _) in enumerate(records) if not ok]
+            errors.extend((name, i, detail) for i, detail in failed)
+            io = collections.Counter()
+            for _, _, _, record_io in records:
+                io.update(record_io)
+            ops = len(records)
+            print(
+                f"{name:<20}{percentile(latencies, 0.5):>8.2f}{percentile(latencies, 0.95):>8.2f}"
+                f"{max(latencies):>8.2f}{len(failed):>8}"
+                f"{io['syscw'] / ops:>11.1f}{io['wchar'] / 1024 / ops:>9.1f}"
+                f"{io['syscr'] / ops:>10.1f}{io['rchar'] / 1024 / ops:>9.1f}"
+            )
+        lost = count_lost_updates(sessions, shared_failures_before)
+        print("lost updates: " + ", ".join(f"{key} {value}" for key, value in lost.items()))
+        for name, i, detail in errors[:10]:
+            print(f"  {name} #{i}: {detail}")
+
+
+if __name__ == "__main__":
+    main()
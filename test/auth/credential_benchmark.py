@@ -0,0 +1,162 @@
+"""config.yaml 자격 증명과 SQLite 자격 증명 저장소 비교 벤치마크.
+
+가짜 사용자 N명(기본 100,000명)을 담은 config.yaml을 임시 디렉터리에 만들고,
+로그인 페이지가 한 번 실행될 때 드는 비용을 두 방식으로 측정합니다.
+
+- yaml: 실행마다 yaml.load → stauth.Authenticate → 조회/갱신 → yaml.dump (기존 방식)
+- sqlite: 설정은 한 번만 읽고 사용자는 한 번만 마이그레이션한 뒤,
+  실행마다 인덱스 조회와 행 단위 갱신만 합니다 (utils/credential_store.py)
+
+    python test/auth/credential_benchmark.py --users 100000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+import yaml
+from yaml.loader import SafeLoader
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+
+import streamlit_authenticator as stauth
+from streamlit_authenticator.utilities import Hasher
+
+from utils.auth_config import AuthConfig
+from utils.credential_store import CredentialStore, SQLiteAuthenticate
+
+warnings.filterwarnings("ignore")
+COOKIE = {"name": "benchmark_cookie", "key": "benchmark_key", "expiry_days": 30}
+
+
+def make_config(path, users):
+    """사용자 `users`명을 담은 config.yaml을 씁니다. bcrypt 비용을 피하려고 해시 하나를 공유합니다."""
+    password = Hasher(["password"]).generate()[0]
+    usernames = {
+        f"user{i:06d}": {
+            "email": f"user{i:06d}@example.com",
+            "failed_login_attempts": 0,
+            "logged_in": False,
+            "name": f"User {i}",
+            "password": password,
+        }
+        for i in range(users)
+    }
+    config = {
+        "cookie": COOKIE,
+        "credentials": {"usernames": usernames},
+        "pre-authorized": {"emails": []},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.dump(config, f, default_flow_style=False)
+
+
+def timed(fn, repeat):
+    """`fn`을 `repeat`번 실행한 소요 시간(초) 목록을 돌려줍니다."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def bench_yaml(path, usernames, repeat):
+    """기존 방식: 실행마다 파일 전체를 읽고, 인증 객체를 만들고, 다시 씁니다."""
+
+    def run():
+        with open(path, "r", encoding="utf-8") as f:
+            config = yaml.load(f, Loader=SafeLoader)
+        authenticator = stauth.Authenticate(
+            config["credentials"],
+            config["cookie"]["name"],
+            config["cookie"]["key"],
+            config["cookie"]["expiry_days"],
+            auto_hash=False,
+        )
+        model = authenticator.authentication_controller.authentication_model
+        username = random.choice(usernames)
+        model.credentials["usernames"][username]["failed_login_attempts"] += 1
+        model._get_username("email", f"{username}@example.com")
+        with open(path, "w", encoding="utf-8") as f:
+            yaml.dump(config, f, default_flow_style=False)
+
+    return {"page run": timed(run, repeat)}
+
+
+def bench_sqlite(path, db_path, usernames, repeat):
+    """SQLite 방식: 설정 로드와 마이그레이션은 한 번, 이후에는 인덱스 조회와 행 단위 갱신만 합니다."""
+    started = time.perf_counter()
+    auth_config = AuthConfig(path)
+    load = time.perf_counter() - started
+    store = CredentialStore(db_path)
+    started = time.perf_counter()
+    store.migrate(auth_config.detach("credentials"), source=path)
+    migration = time.perf_counter() - started
+
+    def run():
+        config = auth_config.get()
+        authenticator = SQLiteAuthenticate(
+            store, config["cookie"]["name"], config["cookie"]["key"], config["cookie"]["expiry_days"]
+        )
+        model = authenticator.authentication_controller.authentication_model
+        username = random.choice(usernames)
+        model.credentials["usernames"][username]["failed_login_attempts"] += 1
+        model._get_username("email", f"{username}@example.com")
+        auth_config.save_if_changed()
+
+    def lookup_username():
+        store.get_user(random.choice(usernames))
+
+    def lookup_email():
+        store.find_username(f"{random.choice(usernames)}@example.com")
+
+    def update():
+        store.update_field(random.choice(usernames), "logged_in", True)
+
+    return {
+        "first load": [load],
+        "migration": [migration],
+        "page run": timed(run, repeat * 10),
+        "username lookup": timed(lookup_username, repeat * 100),
+        "email lookup": timed(lookup_email, repeat * 100),
+        "row update": timed(update, repeat * 100),
+    }
+
+
+def report(name, results):
+    for label, times in results.items():
+        print(
+            f"{name:<8}{label:<18}{statistics.median(times) * 1000:>12.3f}"
+            f"{max(times) * 1000:>12.3f}",
+            flush=True,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--users", type=int, default=100_000, help="가짜 사용자 수")
+    parser.add_argument("--repeat", type=int, default=3, help="기존 방식 페이지 실행 반복 횟수")
+    args = parser.parse_args()
+
+    usernames = [f"user{i:06d}" for i in range(args.users)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "config.yaml")
+        make_config(path, args.users)
+        print(f"{args.users} users · config.yaml {os.path.getsize(path) / 1e6:.1f} MB")
+        print(f"{'store':<8}{'step':<18}{'p50(ms)':>12}{'max(ms)':>12}", flush=True)
+        db_path = os.path.join(directory, "credentials.sqlite3")
+        report("sqlite", bench_sqlite(path, db_path, usernames, args.repeat))
+        report("yaml", bench_yaml(path, usernames, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
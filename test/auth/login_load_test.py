@@ -0,0 +1,155 @@
+"""동시 로그인 부하 테스트.
+
+N개의 로그인 시도(기본 50개)를 동시에 보내고, 비밀번호 검사를 스크립트 스레드에서
+바로 하는 기존 방식(inline)과 제한된 작업자 풀에서 하는 방식(pool,
+utils/password_hashing.py)의 로그인 지연 시간을 비교합니다.
+
+부하가 걸린 동안 다른 세션의 재실행을 흉내 낸 짧은 작업(probe)의 지연 시간도 함께 재서,
+로그인 폭주가 다른 사용자를 얼마나 멈추게 하는지 보여 줍니다.
+
+    python test/auth/login_load_test.py --attempts 50
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+
+from streamlit_authenticator.models.authentication_model import AuthenticationModel
+from streamlit_authenticator.utilities import Hasher, LoginError
+
+from utils.credential_store import CredentialStore, SQLiteAuthenticationModel
+from utils.password_hashing import (
+    HASH_WORKERS,
+    MAX_HASH_QUEUE,
+    FailedAttemptLimiter,
+    PasswordHasher,
+)
+
+warnings.filterwarnings("ignore")
+PASSWORD = "correct horse"
+# 시도 4개 중 1개는 틀린 비밀번호
+WRONG_EVERY = 4
+# 다른 세션의 재실행 한 번에 해당하는 순수 파이썬 작업량과 실행 간격 (초)
+PROBE_WORK = 20_000
+PROBE_INTERVAL = 0.05
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def make_users(attempts):
+    """사용자 `attempts`명. bcrypt 비용을 피하려고 해시 하나를 공유합니다."""
+    hashed = Hasher([PASSWORD]).generate()[0]
+    return {
+        f"user{i:03d}": {
+            "name": f"User {i}",
+            "email": f"user{i:03d}@example.com",
+            "password": hashed,
+            "failed_login_attempts": 0,
+            "logged_in": False,
+        }
+        for i in range(attempts)
+    }
+
+
+def probe(stop, latencies):
+    """다른 세션의 재실행을 흉내 냅니다: 짧은 계산 한 번에 걸린 시간을 기록합니다."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        sum(i * i for i in range(PROBE_WORK))
+        latencies.append(time.perf_counter() - started)
+        time.sleep(PROBE_INTERVAL)
+
+
+def run(model, usernames):
+    """모든 시도를 동시에 시작하고, 시도별 (지연 시간, 결과)를 돌려줍니다."""
+    results = [None] * len(usernames)
+    barrier = threading.Barrier(len(usernames))
+
+    def attempt(index, username):
+        password = PASSWORD if index % WRONG_EVERY else "wrong password"
+        barrier.wait()
+        started = time.perf_counter()
+        try:
+            outcome = "ok" if model.check_credentials(username, password) else "denied"
+        except LoginError as e:
+            outcome = "busy" if "busy" in str(e) else "limited"
+        results[index] = (time.perf_counter() - started, outcome)
+
+    stop = threading.Event()
+    probe_latencies = []
+    prober = threading.Thread(target=probe, args=(stop, probe_latencies))
+    prober.start()
+    threads = [
+        threading.Thread(target=attempt, args=(index, username))
+        for index, username in enumerate(usernames)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    stop.set()
+    prober.join()
+    return results, wall, probe_latencies
+
+
+def report(name, results, wall, probe_latencies):
+    answered = [latency for latency, outcome in results if outcome in ("ok", "denied")]
+    outcomes = [outcome for _, outcome in results]
+    print(
+        f"{name:<8}{percentile(answered, 0.5):>8.2f}{percentile(answered, 0.95):>8.2f}"
+        f"{max(answered, default=0):>8.2f}{wall:>8.2f}"
+        f"{outcomes.count('ok'):>5}{outcomes.count('denied'):>7}{outcomes.count('busy'):>6}"
+        f"{percentile(probe_latencies, 0.95) * 1000:>12.1f}",
+        flush=True,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--attempts", type=int, default=50, help="동시 로그인 시도 수")
+    parser.add_argument("--workers", type=int, default=HASH_WORKERS, help="해시 작업자 수")
+    parser.add_argument("--max-queue", type=int, default=MAX_HASH_QUEUE, help="대기 가능한 해시 수")
+    args = parser.parse_args()
+
+    users = make_users(args.attempts)
+    usernames = list(users)
+    print(f"{args.attempts} concurrent logins · {args.workers} hash workers · queue {args.max_queue}")
+    print(
+        f"{'mode':<8}{'p50(s)':>8}{'p95(s)':>8}{'max(s)':>8}{'wall':>8}{'ok':>5}{'denied':>7}"
+        f"{'busy':>6}{'probe p95':>12}"
+    )
+
+    inline = AuthenticationModel({"usernames": dict(users)}, auto_hash=False)
+    report("inline", *run(inline, usernames))
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = CredentialStore(os.path.join(directory, "credentials.sqlite3"))
+        store.migrate({"usernames": users}, source="load test")
+        hasher = PasswordHasher(workers=args.workers, max_queue=args.max_queue)
+        model = SQLiteAuthenticationModel(store, hasher=hasher, limiter=FailedAttemptLimiter())
+        report("pool", *run(model, usernames))
+        stats = hasher.stats()
+        print(
+            f"queue wait p50 {stats['queue_wait_p50']:.2f}s p95 {stats['queue_wait_p95']:.2f}s · "
+            f"hash p50 {stats['hash_time_p50']:.2f}s p95 {stats['hash_time_p95']:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""LLM 페이지 지연 시간 벤치마크.
+
+목 서버(mock_server.py)를 띄우고, 각 페이지가 한 번의 상호작용에서 보내는 요청 흐름을
+그대로 재현해 p50/p95 지연 시간, 상호작용당 호출 수, 동시 실행 처리량을 측정합니다.
+
+    python test/mock_llm/benchmark.py --iterations 20 --concurrency 1 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+import anthropic
+from openai import OpenAI
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+
+from mock_server import MockConfig, MockLLMServer
+
+from utils.chat_history import ChatHistory
+from utils.search import search_tool
+from utils.tokens import count_message_tokens
+
+DOCUMENT = "재밋 에디터는 메인 편집 영역, 블록 영역, 디자인 설정 영역, 컨트롤 영역으로 구성됩니다.\n" * 50
+QUESTION = "Can you give me a short summary?"
+
+
+class ResponseModel(BaseModel):
+    modified_text: str
+    score: int
+
+
+def _drain_openai_stream(stream):
+    return "".join(
+        chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices
+    )
+
+
+def flow_document_qa():
+    """pages/0_.py: one streamed answer about an uploaded document."""
+    client = OpenAI()
+    stream = client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {
+                "role": "user",
+                "content": f"Here's a document: {DOCUMENT} \n\n---\n\n {QUESTION}",
+            }
+        ],
+        stream=True,
+    )
+    _drain_openai_stream(stream)
+
+
+def flow_file_qa_anthropic():
+    """pages/1_File_Q&A.py: one Anthropic completion about an uploaded article."""
+    client = anthropic.Client()
+    client.completions.create(
+        prompt=f"{anthropic.HUMAN_PROMPT} Here's an article:\n\n<article>\n{DOCUMENT}\n\n</article>\n\n{QUESTION}{anthropic.AI_PROMPT}",
+        stop_sequences=[anthropic.HUMAN_PROMPT],
+        model="claude-v1",
+        max_tokens_to_sample=100,
+    )
+
+
+def flow_chat_with_search():
+    """pages/2_Chat_with_search.py: one agent turn searching the local fixture corpus."""
+    from langchain.agents import AgentType, initialize_agent
+    from langchain_community.chat_models import ChatOpenAI
+
+    llm = ChatOpenAI(model_name="gpt-3.5-turbo", streaming=True)
+    agent = initialize_agent(
+        [search_tool("fixture")],
+        llm,
+        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+        handle_parsing_errors=True,
+    )
+    agent.run([{"role": "user", "content": "Who won the Women's U.S. Open in 2018?"}])
+
+
+def flow_langchain_quickstart():
+    """pages/3_Langchain_Quickstart.py: one completion through LangChain's OpenAI LLM."""
+    from langchain_community.llms import OpenAI as LangChainOpenAI
+
+    llm = LangChainOpenAI(temperature=0.7)
+    llm.invoke("What are 3 key advice for learning how to code?")
+
+
+def flow_chat_with_feedback():
+    """pages/5_Chat_with_user_feedback.py: three chat turns with the full history."""
+    client = OpenAI()
+    messages = [{"role": "assistant", "content": "How can I help you?"}]
+    for prompt in ["Tell me a joke about sharks", "Another one", "Explain it"]:
+        messages.append({"role": "user", "content": prompt})
+        response = client.chat.completions.create(model="gpt-3.5-turbo", messages=messages)
+        messages.append({"role": "assistant", "content": response.choices[0].message.content})
+
+
+def flow_recommender():
+    """pages/6_ai.py: five question/score rounds and the streamed final reason."""
+    client = OpenAI()
+    products = "\n".join(
+        f"Product Name: 상품 {c}\nDescription: 상품 {c}의 설명입니다." for c in "ABC"
+    )
+    history = []
+    for _ in range(5):
+        response = client.chat.completions.create(
+            model="gpt-4",
+            messages=[
+                {"role": "user", "content": f"Previous question-answer history:\n{history}\n\nGenerate the next question and 2 to 5 answer options to help recommend a product."}
+            ],
+            max_tokens=500,
+            temperature=0.7,
+        )
+        output = json.loads(response.choices[0].message.content)
+        history.append({"question": output["question"], "answer": output["answers"][0]})
+        response = client.chat.completions.create(
+            model="gpt-4",
+            messages=[
+                {"role": "user", "content": f"Products:\n{products}\n\nUser's previous question-answer history:\n{history}\n\nBased on the user's answers, update the recommendation scores for each product."}
+            ],
+            max_tokens=500,
+            temperature=0.5,
+        )
+        json.loads(response.choices[0].message.content)
+    stream = client.chat.completions.create(
+        model="gpt-4",
+        messages=[
+            {"role": "user", "content": f"Recommended product:\n상품 A\n\nUser's previous question-answer history:\n{history}\n\nProvide a personalized recommendation reason to the user."}
+        ],
+        max_tokens=150,
+        temperature=0.7,
+        stream=True,
+    )
+    _drain_openai_stream(stream)
+
+
+def flow_function_call():
+    """pages/6_test.py: one chat completion with a function definition."""
+    client = OpenAI()
+    client.chat.completions.create(
+        model="gpt-3.5-turbo-0613",
+        messages=[{"role": "user", "content": "Tell me about the Eiffel Tower."}],
+        functions=[
+            {
+                "name": "get_info",
+                "description": "Retrieve information based on the user's request.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {"topic": {"type": "string"}, "details": {"type": "boolean"}},
+                    "required": ["topic"],
+                },
+            }
+        ],
+        function_call="auto",
+    )
+
+
+def flow_phrase_improver():
+    """test/popup_name/message_improver.py: one structured-output parse call."""
+    client = OpenAI()
+    completion = client.beta.chat.completions.parse(
+        model="gpt-4o-2024-08-06",
+        messages=[
+            {"role": "system", "content": "Improve the Korean phrase."},
+            {"role": "user", "content": "서비스 준비중입니다."},
+        ],
+        response_format=ResponseModel,
+    )
+    assert completion.choices[0].message.parsed is not None
+
+
+def flow_async_phrase_improver():
+    """test/popup_name/async_message_improver.py: one raw aiohttp JSON-mode request."""
+
+    async def run():
+        payload = {
+            "model": "gpt-4",
+            "messages": [
+                {"role": "system", "content": 'Respond in JSON: {"input": ..., "output": ..., "score": evaluation score (0-9)}'},
+                {"role": "user", "content": "서비스 준비중입니다."},
+            ],
+            "response_format": {"type": "json_object"},
+        }
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                f"{os.environ['OPENAI_BASE_URL']}/chat/completions",
+                headers={"Authorization": f"Bearer {os.environ['OPENAI_API_KEY']}"},
+                json=payload,
+            ) as response:
+                result = await response.json()
+                json.loads(result["choices"][0]["message"]["content"])
+
+    asyncio.run(run())
+
+
+FLOWS = {
+    "document_qa": flow_document_qa,
+    "file_qa_anthropic": flow_file_qa_anthropic,
+    "chat_with_search": flow_chat_with_search,
+    "langchain_quickstart": flow_langchain_quickstart,
+    "chat_with_feedback": flow_chat_with_feedback,
+    "recommender": flow_recommender,
+    "function_call": flow_function_call,
+    "phrase_improver": flow_phrase_improver,
+    "async_phrase_improver": flow_async_phrase_improver,
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def run_flow(server, name, flow, iterations, concurrency):
+    """
+    Run `iterations` interactions of a flow with `concurrency` workers.
+
+    Returns:
+        result (dict): Latency percentiles, calls per interaction, throughput and errors.
+    """
+    server.llm.reset()
+    latencies = []
+    errors = []
+
+    def interaction(_):
+        started = time.perf_counter()
+        try:
+            flow()
+        except Exception as e:
+            errors.append(repr(e))
+            return
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(interaction, range(iterations)))
+    wall_time = time.perf_counter() - started
+
+    return {
+        "flow": name,
+        "concurrency": concurrency,
+        "iterations": iterations,
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "mean": statistics.mean(latencies) if latencies else 0.0,
+        "calls_per_interaction": server.llm.stats()["requests"] / iterations,
+        "throughput": len(latencies) / wall_time if wall_time else 0.0,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+    }
+
+
+def compare_chat_history(server, turns):
+    """
+    pages/5_Chat_with_user_feedback.py: per-turn latency of one long conversation,
+    sending the full history versus the summary plus recent window.
+
+    Returns:
+        result (dict): Per-turn prompt tokens and latency of each mode.
+    """
+    result = {}
+    for mode in ("full", "summary"):
+        server.llm.reset()
+        client = OpenAI()
+        history = ChatHistory()
+        messages = [{"role": "assistant", "content": "How can I help you?"}]
+        turns_result = []
+        for turn in range(turns):
+            messages.append({"role": "user", "content": f"Turn {turn}: " + QUESTION * 20})
+            context = history.context(messages) if mode == "summary" else messages
+            started = time.perf_counter()
+            response = client.chat.completions.create(model="gpt-3.5-turbo", messages=context)
+            latency = time.perf_counter() - started
+            messages.append({"role": "assistant", "content": response.choices[0].message.content})
+            turns_result.append({"prompt_tokens": count_message_tokens(context), "latency": latency})
+            if mode == "summary":
+                history.schedule_summary(
+                    messages,
+                    lambda prompt: client.chat.completions.create(
+                        model="gpt-3.5-turbo", messages=prompt
+                    ).choices[0].message.content,
+                )
+        result[mode] = turns_result
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LLM page flows against the mock server")
+    parser.add_argument("--flows", nargs="*", default=list(FLOWS), choices=list(FLOWS))
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[1, 8])
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--chunk-interval", type=float, default=0.01)
+    parser.add_argument("--chunk-size", type=int, default=4)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--prompt-latency", type=float, default=0.0, help="extra seconds per KB of prompt")
+    parser.add_argument("--chat-turns", type=int, default=0, help="compare chat history modes over N turns")
+    parser.add_argument("--output", help="write the results as JSON to this path")
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        MockConfig(
+            latency=args.latency,
+            jitter=args.jitter,
+            chunk_interval=args.chunk_interval,
+            chunk_size=args.chunk_size,
+            error_rate=args.error_rate,
+            prompt_latency=args.prompt_latency,
+        )
+    ).start()
+    os.environ.update(server.env())
+
+    results = []
+    print(f"{'flow':<24}{'conc':>5}{'p50(s)':>9}{'p95(s)':>9}{'calls':>7}{'ops/s':>8}{'err':>5}")
+    try:
+        for name in args.flows:
+            for concurrency in args.concurrency:
+                result = run_flow(server, name, FLOWS[name], args.iterations, concurrency)
+                results.append(result)
+                print(
+                    f"{name:<24}{concurrency:>5}{result['p50']:>9.3f}{result['p95']:>9.3f}"
+                    f"{result['calls_per_interaction']:>7.1f}{result['throughput']:>8.2f}{result['errors']:>5}"
+                )
+                if result["first_error"]:
+                    print(f"  first error: {result['first_error']}")
+        if args.chat_turns:
+            comparison = compare_chat_history(server, args.chat_turns)
+            results.append({"flow": "chat_history", **comparison})
+            print(f"\n{'turn':<6}{'full tok':>10}{'full(s)':>9}{'summary tok':>13}{'summary(s)':>12}")
+            for turn, (full, summary) in enumerate(zip(comparison["full"], comparison["summary"]), 1):
+                print(
+                    f"{turn:<6}{full['prompt_tokens']:>10}{full['latency']:>9.3f}"
+                    f"{summary['prompt_tokens']:>13}{summary['latency']:>12.3f}"
+                )
+    finally:
+        server.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,520 @@
+"""OpenAI/Anthropic 호환 로컬 목(mock) LLM 서버.
+
+API 키와 네트워크 없이 LLM 페이지를 실행하고 벤치마크하기 위한 서버입니다.
+
+    python test/mock_llm/mock_server.py --port 8765 --latency 0.3 --chunk-interval 0.02
+
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 \\
+    OPENAI_API_BASE=http://127.0.0.1:8765/v1 \\
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 \\
+    OPENAI_API_KEY=mock ANTHROPIC_API_KEY=mock \\
+    streamlit run streamlit_app.py
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "canned_outputs.json")
+
+
+class MockConfig:
+    """
+    Latency, streaming and error behaviour of the mock server.
+    """
+
+    def __init__(
+        self,
+        latency=0.2,
+        jitter=0.05,
+        chunk_interval=0.02,
+        chunk_size=4,
+        error_rate=0.0,
+        error_status=500,
+        canned_path=CANNED_PATH,
+        prompt_latency=0.0,
+    ):
+        self.latency = latency
+        # Extra seconds per KB of request body, so longer prompts answer later
+        self.prompt_latency = prompt_latency
+        self.jitter = jitter
+        self.chunk_interval = chunk_interval
+        self.chunk_size = chunk_size
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.canned = []
+        if canned_path and os.path.exists(canned_path):
+            with open(canned_path, "r", encoding="utf-8") as f:
+                self.canned = json.load(f)
+
+
+def _message_text(content):
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return ""
+
+
+def _fill_schema(schema, seed_text):
+    """
+    Build a value that satisfies a (simple) JSON schema.
+    """
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type")
+    if kind == "object" or "properties" in schema:
+        return {
+            name: _fill_schema(prop, seed_text)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        return [_fill_schema(schema.get("items", {}), seed_text)]
+    if kind == "integer":
+        return 7
+    if kind == "number":
+        return 0.5
+    if kind == "boolean":
+        return True
+    return f"{seed_text} (mock)"
+
+
+def _substitute(value, last_user):
+    if isinstance(value, str):
+        return value.replace("{last_user}", last_user)
+    if isinstance(value, list):
+        return [_substitute(v, last_user) for v in value]
+    if isinstance(value, dict):
+        return {k: _substitute(v, last_user) for k, v in value.items()}
+    return value
+
+
+class MockLLM:
+    """
+    Decides what the mock model answers and counts the requests it served.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def count(self, endpoint):
+        with self.lock:
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+
+    def stats(self):
+        with self.lock:
+            return {"requests": sum(self.counts.values()), **self.counts}
+
+    def reset(self):
+        with self.lock:
+            self.counts = {}
+
+    def answer(self, text, last_user, functions=None, response_format=None):
+        """
+        Return (content, function_call) for a prompt.
+        """
+        if functions:
+            function = functions[0].get("function", functions[0])
+            arguments = _fill_schema(function.get("parameters", {}), last_user[:40])
+            return None, {"name": function["name"], "arguments": json.dumps(arguments)}
+
+        if response_format and response_format.get("type") == "json_schema":
+            schema = response_format["json_schema"].get("schema", {})
+            return json.dumps(_fill_schema(schema, last_user), ensure_ascii=False), None
+
+        for rule in self.config.canned:
+            if rule["match"] in text:
+                content = _substitute(rule["content"], last_user)
+                if not isinstance(content, str):
+                    content = json.dumps(content, ensure_ascii=False)
+                return content, None
+
+        # Recommender scoring prompt: score every listed product
+        if "update the recommendation scores" in text:
+            names = re.findall(r"Product Name: (.+)", text)
+            scores = {name: (i * 2 + 1) % 6 for i, name in enumerate(names)}
+            return json.dumps(scores, ensure_ascii=False), None
+
+        return f"Mock answer to: {last_user[:80]}", None
+
+    def chunks(self, content):
+        size = self.config.chunk_size
+        return [content[i : i + size] for i in range(0, len(content), size)] or [""]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    llm = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_sse(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _send_event(self, data, event=None):
+        if event:
+            self.wfile.write(f"event: {event}\n".encode("utf-8"))
+        if not isinstance(data, str):
+            data = json.dumps(data, ensure_ascii=False)
+        self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _wait_first_byte(self):
+        config = self.llm.config
+        prompt_kb = int(self.headers.get("Content-Length") or 0) / 1024
+        time.sleep(
+            config.latency + config.prompt_latency * prompt_kb + random.uniform(0, config.jitter)
+        )
+
+    def _maybe_fail(self, anthropic_style=False):
+        config = self.llm.config
+        if random.random() >= config.error_rate:
+            return False
+        message = "Mock server injected error"
+        if anthropic_style:
+            payload = {"type": "error", "error": {"type": "api_error", "message": message}}
+        else:
+            payload = {"error": {"message": message, "type": "server_error"}}
+        self._send_json(config.error_status, payload)
+        return True
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self._send_json(200, self.llm.stats())
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        body = self._read_json()
+        if path == "/reset":
+            self.llm.reset()
+            self._send_json(200, {"ok": True})
+            return
+        handler = {
+            "/v1/chat/completions": self._chat_completions,
+            "/v1/completions": self._completions,
+            "/v1/complete": self._anthropic_complete,
+            "/v1/messages": self._anthropic_messages,
+        }.get(path)
+        if handler is None:
+            self._send_json(404, {"error": {"message": f"Unknown path {path}"}})
+            return
+        self.llm.count(path)
+        self._wait_first_byte()
+        handler(body)
+
+    def _chat_completions(self, body):
+        if self._maybe_fail():
+            return
+        messages = body.get("messages", [])
+        texts = [_message_text(m.get("content")) for m in messages]
+        last_user = next(
+            (_message_text(m.get("content")) for m in reversed(messages) if m.get("role") == "user"),
+            "",
+        )
+        content, function_call = self.llm.answer(
+            "\n".join(texts),
+            last_user,
+            functions=body.get("functions") or body.get("tools"),
+            response_format=body.get("response_format"),
+        )
+        model = body.get("model", "mock")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        interval = self.llm.config.chunk_interval
+        prompt_tokens = sum(len(t) for t in texts) // 4
+        completion_tokens = len(content or "") // 4
+
+        if body.get("stream"):
+            self._start_sse()
+            for piece in self.llm.chunks(content or ""):
+                time.sleep(interval)
+                self._send_event(
+                    {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": model,
+                        "choices": [
+                            {"index": 0, "delta": {"role": "assistant", "content": piece}, "finish_reason": None}
+                        ],
+                    }
+                )
+            self._send_event(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                }
+            )
+            if (body.get("stream_options") or {}).get("include_usage"):
+                self._send_event(
+                    {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": model,
+                        "choices": [],
+                        "usage": {
+                            "prompt_tokens": prompt_tokens,
+                            "completion_tokens": completion_tokens,
+                            "total_tokens": prompt_tokens + completion_tokens,
+                        },
+                    }
+                )
+            self._send_event("[DONE]")
+            return
+
+        time.sleep(interval * len(self.llm.chunks(content or "")))
+        message = {"role": "assistant", "content": content}
+        if function_call:
+            message["function_call"] = function_call
+        self._send_json(
+            200,
+            {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": message,
+                        "finish_reason": "function_call" if function_call else "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            },
+        )
+
+    def _completions(self, body):
+        if self._maybe_fail():
+            return
+        prompts = body.get("prompt", "")
+        if isinstance(prompts, str):
+            prompts = [prompts]
+        choices = []
+        for index, prompt in enumerate(prompts):
+            content, _ = self.llm.answer(prompt, prompt)
+            time.sleep(self.llm.config.chunk_interval * len(self.llm.chunks(content)))
+            choices.append({"index": index, "text": content, "finish_reason": "stop", "logprobs": None})
+        self._send_json(
+            200,
+            {
+                "id": f"cmpl-{uuid.uuid4().hex[:12]}",
+                "object": "text_completion",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": choices,
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            },
+        )
+
+    def _anthropic_complete(self, body):
+        if self._maybe_fail(anthropic_style=True):
+            return
+        prompt = body.get("prompt", "")
+        question = prompt.rsplit("</article>", 1)[-1]
+        content, _ = self.llm.answer(prompt, question.replace("Assistant:", "").strip())
+        completion_id = f"compl_{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "mock")
+        interval = self.llm.config.chunk_interval
+
+        if body.get("stream"):
+            self._start_sse()
+            for piece in self.llm.chunks(content):
+                time.sleep(interval)
+                self._send_event(
+                    {"type": "completion", "id": completion_id, "completion": piece, "stop_reason": None, "model": model},
+                    event="completion",
+                )
+            self._send_event(
+                {"type": "completion", "id": completion_id, "completion": "", "stop_reason": "stop_sequence", "model": model},
+                event="completion",
+            )
+            return
+
+        time.sleep(interval * len(self.llm.chunks(content)))
+        self._send_json(
+            200,
+            {
+                "type": "completion",
+                "id": completion_id,
+                "completion": content,
+                "stop_reason": "stop_sequence",
+                "model": model,
+            },
+        )
+
+    def _anthropic_messages(self, body):
+        if self._maybe_fail(anthropic_style=True):
+            return
+        messages = body.get("messages", [])
+        texts = [_message_text(m.get("content")) for m in messages]
+        content, _ = self.llm.answer("\n".join(texts), texts[-1] if texts else "")
+        message_id = f"msg_{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "mock")
+        interval = self.llm.config.chunk_interval
+        usage = {"input_tokens": sum(len(t) for t in texts) // 4, "output_tokens": len(content) // 4}
+
+        if body.get("stream"):
+            self._start_sse()
+            self._send_event(
+                {
+                    "type": "message_start",
+                    "message": {
+                        "id": message_id, "type": "message", "role": "assistant", "model": model,
+                        "content": [], "stop_reason": None, "stop_sequence": None,
+                        "usage": {"input_tokens": usage["input_tokens"], "output_tokens": 0},
+                    },
+                },
+                event="message_start",
+            )
+            self._send_event(
+                {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+                event="content_block_start",
+            )
+            for piece in self.llm.chunks(content):
+                time.sleep(interval)
+                self._send_event(
+                    {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": piece}},
+                    event="content_block_delta",
+                )
+            self._send_event({"type": "content_block_stop", "index": 0}, event="content_block_stop")
+            self._send_event(
+                {
+                    "type": "message_delta",
+                    "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                    "usage": {"output_tokens": usage["output_tokens"]},
+                },
+                event="message_delta",
+            )
+            self._send_event({"type": "message_stop"}, event="message_stop")
+            return
+
+        time.sleep(interval * len(self.llm.chunks(content)))
+        self._send_json(
+            200,
+            {
+                "id": message_id,
+                "type": "message",
+                "role": "assistant",
+                "model": model,
+                "content": [{"type": "text", "text": content}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": usage,
+            },
+        )
+
+
+class MockLLMServer:
+    """
+    Mock server running on a background thread, for use from benchmarks and scripts.
+    """
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.llm = MockLLM(config or MockConfig())
+        handler = type("BoundMockHandler", (MockHandler,), {"llm": self.llm})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def env(self):
+        """
+        Environment variables that point the OpenAI, Anthropic and LangChain clients here.
+        """
+        return {
+            "OPENAI_BASE_URL": f"{self.base_url}/v1",
+            "OPENAI_API_BASE": f"{self.base_url}/v1",
+            "ANTHROPIC_BASE_URL": self.base_url,
+            "OPENAI_API_KEY": "mock",
+            "ANTHROPIC_API_KEY": "mock",
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI/Anthropic-compatible mock server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first byte")
+    parser.add_argument("--jitter", type=float, default=0.05, help="random extra latency (seconds)")
+    parser.add_argument("--chunk-interval", type=float, default=0.02, help="seconds between stream chunks")
+    parser.add_argument("--chunk-size", type=int, default=4, help="characters per stream chunk")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument(
+        "--prompt-latency", type=float, default=0.0, help="extra seconds per KB of request body"
+    )
+    parser.add_argument("--canned", default=CANNED_PATH, help="JSON file with canned outputs")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        chunk_interval=args.chunk_interval,
+        chunk_size=args.chunk_size,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        canned_path=args.canned,
+        prompt_latency=args.prompt_latency,
+    )
+    server = MockLLMServer(config, host=args.host, port=args.port)
+    print(f"Mock LLM server listening on {server.base_url}")
+    for name, value in server.env().items():
+        print(f"  {name}={value}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
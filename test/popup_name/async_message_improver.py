@@ -1,17 +1,57 @@
-import pandas as pd
-from pydantic import BaseModel
-from dotenv import load_dotenv
-from tqdm import tqdm
-from typing import List
+"""메시지 문구 개선 비동기 파이프라인.
+
+고유 메시지를 작업자 N개(기본 32개)가 동시에 요청하고, 분당 요청 수(RPM)와 분당 토큰 수(TPM)
+토큰 버킷으로 API 한도를 넘지 않게 조절합니다. 429/5xx 응답은 Retry-After 또는 지수 백오프로
+다시 시도하고, 결과는 입력 순서대로 모아 원본과 매칭해 저장합니다.
+
+    python test/popup_name/async_message_improver.py --concurrency 32 --rpm 500 --tpm 150000
+"""
+
+import argparse
 import asyncio
-import aiohttp
-from typing import List
+import email.utils
 import json
 import os
+import random
+import sys
+import time
+from typing import List
+
+import aiohttp
+import pandas as pd
+from dotenv import load_dotenv
+from pydantic import BaseModel, ValidationError
+from tqdm import tqdm
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+
+from utils.llm_cache import CACHE_PATH, get_llm_cache, make_key
+from utils.tokens import estimate_tokens
 
 load_dotenv()
 
 # client = OpenAI()
+llm_cache = get_llm_cache(os.path.join(REPO_ROOT, CACHE_PATH))
+# 목 서버(test/mock_llm)로 실행할 때는 OPENAI_BASE_URL을 지정
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+INPUT_PATH = "/Users/ktg/Desktop/project/portfolio-streamlit/test/message.csv"
+OUTPUT_PATH = "/Users/ktg/Desktop/project/portfolio-streamlit/test/result.csv"
+MODEL = "gpt-4"
+
+# 동시에 요청하는 작업자 수와 API 한도 (계정 등급에 맞게 조정)
+CONCURRENCY = 32
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 150_000
+# 버킷은 한도의 1/10 (6초 분량)까지만 모아 두어 시작 직후 한꺼번에 몰리지 않게 함
+BURST_FRACTION = 0.1
+# 응답 토큰 예상치. 실제 사용량은 응답의 usage로 다시 맞춤
+EXPECTED_OUTPUT_TOKENS = 150
+MAX_ATTEMPTS = 6
+MAX_BACKOFF = 60
+REQUEST_TIMEOUT = 120
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
 
 class ResponseModel(BaseModel):
@@ -20,10 +60,6 @@ class ResponseModel(BaseModel):
     score: int
 
 
-origin_df = pd.read_csv(
-    "/Users/ktg/Desktop/project/portfolio-streamlit/test/message.csv"
-)[:10]
-
 result_example = f"""input: 현재 비밀번호를 입력해주세요.
 output: 현재 사용 중인 비밀번호를 입력해 주세요.
 
@@ -60,12 +96,74 @@ Example:
 {result_example}"""
 
 
-async def improve_phrase(phrase, session):
-    api_key = os.getenv("OPENAI_API_KEY")
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+class TokenBucket:
+    """
+    분당 한도를 지키는 비동기 토큰 버킷.
+
+    초당 `per_minute / 60`씩 다시 차고, 기다리는 작업은 도착 순서대로 하나씩 꺼냅니다.
+    """
+
+    def __init__(self, per_minute, burst_fraction=BURST_FRACTION):
+        self.rate = per_minute / 60
+        self.capacity = max(per_minute * burst_fraction, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        # 버킷보다 큰 요청은 버킷이 가득 찰 때까지만 기다림
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, amount):
+        """예상과 실제 사용량의 차이를 반영합니다 (음수면 돌려받음, 버킷은 빚을 질 수 있음)."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+    def pause(self, seconds):
+        """429 응답 뒤 모든 작업자가 `seconds`초 동안 새 요청을 보내지 않게 합니다."""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
 
-    payload = {
-        "model": "gpt-4",
+
+class PipelineStats:
+    """처리량 집계 (완료, 캐시 적중, 재시도, 오류, 사용 토큰)."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.done = 0
+        self.cached = 0
+        self.retries = 0
+        self.errors = 0
+        self.tokens = 0
+        self.in_flight = 0
+
+    def postfix(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "msg/s": f"{self.done / elapsed:.1f}",
+            "tok/min": f"{self.tokens / elapsed * 60:,.0f}",
+            "in-flight": self.in_flight,
+            "cache": self.cached,
+            "retry": self.retries,
+            "error": self.errors,
+        }
+
+
+def build_payload(phrase):
+    return {
+        "model": MODEL,
         "messages": [
             {"role": "system", "content": template},
             {"role": "user", "content": phrase},
@@ -73,36 +171,174 @@ async def improve_phrase(phrase, session):
         "response_format": {"type": "json_object"},
     }
 
-    async with session.post(
-        "https://api.openai.com/v1/chat/completions", headers=headers, json=payload
-    ) as response:
-        result = await response.json()
-        response_text = result["choices"][0]["message"]["content"]
-        response_data = json.loads(response_text)
-        return ResponseModel(**response_data)
-
-
-async def process_messages(messages: List[str]):
-    improved_results = []
-    async with aiohttp.ClientSession() as session:
-        for message in tqdm(
-            messages, desc="메시지 개선 중", total=len(messages), position=0
-        ):
-            result = await improve_phrase(message, session)
-            improved_results.append(
-                {
-                    "original_message": message,
-                    "modified_text": result.output,
-                    "score": result.score,
-                }
-            )
+
+def parse_retry_after(value):
+    """
+    Retry-After 헤더를 기다릴 초로 바꿉니다. 초(숫자)와 HTTP 날짜 두 형식을 모두 받고,
+    읽을 수 없으면 None (호출한 쪽에서 지수 백오프 사용).
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+async def post_with_retry(session, payload, requests, tokens, stats):
+    """한도 안에서 요청을 보내고, 429/5xx와 연결 오류는 백오프 후 다시 시도합니다."""
+    api_key = os.getenv("OPENAI_API_KEY")
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+    estimated = (
+        sum(estimate_tokens(m["content"]) for m in payload["messages"]) + EXPECTED_OUTPUT_TOKENS
+    )
+    for attempt in range(MAX_ATTEMPTS):
+        await requests.acquire()
+        await tokens.acquire(estimated)
+        stats.in_flight += 1
+        retry_after = None
+        try:
+            async with session.post(
+                f"{OPENAI_BASE_URL}/chat/completions", headers=headers, json=payload
+            ) as response:
+                if response.status not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    result = await response.json()
+                    used = result.get("usage", {}).get("total_tokens", estimated)
+                    tokens.adjust(used - estimated)
+                    stats.tokens += used
+                    return result
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if response.status == 429:
+                    requests.pause(1 if retry_after is None else retry_after)
+                error = f"HTTP {response.status}"
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            error = repr(e)
+        finally:
+            stats.in_flight -= 1
+        # 보내지 못한 요청의 예상 토큰은 돌려받음
+        tokens.adjust(-estimated)
+        if attempt + 1 == MAX_ATTEMPTS:
+            raise RuntimeError(f"{MAX_ATTEMPTS}번 시도 실패: {error}")
+        stats.retries += 1
+        delay = min(2**attempt, MAX_BACKOFF) if retry_after is None else retry_after
+        await asyncio.sleep(delay + random.uniform(0, 0.5))
+
+
+async def improve_phrase(phrase, session, requests, tokens, stats):
+    payload = build_payload(phrase)
+
+    # 같은 문구는 다시 요청하지 않고 캐시된 결과를 사용
+    cache_key = make_key(
+        payload["model"],
+        payload["messages"],
+        response_format=payload["response_format"],
+    )
+    # SQLite 캐시 조회·저장은 동기 호출이라 이벤트 루프를 막지 않게 스레드에서 실행
+    cached = await asyncio.to_thread(llm_cache.get, cache_key)
+    if cached is not None:
+        stats.cached += 1
+        return ResponseModel(**cached)
+
+    result = await post_with_retry(session, payload, requests, tokens, stats)
+    response_text = result["choices"][0]["message"]["content"]
+    response_data = json.loads(response_text)
+    improved = ResponseModel(**response_data)
+    await asyncio.to_thread(llm_cache.set, cache_key, improved.model_dump())
+    return improved
+
+
+async def report_throughput(progress, stats, interval=1.0):
+    """진행 막대 옆에 처리량을 주기적으로 표시합니다."""
+    while True:
+        progress.set_postfix(stats.postfix(), refresh=True)
+        await asyncio.sleep(interval)
+
+
+async def process_messages(
+    messages: List[str],
+    concurrency=CONCURRENCY,
+    requests_per_minute=REQUESTS_PER_MINUTE,
+    tokens_per_minute=TOKENS_PER_MINUTE,
+):
+    """
+    메시지를 작업자 `concurrency`개로 동시에 개선하고, 입력 순서대로 결과를 돌려줍니다.
+    """
+    requests = TokenBucket(requests_per_minute)
+    tokens = TokenBucket(tokens_per_minute)
+    stats = PipelineStats()
+    improved_results = [None] * len(messages)
+    queue = asyncio.Queue()
+    for item in enumerate(messages):
+        queue.put_nowait(item)
+
+    progress = tqdm(total=len(messages), desc="메시지 개선 중", position=0)
+
+    async def worker(session):
+        while True:
+            try:
+                index, message = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                result = await improve_phrase(message, session, requests, tokens, stats)
+                modified_text, score = result.output, result.score
+            except (RuntimeError, aiohttp.ClientError, ValueError, KeyError, ValidationError) as e:
+                # 실패한 메시지는 동기 버전과 같이 "Error"로 남기고 계속 진행
+                tqdm.write(f"에러 발생: {message[:30]} - {e}")
+                stats.errors += 1
+                modified_text, score = "Error", 0
+            improved_results[index] = {
+                "original_message": message,
+                "modified_text": modified_text,
+                "score": score,
+            }
+            stats.done += 1
+            progress.update()
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        reporter = asyncio.create_task(report_throughput(progress, stats))
+        try:
+            await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        finally:
+            reporter.cancel()
+            progress.set_postfix(stats.postfix())
+            progress.close()
+    elapsed = time.monotonic() - stats.started
+    print(
+        f"{stats.done}개 처리 ({elapsed:.1f}초, {stats.done / max(elapsed, 1e-9):.1f}개/초) · "
+        f"캐시 {stats.cached} · 재시도 {stats.retries} · 오류 {stats.errors} · 토큰 {stats.tokens:,}"
+    )
     return improved_results
 
 
 # 메인 실행 부분을 비동기 함수로 변경
 async def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--input", default=INPUT_PATH, help="원본 메시지 CSV (`Message` 칼럼)")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="결과 CSV")
+    parser.add_argument("--limit", type=int, default=None, help="앞에서부터 이 개수의 행만 처리")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="동시 작업자 수")
+    parser.add_argument("--rpm", type=int, default=REQUESTS_PER_MINUTE, help="분당 요청 한도")
+    parser.add_argument("--tpm", type=int, default=TOKENS_PER_MINUTE, help="분당 토큰 한도")
+    args = parser.parse_args()
+
+    origin_df = pd.read_csv(args.input)[: args.limit]
     unique_messages = origin_df["Message"].unique()
-    improved_results = await process_messages(unique_messages)
+    improved_results = await process_messages(
+        unique_messages, args.concurrency, args.rpm, args.tpm
+    )
 
     # 개선된 결과로 데이터프레임 생성
     improved_df = pd.DataFrame(improved_results)
@@ -115,7 +351,7 @@ async def main():
     # 필요없는 컬럼 제거 및 저장
     final_df = final_df.drop("original_message", axis=1)
     final_df.to_csv(
-        "/Users/ktg/Desktop/project/portfolio-streamlit/test/result.csv",
+        args.output,
         index=False,
         encoding="utf-8",
     )
@@ -0,0 +1,99 @@
+"""Batch API 로컬 대역(stand-in) 실행기.
+
+`message_improver.py --mode export`가 만든 입력 JSONL을 API 없이 "실행"해서
+OpenAI Batch API 결과 파일과 같은 형식의 JSONL을 씁니다. 응답은 목 서버(test/mock_llm)의
+규칙으로 만들고, 실제 Batch API처럼 결과 순서는 입력 순서와 다릅니다.
+
+    python test/popup_name/local_batch_executor.py batch_input.jsonl batch_output.jsonl --error-rate 0.05
+    python test/popup_name/message_improver.py --mode import --results batch_output.jsonl
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "mock_llm"))
+
+from mock_server import MockConfig, MockLLM, _message_text
+
+
+def execute(request, llm, error_rate):
+    """입력 한 줄을 실행하고 결과 한 줄을 돌려줍니다."""
+    result = {
+        "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+        "custom_id": request["custom_id"],
+        "response": None,
+        "error": None,
+    }
+    request_id = uuid.uuid4().hex
+    if random.random() < error_rate:
+        result["response"] = {
+            "status_code": 500,
+            "request_id": request_id,
+            "body": {"error": {"message": "Local executor injected error", "type": "server_error"}},
+        }
+        return result
+
+    body = request["body"]
+    texts = [_message_text(m.get("content")) for m in body["messages"]]
+    last_user = next(
+        (_message_text(m["content"]) for m in reversed(body["messages"]) if m["role"] == "user"),
+        "",
+    )
+    content, _ = llm.answer("\n".join(texts), last_user, response_format=body.get("response_format"))
+    prompt_tokens = sum(len(t) for t in texts) // 4
+    completion_tokens = len(content) // 4
+    result["response"] = {
+        "status_code": 200,
+        "request_id": request_id,
+        "body": {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content, "refusal": None},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        },
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("input", help="Batch API 입력 JSONL")
+    parser.add_argument("output", help="결과 JSONL")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="실패로 돌려줄 요청 비율")
+    parser.add_argument("--seed", type=int, default=None, help="실패와 결과 순서의 난수 시드")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    llm = MockLLM(MockConfig())
+    with open(args.input, "r", encoding="utf-8") as f:
+        requests = [json.loads(line) for line in f if line.strip()]
+    results = [execute(request, llm, args.error_rate) for request in requests]
+    random.shuffle(results)
+    with open(args.output, "w", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    failed = sum(result["response"]["status_code"] != 200 for result in results)
+    print(f"실행한 요청 수: {len(results)} · 실패: {failed} · 결과: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
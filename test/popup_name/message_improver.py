@@ -1,43 +1,103 @@
+"""메시지 문구 개선 스크립트.
+
+- sync (기본): 남은 메시지를 한 개씩 요청하고 100개마다 `result_batch_[N].csv`에 저장
+- export: 남은 메시지를 OpenAI Batch API 입력 JSONL로 저장 (요청 5만 개마다 파일 하나)
+- import: Batch API 결과 JSONL을 custom_id로 메시지와 맞춰 `result_batch_[N].csv`에 병합
+
+    python test/popup_name/message_improver.py --mode export
+    python test/popup_name/message_improver.py --mode import --results batch_output.jsonl
+"""
+
 import pandas as pd
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, ValidationError
 from openai import OpenAI
 from dotenv import load_dotenv
 from tqdm import tqdm
+import argparse
+import functools
+import hashlib
 import os
+import sys
 import json
 
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+
+from utils.clients import key_fingerprint
+from utils.llm_cache import CACHE_PATH, get_llm_cache, make_key
+
 load_dotenv()
 
-BASE_PATH = "/Users/ktg/Desktop/project/portfolio-streamlit/test/popup_name"
+# 다른 위치의 message.csv로 실행할 때는 MESSAGE_IMPROVER_PATH를 지정
+BASE_PATH = os.getenv(
+    "MESSAGE_IMPROVER_PATH", "/Users/ktg/Desktop/project/portfolio-streamlit/test/popup_name"
+)
 FINAL_RESULT_PATH = f"{BASE_PATH}/result.csv"
 MERGED_BATCH_PATH = f"{BASE_PATH}/merged_batch_results.csv"
+BATCH_INPUT_PATH = f"{BASE_PATH}/batch_input.jsonl"
+MODEL = "gpt-4o-2024-08-06"
+# Batch API 입력 파일 하나에 넣을 수 있는 최대 요청 수
+BATCH_MAX_REQUESTS = 50_000
 
-client = OpenAI()
+llm_cache = get_llm_cache(os.path.join(REPO_ROOT, CACHE_PATH))
 
 
 class ResponseModel(BaseModel):
+    # strict 구조화 출력은 스키마에 additionalProperties: false가 있어야 함
+    model_config = ConfigDict(extra="forbid")
+
     modified_text: str
     score: int
 
 
+def json_schema_response_format(model):
+    """pydantic 모델의 JSON 스키마로 strict 구조화 출력 `response_format`을 만듭니다."""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": model.__name__, "schema": model.model_json_schema(), "strict": True},
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def get_client():
+    # export/import 모드는 API 키 없이도 실행되도록 필요할 때 생성
+    return OpenAI()
+
+
+def build_messages(phrase):
+    return [
+        {"role": "system", "content": template},
+        {"role": "user", "content": phrase},
+    ]
+
+
 def improve_phrase(phrase):
+    messages = build_messages(phrase)
+
+    def call():
+        completion = get_client().beta.chat.completions.parse(
+            model=MODEL,
+            messages=messages,
+            response_format=ResponseModel,
+        )
+        return completion.choices[0].message.parsed.model_dump()
+
     try:
-        completion = client.beta.chat.completions.parse(
-            model="gpt-4o-2024-08-06",
-            messages=[
-                {"role": "system", "content": template},
-                {"role": "user", "content": phrase},
-            ],
+        # 일괄 작업이므로 샘플링된 결과도 캐시해, 다시 실행할 때 같은 문구는 요청하지 않음
+        result = llm_cache.get_or_call(
+            MODEL,
+            messages,
+            call,
+            cache_nondeterministic=True,
+            scope=key_fingerprint(get_client().api_key),
             response_format=ResponseModel,
         )
-        return completion.choices[0].message.parsed
+        return ResponseModel(**result)
     except Exception as e:
         print(f"에러 발생: {str(e)}")
         return type("ErrorResponse", (), {"modified_text": "Error", "score": 0})()
 
 
-origin_df = pd.read_csv(f"{BASE_PATH}/message.csv")
-
 result_example = f"""input: 현재 비밀번호를 입력해주세요.
 output: 현재 사용 중인 비밀번호를 입력해 주세요.
 
@@ -83,32 +143,157 @@ def get_processed_messages():
     return processed_messages
 
 
-# 유니크한 메시지 추출
-unique_messages = origin_df["Message"].unique()
-
-# 이미 처리된 메시지 확인
-processed_messages = get_processed_messages()
-
-# 아직 처리되지 않은 메시지만 필터링
-remaining_messages = [msg for msg in unique_messages if msg not in processed_messages]
-print(f"전체 메시지 수: {len(unique_messages)}")
-print(f"이미 처리된 메시지 수: {len(processed_messages)}")
-print(f"남은 메시지 수: {len(remaining_messages)}")
+def save_checkpoint(improved_results):
+    """결과를 다음 번호의 `result_batch_[N].csv`로 저장합니다."""
+    batch_num = (
+        len([f for f in os.listdir(BASE_PATH) if f.startswith("result_batch_")]) + 1
+    )
 
-batch_size = 100
-improved_results = []
+    temp_df = pd.DataFrame(improved_results)
+    temp_df.to_csv(
+        f"{BASE_PATH}/result_batch_{batch_num}.csv",
+        index=False,
+        encoding="utf-8",
+    )
 
-for i in range(0, len(remaining_messages), batch_size):
-    batch_messages = remaining_messages[i : i + batch_size]
 
-    for message in tqdm(
-        batch_messages,
-        desc=f"배치 {i//batch_size + 1} 처리 중",
-        total=len(batch_messages),
-        position=0,
-    ):
-        try:
-            result = improve_phrase(message)
+def run_sync(remaining_messages):
+    batch_size = 100
+    improved_results = []
+
+    for i in range(0, len(remaining_messages), batch_size):
+        batch_messages = remaining_messages[i : i + batch_size]
+
+        for message in tqdm(
+            batch_messages,
+            desc=f"배치 {i//batch_size + 1} 처리 중",
+            total=len(batch_messages),
+            position=0,
+        ):
+            try:
+                result = improve_phrase(message)
+                improved_results.append(
+                    {
+                        "original_message": message,
+                        "modified_text": result.modified_text,
+                        "score": result.score,
+                    }
+                )
+            except Exception as e:
+                print(f"Error in batch processing: {str(e)}")
+                improved_results.append(
+                    {
+                        "original_message": message,
+                        "modified_text": "Error",
+                        "score": 0,
+                    }
+                )
+
+        # 100개 처리할 때마다 중간 저장
+        save_checkpoint(improved_results)
+        improved_results = []  # 메모리 관리를 위해 저장 후 리스트 초기화
+
+
+def custom_id_for(message):
+    """메시지 내용으로 정해지는 custom_id. 내보낸 순서와 상관없이 결과를 메시지에 맞출 수 있음."""
+    return "msg-" + hashlib.blake2b(message.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def build_batch_request(message):
+    """`improve_phrase`가 보내는 것과 같은 요청을 Batch API 입력 한 줄로 만듭니다."""
+    return {
+        "custom_id": custom_id_for(message),
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": MODEL,
+            "messages": build_messages(message),
+            # ResponseModel 스키마를 그대로 넣어 parse()와 같은 구조화 출력을 받음
+            "response_format": json_schema_response_format(ResponseModel),
+        },
+    }
+
+
+def cache_key_for(message):
+    return make_key(MODEL, build_messages(message), response_format=ResponseModel)
+
+
+def export_batch(remaining_messages, path):
+    """
+    남은 메시지를 Batch API 입력 JSONL로 저장하고, 저장한 파일 경로 목록을 돌려줍니다.
+
+    캐시에 결과가 있는 메시지는 요청하지 않고 바로 중간 결과로 저장합니다.
+    """
+    cached_results = []
+    pending = []
+    for message in remaining_messages:
+        cached = llm_cache.get(cache_key_for(message))
+        if cached is None:
+            pending.append(message)
+        else:
+            cached_results.append({"original_message": message, **cached})
+    if cached_results:
+        save_checkpoint(cached_results)
+        print(f"캐시에서 가져온 메시지 수: {len(cached_results)}")
+
+    paths = []
+    for start in range(0, len(pending), BATCH_MAX_REQUESTS):
+        chunk_path = path
+        if len(pending) > BATCH_MAX_REQUESTS:
+            stem, ext = os.path.splitext(path)
+            chunk_path = f"{stem}_{start // BATCH_MAX_REQUESTS + 1}{ext}"
+        with open(chunk_path, "w", encoding="utf-8") as f:
+            for message in pending[start : start + BATCH_MAX_REQUESTS]:
+                f.write(json.dumps(build_batch_request(message), ensure_ascii=False) + "\n")
+        paths.append(chunk_path)
+    print(f"내보낸 요청 수: {len(pending)} ({', '.join(paths) or '파일 없음'})")
+    return paths
+
+
+def parse_batch_result(line):
+    """결과 한 줄에서 (custom_id, ResponseModel 또는 None, 오류 설명)을 꺼냅니다."""
+    record = json.loads(line)
+    custom_id = record.get("custom_id")
+    response = record.get("response") or {}
+    if record.get("error") or response.get("status_code") != 200:
+        error = record.get("error") or response.get("body", {}).get("error")
+        return custom_id, None, f"요청 실패: {error}"
+    message = response["body"]["choices"][0]["message"]
+    if message.get("refusal"):
+        return custom_id, None, f"응답 거부: {message['refusal']}"
+    try:
+        return custom_id, ResponseModel.model_validate_json(message["content"]), None
+    except ValidationError as e:
+        return custom_id, None, f"형식 오류: {e.errors()[0]['msg']}"
+
+
+def import_batch(results_path, unique_messages, processed_messages):
+    """
+    Batch API 결과 JSONL을 custom_id로 메시지에 맞춰 중간 결과로 병합합니다.
+
+    실패한 요청은 저장하지 않아 다음 export 때 다시 내보내집니다.
+    """
+    by_id = {custom_id_for(message): message for message in unique_messages}
+    improved_results = []
+    seen = set()
+    failed = unknown = skipped = 0
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            custom_id, result, error = parse_batch_result(line)
+            message = by_id.get(custom_id)
+            if message is None:
+                unknown += 1
+                continue
+            if message in processed_messages or message in seen:
+                skipped += 1
+                continue
+            if result is None:
+                print(f"{message[:30]}: {error}")
+                failed += 1
+                continue
+            seen.add(message)
             improved_results.append(
                 {
                     "original_message": message,
@@ -116,65 +301,90 @@ for i in range(0, len(remaining_messages), batch_size):
                     "score": result.score,
                 }
             )
-        except Exception as e:
-            print(f"Error in batch processing: {str(e)}")
-            improved_results.append(
-                {
-                    "original_message": message,
-                    "modified_text": "Error",
-                    "score": 0,
-                }
-            )
-
-    # 100개 처리할 때마다 중간 저장
-    batch_num = (
-        len([f for f in os.listdir(BASE_PATH) if f.startswith("result_batch_")]) + 1
+            # 이후 sync 실행에서도 같은 문구는 다시 요청하지 않음
+            llm_cache.set(cache_key_for(message), result.model_dump())
+    if improved_results:
+        save_checkpoint(improved_results)
+    print(
+        f"병합: {len(improved_results)} · 실패(다음 export에 다시 포함): {failed} · "
+        f"이미 처리됨: {skipped} · 알 수 없는 custom_id: {unknown}"
     )
 
-    temp_df = pd.DataFrame(improved_results)
-    temp_df.to_csv(
-        f"{BASE_PATH}/result_batch_{batch_num}.csv",
-        index=False,
-        encoding="utf-8",
-    )
-    improved_results = []  # 메모리 관리를 위해 저장 후 리스트 초기화
 
+def merge_results(origin_df):
+    # 모든 배치 결과 파일 합치기
+    result_files = [
+        f
+        for f in os.listdir(BASE_PATH)
+        if f.startswith("result_batch_") and f.endswith(".csv")
+    ]
 
-# 모든 배치 결과 파일 합치기
-result_files = [
-    f
-    for f in os.listdir(BASE_PATH)
-    if f.startswith("result_batch_") and f.endswith(".csv")
-]
+    improved_df = pd.DataFrame()
+    for file in result_files:
+        temp_df = pd.read_csv(f"{BASE_PATH}/{file}")
+        improved_df = pd.concat([improved_df, temp_df], ignore_index=True)
 
-improved_df = pd.DataFrame()
-for file in result_files:
-    temp_df = pd.read_csv(f"{BASE_PATH}/{file}")
-    improved_df = pd.concat([improved_df, temp_df], ignore_index=True)
+    # 중복 제거 (혹시 모를 중복 처리된 메시지 제거)
+    improved_df = improved_df.drop_duplicates(subset=["original_message"])
 
-# 중복 제거 (혹시 모를 중복 처리된 메시지 제거)
-improved_df = improved_df.drop_duplicates(subset=["original_message"])
+    # 합친 배치 결과 중간 저장
+    improved_df.to_csv(MERGED_BATCH_PATH, index=False, encoding="utf-8")
+    improved_df.to_excel(MERGED_BATCH_PATH.replace(".csv", ".xlsx"), index=False)
 
-# 합친 배치 결과 중간 저장
-improved_df.to_csv(MERGED_BATCH_PATH, index=False, encoding="utf-8")
-improved_df.to_excel(MERGED_BATCH_PATH.replace(".csv", ".xlsx"), index=False)
+    print(f"배치 결과 병합 완료: {MERGED_BATCH_PATH}")
+    improved_df = pd.read_csv(MERGED_BATCH_PATH, encoding="utf-8")
 
-print(f"배치 결과 병합 완료: {MERGED_BATCH_PATH}")
-improved_df = pd.read_csv(MERGED_BATCH_PATH, encoding="utf-8")
+    # 원본 데이터프레임과 개선된 결과 매칭
+    final_df = origin_df.merge(
+        improved_df, left_on="Message", right_on="original_message", how="left"
+    )
 
+    # 중복되는 original_message 칼럼 제거
+    final_df = final_df.drop(columns=["original_message"])
 
-# 원본 데이터프레임과 개선된 결과 매칭
-final_df = origin_df.merge(
-    improved_df, left_on="Message", right_on="original_message", how="left"
-)
+    # 최종 결과 저장
+    final_df.to_csv(
+        FINAL_RESULT_PATH,
+        index=False,
+        encoding="utf-8",
+    )
+    final_df.to_excel(FINAL_RESULT_PATH.replace(".csv", ".xlsx"), index=False)
 
-# 중복되는 original_message 칼럼 제거
-final_df = final_df.drop(columns=["original_message"])
 
-# 최종 결과 저장
-final_df.to_csv(
-    FINAL_RESULT_PATH,
-    index=False,
-    encoding="utf-8",
-)
-final_df.to_excel(FINAL_RESULT_PATH.replace(".csv", ".xlsx"), index=False)
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--mode", choices=["sync", "export", "import"], default="sync")
+    parser.add_argument("--batch-file", default=BATCH_INPUT_PATH, help="export로 쓸 입력 JSONL")
+    parser.add_argument("--results", help="import로 읽을 Batch API 결과 JSONL")
+    args = parser.parse_args()
+    if args.mode == "import" and not args.results:
+        parser.error("--mode import에는 --results가 필요합니다")
+
+    origin_df = pd.read_csv(f"{BASE_PATH}/message.csv")
+
+    # 유니크한 메시지 추출
+    unique_messages = origin_df["Message"].unique()
+
+    # 이미 처리된 메시지 확인
+    processed_messages = get_processed_messages()
+
+    # 아직 처리되지 않은 메시지만 필터링
+    remaining_messages = [msg for msg in unique_messages if msg not in processed_messages]
+    print(f"전체 메시지 수: {len(unique_messages)}")
+    print(f"이미 처리된 메시지 수: {len(processed_messages)}")
+    print(f"남은 메시지 수: {len(remaining_messages)}")
+
+    if args.mode == "export":
+        export_batch(remaining_messages, args.batch_file)
+        return
+    if args.mode == "import":
+        import_batch(args.results, unique_messages, processed_messages)
+    else:
+        run_sync(remaining_messages)
+    merge_results(origin_df)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""문서 검색 점검: 짧은 검색어로도 해당 구절을 찾는지 확인.
+
+트라이그램 FTS5 색인은 3글자 미만 단어("환불", "배송", "go")를 찾지 못해, 짧은 단어와
+한글 2글자 조각은 별도 unicode61 표로 찾습니다. 임시 디렉터리에 말뭉치(`utils/corpus.py`)와
+업로드 색인(`utils/ingest.FileDocumentIndex`)을 만들고, 질문마다 기대한 구절이 첫 결과인지 봅니다.
+
+    python test/search/search_check.py
+"""
+
+import io
+import os
+import sys
+import tempfile
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(REPO_ROOT)
+
+from utils.corpus import Corpus
+from utils.ingest import FileDocumentIndex
+
+PASSAGES = {
+    "refund.txt": "환불 규정은 구매 후 7일 이내에 신청할 수 있습니다.",
+    "shipping.txt": "배송은 주문 다음 날 출발하며 보통 이틀이 걸립니다.",
+    "golang.txt": "We write the crawler in Go because go routines are cheap.",
+    "account.txt": "비밀번호를 잊었다면 로그인 화면에서 재설정 메일을 요청하세요.",
+}
+# 질문 → 첫 결과로 나와야 하는 문서
+QUESTIONS = {
+    "환불 규정": "refund.txt",
+    "배송": "shipping.txt",
+    "배송은 얼마나 걸려?": "shipping.txt",
+    "go": "golang.txt",
+    "비밀번호 재설정": "account.txt",
+}
+
+
+def check_corpus(directory):
+    corpus = Corpus(os.path.join(directory, "corpus.sqlite3"))
+    for name, text in PASSAGES.items():
+        corpus.ingest(name, io.BytesIO(text.encode("utf-8")))
+    failures = 0
+    for question, expected in QUESTIONS.items():
+        hits = corpus.search(question, k=3)
+        found = hits[0]["document"] if hits else None
+        failures += found != expected
+        print(f"corpus  {'ok ' if found == expected else 'FAIL'} {question!r} → {found}")
+    return failures
+
+
+def check_upload():
+    # 청크가 구절 하나 정도가 되도록 청크 크기를 구절 길이에 맞춤
+    document = "\n\n".join(PASSAGES.values()).encode("utf-8")
+    index = FileDocumentIndex(io.BytesIO(document), chunk_size=60, overlap=0)
+    failures = 0
+    for question, expected in QUESTIONS.items():
+        # 일치하는 청크가 없으면 점수 0인 앞 청크가 나오므로 점수도 확인. 청크 경계에서 구절이
+        # 잘릴 수 있어 구절 앞부분만 비교
+        hits = index.search(question, k=1)
+        found = [n for n in PASSAGES if hits and hits[0][2] > 0 and PASSAGES[n][:10] in hits[0][1]]
+        ok = expected in found
+        failures += not ok
+        print(f"upload  {'ok ' if ok else 'FAIL'} {question!r} → {', '.join(found) or None}")
+    return failures
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        failures = check_corpus(directory) + check_upload()
+    print("all passed" if not failures else f"{failures} failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import functools
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+
+import yaml
+from filelock import FileLock
+
+from utils.metrics import log_metrics
+
+AUTH_CONFIG_PATH = "config.yaml"
+# Attempts at fingerprinting the config while other sessions may be adding users to it
+FINGERPRINT_ATTEMPTS = 3
+# libyaml parses large configs many times faster than the pure-Python loader
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
+class AuthConfig:
+    """
+    Authenticator config loaded once per process and shared by every session.
+
+    The authenticator changes the credentials in place (logins, failed attempts,
+    registration, resets, updates). `save_if_changed()` at the end of a run writes
+    the file back only when its content differs from what was last read or
+    written, atomically and under a file lock so concurrent writers never leave a
+    partial file.
+    """
+
+    def __init__(self, path=AUTH_CONFIG_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(f"{path}.lock")
+        self.runs = 0
+        self.writes = 0
+        self.reloads = 0
+        # Sections moved to another store: written back as read, never compared
+        self._detached = {}
+        self._load()
+
+    def _file_state(self):
+        status = os.stat(self.path)
+        return status.st_mtime_ns, status.st_size
+
+    def _fingerprint(self):
+        for attempt in range(FINGERPRINT_ATTEMPTS):
+            try:
+                dumped = json.dumps(self.config, sort_keys=True, default=str)
+                break
+            except RuntimeError:
+                # Another session changed the credentials mid-dump
+                if attempt == FINGERPRINT_ATTEMPTS - 1:
+                    raise
+        return hashlib.blake2b(dumped.encode("utf-8"), digest_size=16).digest()
+
+    def _load(self):
+        with self._file_lock, open(self.path, "r", encoding="utf-8") as file:
+            self.config = yaml.load(file, Loader=YAML_LOADER)
+        for key in self._detached:
+            self._detached[key] = self.config.pop(key, None)
+        self._loaded_state = self._file_state()
+        self._saved = self._fingerprint()
+
+    def get(self):
+        """
+        Return the shared config, re-reading the file only if it changed on disk.
+
+        Returns:
+            config (dict): Parsed config.yaml, changed in place by the authenticator.
+        """
+        with self._lock:
+            self.runs += 1
+            # Another process (or a manual edit) replaced the file; unsaved changes
+            # of this process are written first, so only a concurrent edit is lost
+            if self._file_state() != self._loaded_state:
+                self.save_if_changed()
+                self._load()
+                self.reloads += 1
+            return self.config
+
+    def detach(self, key):
+        """
+        Stop tracking a section of the config that now lives in another store.
+
+        The section stays in the file as it was read, but no longer costs a
+        comparison on every run.
+
+        Args:
+            key (str): Top-level key, e.g. "credentials".
+
+        Returns:
+            section: The section as read from the file.
+        """
+        with self._lock:
+            if key not in self._detached:
+                self._detached[key] = self.config.pop(key, None)
+                self._saved = self._fingerprint()
+            return self._detached[key]
+
+    def save_if_changed(self):
+        """
+        Write the config back if the authenticator changed it.
+
+        The file is replaced through a temporary file and a rename, so readers see
+        either the old or the new content.
+
+        Returns:
+            written (bool): Whether the file was written.
+        """
+        with self._lock:
+            fingerprint = self._fingerprint()
+            if fingerprint == self._saved:
+                return False
+            started = time.perf_counter()
+            detached = {key: value for key, value in self._detached.items() if value is not None}
+            data = yaml.dump(
+                {**self.config, **detached}, Dumper=YAML_DUMPER, default_flow_style=False
+            )
+            directory = os.path.dirname(os.path.abspath(self.path))
+            with self._file_lock:
+                fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".config.", suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as file:
+                        file.write(data)
+                        file.flush()
+                        os.fsync(file.fileno())
+                    os.chmod(temp_path, stat.S_IMODE(os.stat(self.path).st_mode))
+                    os.replace(temp_path, self.path)
+                except BaseException:
+                    os.unlink(temp_path)
+                    raise
+            self._loaded_state = self._file_state()
+            self._saved = fingerprint
+            self.writes += 1
+        log_metrics(
+            "auth_config_write",
+            path=self.path,
+            bytes=len(data),
+            seconds=round(time.perf_counter() - started, 4),
+            runs=self.runs,
+            writes=self.writes,
+        )
+        return True
+
+    def stats(self):
+        """
+        Return how often the config was written and re-read.
+
+        Returns:
+            stats (dict): runs, writes and reloads since the process started.
+        """
+        with self._lock:
+            return {"runs": self.runs, "writes": self.writes, "reloads": self.reloads}
+
+
+@functools.lru_cache(maxsize=None)
+def get_auth_config(path=AUTH_CONFIG_PATH):
+    """
+    Return the process-wide authenticator config for `path`.
+
+    Returns:
+        auth_config (AuthConfig): Shared config.
+    """
+    return AuthConfig(path)
+
+
+def render_auth_config_stats(container, auth_config=None):
+    """
+    Show how many script runs actually wrote config.yaml.
+
+    Args:
+        container: Streamlit container to render into (e.g. `st.sidebar`).
+        auth_config (AuthConfig): Config to report on, the shared one by default.
+    """
+    stats = (auth_config or get_auth_config()).stats()
+    container.caption(
+        f"config.yaml writes: {stats['writes']} over {stats['runs']} runs · "
+        f"{stats['reloads']} reloads"
+    )
@@ -0,0 +1,187 @@
+import codecs
+import csv
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import streamlit as st
+
+from utils.ingest import decode_bytes
+from utils.metrics import log_metrics
+
+DEFAULT_BATCH_CONCURRENCY = 4
+MAX_BATCH_CONCURRENCY = 16
+# Prompts accepted per run; the rest of a longer list is dropped with a warning
+MAX_BATCH_PROMPTS = 500
+PROMPT_COLUMN = "prompt"
+
+
+def read_prompts(text="", csv_file=None):
+    """
+    Collect batch prompts from a textarea or an uploaded CSV.
+
+    Args:
+        text (str): One prompt per line.
+        csv_file: Uploaded CSV file; prompts are read from its "prompt" column,
+            or from its first column when there is none. Takes precedence over `text`.
+            UTF-8 (with or without a BOM) and CP949/EUC-KR files are both accepted.
+
+    Returns:
+        prompts (list): Non-empty prompts, in input order.
+    """
+    if csv_file is not None:
+        raw = csv_file.getvalue().removeprefix(codecs.BOM_UTF8)
+        reader = csv.DictReader(io.StringIO(decode_bytes(raw)))
+        if not reader.fieldnames:
+            return []
+        column = PROMPT_COLUMN if PROMPT_COLUMN in reader.fieldnames else reader.fieldnames[0]
+        prompts = [row[column] for row in reader]
+    else:
+        prompts = text.splitlines()
+    return [prompt.strip() for prompt in prompts if prompt and prompt.strip()]
+
+
+def _timed(complete, prompt):
+    started = time.perf_counter()
+    try:
+        return complete(prompt), None, time.perf_counter() - started
+    except Exception as e:
+        return None, repr(e), time.perf_counter() - started
+
+
+def run_batch(prompts, complete, concurrency=DEFAULT_BATCH_CONCURRENCY):
+    """
+    Run prompts concurrently and yield each result as soon as it finishes.
+
+    A failing prompt is reported in its result and does not stop the batch.
+
+    Args:
+        prompts (list): Prompts to answer.
+        complete (callable): `complete(prompt)` -> answer text; called from worker threads.
+        concurrency (int): Maximum number of prompts in flight.
+
+    Yields:
+        result (dict): "#" (1-based input position), "prompt", "response",
+            "latency_s" and "error", in completion order.
+    """
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch_prompt")
+    try:
+        futures = {
+            pool.submit(_timed, complete, prompt): index for index, prompt in enumerate(prompts)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            response, error, latency = future.result()
+            yield {
+                "#": index + 1,
+                "prompt": prompts[index],
+                "response": response,
+                "latency_s": round(latency, 3),
+                "error": error,
+            }
+    finally:
+        # A rerun interrupts the script here; queued prompts are not sent
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def batch_summary(results, wall_seconds, concurrency):
+    """
+    Summarize a finished batch.
+
+    Returns:
+        summary (dict): prompts, errors, concurrency, wall_seconds, p50/p95/max
+            latency and speedup (summed latency over wall time).
+    """
+    latencies = [result["latency_s"] for result in results]
+    return {
+        "prompts": len(results),
+        "errors": sum(result["error"] is not None for result in results),
+        "concurrency": concurrency,
+        "wall_seconds": round(wall_seconds, 3),
+        "p50_latency": _percentile(latencies, 0.5),
+        "p95_latency": _percentile(latencies, 0.95),
+        "max_latency": max(latencies, default=0.0),
+        "speedup": round(sum(latencies) / wall_seconds, 2) if wall_seconds > 0 else None,
+    }
+
+
+def results_csv(results):
+    """
+    Return batch results as CSV bytes, in input order.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=["#", "prompt", "response", "latency_s", "error"])
+    writer.writeheader()
+    writer.writerows(sorted(results, key=lambda result: result["#"]))
+    return buffer.getvalue().encode("utf-8-sig")
+
+
+def render_batch_prompts(complete, key, disabled=False):
+    """
+    Render the batch mode: prompt input, a concurrent run and its results.
+
+    Results fill the table as prompts finish and are kept in the session, so they
+    survive the rerun triggered by the download button.
+
+    Args:
+        complete (callable): `complete(prompt)` -> answer text; called from worker threads.
+        key (str): Prefix of this batch view's widget and session state keys.
+        disabled (bool): Whether running is disabled (e.g. no API key yet).
+    """
+    text = st.text_area("Prompts, one per line", key=f"{key}_text", height=200)
+    csv_file = st.file_uploader(
+        f"...or a CSV with a '{PROMPT_COLUMN}' column", type="csv", key=f"{key}_csv"
+    )
+    concurrency = st.slider(
+        "Parallel requests",
+        1,
+        MAX_BATCH_CONCURRENCY,
+        DEFAULT_BATCH_CONCURRENCY,
+        key=f"{key}_concurrency",
+    )
+    prompts = read_prompts(text, csv_file)
+    if len(prompts) > MAX_BATCH_PROMPTS:
+        st.warning(f"Only the first {MAX_BATCH_PROMPTS} of {len(prompts)} prompts are run.")
+        prompts = prompts[:MAX_BATCH_PROMPTS]
+
+    if st.button(f"Run {len(prompts)} prompts", key=f"{key}_run", disabled=disabled or not prompts):
+        progress = st.progress(0.0, text="Running prompts...")
+        table = st.empty()
+        results = []
+        started = time.perf_counter()
+        for result in run_batch(prompts, complete, concurrency):
+            results.append(result)
+            progress.progress(len(results) / len(prompts), text=f"{len(results)}/{len(prompts)}")
+            table.dataframe(results, use_container_width=True, hide_index=True)
+        summary = batch_summary(results, time.perf_counter() - started, concurrency)
+        log_metrics("batch_prompts", page=key, **summary)
+        progress.empty()
+        table.empty()
+        st.session_state[f"{key}_results"] = (results, summary)
+
+    if f"{key}_results" not in st.session_state:
+        return
+    results, summary = st.session_state[f"{key}_results"]
+    st.dataframe(
+        sorted(results, key=lambda result: result["#"]), use_container_width=True, hide_index=True
+    )
+    st.caption(
+        f"{summary['prompts']} prompts · {summary['concurrency']} in parallel · "
+        f"{summary['wall_seconds']:.1f}s total · per prompt p50 {summary['p50_latency']:.2f}s, "
+        f"p95 {summary['p95_latency']:.2f}s · {summary['speedup'] or 0:.1f}x vs one at a time"
+        + (f" · {summary['errors']} failed" if summary["errors"] else "")
+    )
+    st.download_button(
+        "Download results (CSV)",
+        results_csv(results),
+        file_name="batch_results.csv",
+        mime="text/csv",
+        key=f"{key}_download",
+    )
@@ -0,0 +1,101 @@
+import heapq
+import math
+import re
+from collections import defaultdict
+
+WORD_PATTERN = re.compile(r"\w+")
+HANGUL_PATTERN = re.compile(r"[가-힣]")
+
+
+def tokenize(text):
+    """
+    Split text into lower-cased search terms.
+
+    Korean words carry particles (상품을, 상품이), so Hangul words are also
+    split into character bigrams to let "상품" match every inflected form.
+
+    Args:
+        text (str): Text to tokenize.
+
+    Returns:
+        tokens (list): List of search terms.
+    """
+    tokens = []
+    for word in WORD_PATTERN.findall(text.lower()):
+        tokens.append(word)
+        if len(word) > 2 and HANGUL_PATTERN.search(word):
+            tokens.extend(word[i : i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 index over short documents.
+
+    Documents are added one at a time and identified by their insertion order,
+    so callers keep their own list of payloads and map ids back to it.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> {doc_id: term frequency}
+        self.postings = defaultdict(dict)
+        self.doc_lengths = []
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, text):
+        """
+        Add a document to the index.
+
+        Args:
+            text (str): Document text.
+
+        Returns:
+            doc_id (int): Id of the added document.
+        """
+        doc_id = len(self.doc_lengths)
+        tokens = tokenize(text)
+        frequencies = defaultdict(int)
+        for token in tokens:
+            frequencies[token] += 1
+        for token, frequency in frequencies.items():
+            self.postings[token][doc_id] = frequency
+        self.doc_lengths.append(len(tokens))
+        self.total_length += len(tokens)
+        return doc_id
+
+    def search(self, query, k=5, candidates=None):
+        """
+        Return the top-k documents for a query.
+
+        Args:
+            query (str): Free-text query.
+            k (int): Maximum number of results.
+            candidates (set): Optional set of doc ids to restrict the search to.
+
+        Returns:
+            results (list): List of (doc_id, score) tuples, best first.
+        """
+        if not self.doc_lengths:
+            return []
+        average_length = self.total_length / len(self.doc_lengths) or 1
+        scores = defaultdict(float)
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(
+                1 + (len(self.doc_lengths) - len(postings) + 0.5) / (len(postings) + 0.5)
+            )
+            for doc_id, frequency in postings.items():
+                if candidates is not None and doc_id not in candidates:
+                    continue
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / average_length
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (
+                    frequency + self.k1 * length_norm
+                )
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.tokens import count_message_tokens, truncate_tokens
+
+# Recent turns sent verbatim; older turns are folded into the rolling summary
+RECENT_WINDOW_TOKENS = 1500
+SUMMARY_MAX_TOKENS = 400
+# Summaries are written off the request path, shared by every session
+SUMMARY_WORKERS = 4
+
+_summary_pool = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix="chat_summary")
+
+
+def summary_prompt(summary, messages):
+    """
+    Build the chat messages that fold new turns into a running summary.
+
+    Args:
+        summary (str): Current summary, "" if there is none yet.
+        messages (list): Turns to fold in, oldest first.
+
+    Returns:
+        messages (list): Chat messages for the summarizer model.
+    """
+    transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    return [
+        {
+            "role": "system",
+            "content": (
+                "You maintain a running summary of a conversation between a user and an assistant. "
+                "Keep names, facts, decisions and open questions; drop small talk. "
+                "Reply with the updated summary only."
+            ),
+        },
+        {
+            "role": "user",
+            "content": (
+                f"Current summary:\n{summary or 'None'}\n\n"
+                f"New turns:\n{transcript}\n\n"
+                f"Write the updated summary in at most {SUMMARY_MAX_TOKENS // 2} words."
+            ),
+        },
+    ]
+
+
+class ChatHistory:
+    """
+    Conversation context made of a rolling summary and a window of recent turns.
+
+    After each answer, turns that no longer fit in the window are summarized in a
+    background thread. The next turn uses the new summary if it is ready, and
+    otherwise still sends those turns verbatim, so no request waits on a summary.
+    """
+
+    def __init__(self, window_tokens=RECENT_WINDOW_TOKENS):
+        self.window_tokens = window_tokens
+        self.summary = ""
+        # Number of leading messages covered by the summary
+        self.summarized = 0
+        # (future, summarized) of the summary being written, if any
+        self._pending = None
+
+    def _apply_pending(self):
+        if self._pending is None or not self._pending[0].done():
+            return
+        future, summarized = self._pending
+        self._pending = None
+        try:
+            self.summary = truncate_tokens(future.result(), SUMMARY_MAX_TOKENS)
+            self.summarized = summarized
+        except Exception:
+            # Keep the previous summary; the turns are folded in after the next answer
+            pass
+
+    def context(self, messages):
+        """
+        Return the messages to send for the next request.
+
+        Args:
+            messages (list): The whole conversation, oldest first.
+
+        Returns:
+            messages (list): The summary as a system message, followed by every
+                turn it does not cover.
+        """
+        self._apply_pending()
+        context = []
+        if self.summary:
+            context.append(
+                {
+                    "role": "system",
+                    "content": f"Summary of the earlier conversation:\n{self.summary}",
+                }
+            )
+        return context + messages[self.summarized :]
+
+    def schedule_summary(self, messages, summarize):
+        """
+        Start folding the turns that fell out of the recent window into the summary.
+
+        Does nothing while a previous summary is still being written.
+
+        Args:
+            messages (list): The whole conversation, oldest first.
+            summarize (callable): `summarize(prompt_messages)` -> summary text,
+                called in a worker thread.
+        """
+        self._apply_pending()
+        if self._pending is not None:
+            return
+        # Walk back from the latest message until the window is full
+        start = len(messages)
+        tokens = 0
+        while start > self.summarized:
+            tokens += count_message_tokens(messages[start - 1 : start])
+            if tokens > self.window_tokens:
+                break
+            start -= 1
+        if start <= self.summarized:
+            return
+        prompt = summary_prompt(self.summary, messages[self.summarized : start])
+        self._pending = (_summary_pool.submit(summarize, prompt), start)
@@ -0,0 +1,34 @@
+import streamlit as st
+
+# Messages rendered on every rerun; older ones are loaded on demand
+VISIBLE_MESSAGES = 20
+# Older messages revealed per click
+HISTORY_PAGE_MESSAGES = 20
+
+
+def _load_earlier(key):
+    st.session_state[key] += HISTORY_PAGE_MESSAGES
+
+
+def render_chat_history(messages, key):
+    """
+    Render the latest messages of a conversation, with older ones behind a button.
+
+    Only VISIBLE_MESSAGES messages (plus the pages the user loaded) are rendered,
+    so rerun time does not grow with the length of the conversation.
+
+    Args:
+        messages (list): Chat messages, oldest first.
+        key (str): Session state key of this conversation's view.
+    """
+    revealed = st.session_state.setdefault(key, 0)
+    start = max(len(messages) - VISIBLE_MESSAGES - revealed, 0)
+    if start:
+        st.button(
+            f"Load earlier messages ({start} hidden)",
+            key=f"{key}_load_earlier",
+            on_click=_load_earlier,
+            args=(key,),
+        )
+    for message in messages[start:]:
+        st.chat_message(message["role"]).write(message["content"])
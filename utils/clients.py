@@ -0,0 +1,206 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+
+from utils.metrics import log_metrics
+from utils.singleflight import SingleFlight
+
+# Clients unused for this long are dropped; OpenAI clients are closed with them
+CLIENT_IDLE_SECONDS = 15 * 60
+CLIENT_POOL_ENTRIES = 64
+# Keep-alive connections shared by every session using the same client
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60)
+
+
+def key_fingerprint(api_key):
+    """
+    Return a short hash of an API key, so pool keys never hold the key itself.
+    """
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+class ClientPool:
+    """
+    Process-wide pool of API clients and prebuilt agents.
+
+    Entries are keyed on (kind, API key hash, model, settings) and shared by every
+    session. Entries idle for longer than `idle_seconds` are evicted, as are the
+    least recently used ones beyond `max_entries`; evicted clients with a
+    `close()` are closed. Concurrent first requests for the same key build it once.
+    """
+
+    def __init__(self, idle_seconds=CLIENT_IDLE_SECONDS, max_entries=CLIENT_POOL_ENTRIES):
+        self.idle_seconds = idle_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._counts = {"created": 0, "reused": 0, "evicted": 0, "setup_seconds": 0.0}
+
+    def _evict_idle(self, now):
+        evicted = []
+        while self._entries:
+            key, (resource, last_used) = next(iter(self._entries.items()))
+            if now - last_used <= self.idle_seconds and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+            self._counts["evicted"] += 1
+            evicted.append(resource)
+        return evicted
+
+    @staticmethod
+    def _close(resources):
+        # OpenAI clients own an httpx pool; LangChain models and agents have no
+        # close() and release their connections when garbage collected
+        for resource in resources:
+            close = getattr(resource, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    log_metrics("client_close_error", error=repr(e))
+
+    def get(self, key, factory):
+        """
+        Return the pooled resource for `key`, building it with `factory()` if needed.
+
+        Args:
+            key (tuple): Pool key; its first item names the kind of resource.
+            factory (callable): Builds the resource.
+
+        Returns:
+            resource: The pooled client or agent.
+        """
+        with self._lock:
+            now = time.monotonic()
+            evicted = self._evict_idle(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] = now
+                self._entries.move_to_end(key)
+                self._counts["reused"] += 1
+        # Closing waits for open connections, so it happens outside the lock
+        self._close(evicted)
+        if entry is not None:
+            return entry[0]
+
+        def build():
+            started = time.perf_counter()
+            resource = factory()
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._entries[key] = [resource, time.monotonic()]
+                self._counts["created"] += 1
+                self._counts["setup_seconds"] += elapsed
+                evicted = self._evict_idle(time.monotonic())
+            self._close(evicted)
+            log_metrics("client_setup", kind=key[0], setup_seconds=round(elapsed, 4))
+            return resource
+
+        return self._flight.do(key, build)
+
+    def stats(self):
+        """
+        Return pool counters and the setup time saved by reuse.
+
+        Returns:
+            stats (dict): created, reused, evicted, entries, setup_seconds and
+                saved_seconds (reuses times the mean setup time).
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            counts["entries"] = len(self._entries)
+        mean_setup = counts["setup_seconds"] / counts["created"] if counts["created"] else 0.0
+        counts["saved_seconds"] = counts["reused"] * mean_setup
+        return counts
+
+
+client_pool = ClientPool()
+
+
+def get_openai_client(api_key):
+    """
+    Return the pooled OpenAI client for an API key.
+
+    Returns:
+        client (openai.OpenAI): Client with a keep-alive connection pool.
+    """
+    from openai import DefaultHttpxClient, OpenAI
+
+    return client_pool.get(
+        ("openai", key_fingerprint(api_key)),
+        lambda: OpenAI(api_key=api_key, http_client=DefaultHttpxClient(limits=HTTP_LIMITS)),
+    )
+
+
+def get_langchain_llm(api_key, model_name="gpt-3.5-turbo-instruct", **settings):
+    """
+    Return the pooled LangChain completion model for an API key and settings.
+
+    LangChain shares one `http_client` between its sync and async SDK clients, so
+    the model keeps the SDK's default keep-alive pool instead of HTTP_LIMITS.
+
+    Returns:
+        llm (langchain.llms.OpenAI): Model with a keep-alive connection pool.
+    """
+    from langchain.llms import OpenAI
+
+    return client_pool.get(
+        ("langchain_llm", key_fingerprint(api_key), model_name, tuple(sorted(settings.items()))),
+        lambda: OpenAI(model_name=model_name, openai_api_key=api_key, **settings),
+    )
+
+
+def get_chat_model(api_key, model_name="gpt-3.5-turbo", **settings):
+    """
+    Return the pooled LangChain chat model for an API key and settings.
+
+    Returns:
+        llm (langchain.chat_models.ChatOpenAI): Model with a keep-alive connection pool.
+    """
+    from langchain.chat_models import ChatOpenAI
+
+    return client_pool.get(
+        ("chat_model", key_fingerprint(api_key), model_name, tuple(sorted(settings.items()))),
+        lambda: ChatOpenAI(model_name=model_name, openai_api_key=api_key, **settings),
+    )
+
+
+def get_agent(name, api_key, model_name, build, **settings):
+    """
+    Return a pooled agent built once per API key, model and settings.
+
+    Agents keep no per-conversation state; callbacks are passed per run.
+
+    Args:
+        name (str): Name of the agent, part of the pool key.
+        api_key (str): OpenAI API key.
+        model_name (str): Chat model of the agent.
+        build (callable): `build(llm)` -> agent, given the pooled chat model.
+        **settings: Chat model settings (e.g. streaming=True).
+
+    Returns:
+        agent: The pooled agent.
+    """
+    return client_pool.get(
+        ("agent", name, key_fingerprint(api_key), model_name, tuple(sorted(settings.items()))),
+        lambda: build(get_chat_model(api_key, model_name, **settings)),
+    )
+
+
+def render_client_pool_stats(container, pool=client_pool):
+    """
+    Show how much client and agent setup time reuse has saved.
+
+    Args:
+        container: Streamlit container to render into (e.g. `st.sidebar`).
+        pool (ClientPool): Pool to report on.
+    """
+    stats = pool.stats()
+    container.caption(
+        f"Client setup saved: {stats['saved_seconds']:.1f}s over {stats['reused']} reuses / "
+        f"{stats['created']} built, {stats['evicted']} evicted"
+    )
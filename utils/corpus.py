@@ -0,0 +1,273 @@
+import functools
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from utils.fts import (
+    build_fts_query,
+    build_short_term_query,
+    fts_tokenizer,
+    merge_ranked,
+    short_terms_text,
+)
+from utils.ingest import INSERT_BATCH, READ_BLOCK_BYTES, iter_chunks, iter_file_lines
+
+CORPUS_PATH = ".cache/corpus.sqlite3"
+CORPUS_CHUNK_SIZE = 1000
+CORPUS_CHUNK_OVERLAP = 200
+
+
+def content_hash(fileobj):
+    """
+    Hash a binary file object in fixed-size blocks.
+
+    Returns:
+        digest (str): Hex SHA-256 of the content.
+    """
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(READ_BLOCK_BYTES), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+class Corpus:
+    """
+    Persistent multi-document corpus searchable with SQLite FTS5.
+
+    Documents are identified by name and deduplicated by content hash. Ingesting
+    a document again only re-indexes it when its content changed.
+    """
+
+    def __init__(self, path=CORPUS_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(
+                f"""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE,
+                    content_hash TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    chunk_count INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS documents_content_hash
+                    ON documents (content_hash);
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id INTEGER PRIMARY KEY,
+                    document_id INTEGER NOT NULL REFERENCES documents (id),
+                    chunk_no INTEGER NOT NULL,
+                    start_byte INTEGER NOT NULL,
+                    end_byte INTEGER NOT NULL,
+                    text TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS chunks_document_id
+                    ON chunks (document_id);
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                    text, content='chunks', content_rowid='id', tokenize='{fts_tokenizer()}'
+                );
+                CREATE TRIGGER IF NOT EXISTS chunks_after_insert AFTER INSERT ON chunks BEGIN
+                    INSERT INTO chunks_fts (rowid, text) VALUES (new.id, new.text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS chunks_after_delete AFTER DELETE ON chunks BEGIN
+                    INSERT INTO chunks_fts (chunks_fts, rowid, text)
+                    VALUES ('delete', old.id, old.text);
+                END;
+                -- Two-character terms such as "환불" or "go" have no trigram to match
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunks_short USING fts5(
+                    terms, tokenize='unicode61'
+                );
+                CREATE TRIGGER IF NOT EXISTS chunks_short_after_insert AFTER INSERT ON chunks BEGIN
+                    INSERT INTO chunks_short (rowid, terms) VALUES (new.id, short_terms(new.text));
+                END;
+                CREATE TRIGGER IF NOT EXISTS chunks_short_after_delete AFTER DELETE ON chunks BEGIN
+                    DELETE FROM chunks_short WHERE rowid = old.id;
+                END;
+                """
+            )
+            # Corpora indexed before chunks_short existed are filled in once
+            if conn.execute("SELECT 1 FROM chunks LIMIT 1").fetchone() and not conn.execute(
+                "SELECT 1 FROM chunks_short LIMIT 1"
+            ).fetchone():
+                conn.execute(
+                    "INSERT INTO chunks_short (rowid, terms) "
+                    "SELECT id, short_terms(text) FROM chunks"
+                )
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared across Streamlit session threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Used by the chunks_short triggers
+            conn.create_function("short_terms", 1, short_terms_text, deterministic=True)
+            self._local.conn = conn
+        return conn
+
+    def ingest(self, name, fileobj):
+        """
+        Add or update a document.
+
+        Args:
+            name (str): Document name (e.g. the uploaded file name).
+            fileobj: Binary file object with the document content.
+
+        Returns:
+            status (str): "added", "updated", "unchanged" or "duplicate of <name>".
+                A duplicate is not indexed twice; an older version stored under
+                `name` is removed, so it no longer answers questions.
+        """
+        digest = content_hash(fileobj)
+        with self._connection() as conn:
+            # Take the write lock before looking, so sessions ingesting the same
+            # name at once see each other's rows instead of racing on the insert
+            conn.execute("BEGIN IMMEDIATE")
+            existing = conn.execute(
+                "SELECT id, content_hash FROM documents WHERE name = ?", (name,)
+            ).fetchone()
+            if existing and existing[1] == digest:
+                return "unchanged"
+            duplicate = conn.execute(
+                "SELECT name FROM documents WHERE content_hash = ? AND name != ?",
+                (digest, name),
+            ).fetchone()
+            if duplicate:
+                if existing:
+                    self._delete_document(conn, existing[0])
+                return f"duplicate of {duplicate[0]}"
+
+            document_id = conn.execute(
+                "INSERT INTO documents (name, content_hash, size_bytes, chunk_count, updated_at) "
+                "VALUES (?, ?, 0, 0, 0) "
+                "ON CONFLICT (name) DO UPDATE SET content_hash = excluded.content_hash "
+                "RETURNING id",
+                (name, digest),
+            ).fetchone()[0]
+            conn.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,))
+
+            lines = iter_file_lines(fileobj, max_line_bytes=CORPUS_CHUNK_SIZE)
+            batch = []
+            chunk_count = 0
+            for chunk_no, (start, end, text) in enumerate(
+                iter_chunks(lines, CORPUS_CHUNK_SIZE, CORPUS_CHUNK_OVERLAP)
+            ):
+                batch.append((document_id, chunk_no, start, end, text))
+                chunk_count += 1
+                if len(batch) >= INSERT_BATCH:
+                    self._insert_chunks(conn, batch)
+                    batch = []
+            self._insert_chunks(conn, batch)
+
+            fileobj.seek(0, os.SEEK_END)
+            conn.execute(
+                "UPDATE documents SET content_hash = ?, size_bytes = ?, chunk_count = ?, "
+                "updated_at = ? WHERE id = ?",
+                (digest, fileobj.tell(), chunk_count, time.time(), document_id),
+            )
+        return "updated" if existing else "added"
+
+    def _delete_document(self, conn, document_id):
+        conn.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,))
+        conn.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+
+    def _insert_chunks(self, conn, batch):
+        conn.executemany(
+            "INSERT INTO chunks (document_id, chunk_no, start_byte, end_byte, text) "
+            "VALUES (?, ?, ?, ?, ?)",
+            batch,
+        )
+
+    def remove(self, name):
+        """
+        Remove a document and its chunks.
+
+        Args:
+            name (str): Document name.
+        """
+        conn = self._connection()
+        with conn:
+            row = conn.execute("SELECT id FROM documents WHERE name = ?", (name,)).fetchone()
+            if row:
+                self._delete_document(conn, row[0])
+
+    def documents(self):
+        """
+        List the documents in the corpus.
+
+        Returns:
+            documents (list): Dictionaries with name, size_bytes, chunk_count and updated_at.
+        """
+        rows = self._connection().execute(
+            "SELECT name, size_bytes, chunk_count, updated_at FROM documents ORDER BY name"
+        ).fetchall()
+        return [
+            {"name": name, "size_bytes": size, "chunk_count": chunks, "updated_at": updated}
+            for name, size, chunks, updated in rows
+        ]
+
+    def search(self, question, k=5):
+        """
+        Return the passages most relevant to a question across the whole corpus.
+
+        Args:
+            question (str): User question.
+            k (int): Maximum number of passages.
+
+        Returns:
+            hits (list): Dictionaries with document, chunk_no, text and score, best first.
+        """
+        conn = self._connection()
+        rankings = []
+        for table, query in (
+            ("chunks_fts", build_fts_query(question)),
+            ("chunks_short", build_short_term_query(question)),
+        ):
+            if query:
+                rows = conn.execute(
+                    f"SELECT rowid, bm25({table}) AS rank FROM {table} WHERE {table} MATCH ? "
+                    "ORDER BY rank LIMIT ?",
+                    (query, k),
+                ).fetchall()
+                # bm25() is lower-is-better; flip it so higher scores are better
+                rankings.append([(rowid, -rank) for rowid, rank in rows])
+        hits = []
+        for chunk_id, score in merge_ranked(rankings, k):
+            name, chunk_no, text = conn.execute(
+                "SELECT d.name, c.chunk_no, c.text FROM chunks c "
+                "JOIN documents d ON d.id = c.document_id WHERE c.id = ?",
+                (chunk_id,),
+            ).fetchone()
+            hits.append({"document": name, "chunk_no": chunk_no, "text": text, "score": score})
+        return hits
+
+
+@functools.lru_cache(maxsize=None)
+def get_corpus(path=CORPUS_PATH):
+    """
+    Return the process-wide corpus for `path`.
+
+    Returns:
+        corpus (Corpus): Shared corpus.
+    """
+    return Corpus(path)
+
+
+def format_passages(hits):
+    """
+    Join corpus passages into a prompt context, labelled by document and chunk.
+
+    Args:
+        hits (list): Output of `Corpus.search`.
+
+    Returns:
+        context (str): Passages separated by their labels.
+    """
+    return "\n\n".join(
+        f"[{hit['document']} · chunk {hit['chunk_no'] + 1}]\n{hit['text']}" for hit in hits
+    )
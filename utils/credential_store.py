@@ -0,0 +1,479 @@
+import functools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from streamlit_authenticator import Authenticate
+from streamlit_authenticator.models.authentication_model import AuthenticationModel
+from streamlit_authenticator.utilities import (
+    ForgotError,
+    Hasher,
+    Helpers,
+    LoginError,
+    RegisterError,
+    ResetError,
+)
+
+from utils.metrics import log_metrics
+from utils.password_hashing import (
+    HashQueueFull,
+    TooManyFailedAttempts,
+    failed_attempts,
+    password_hasher,
+)
+
+# The only up-to-date copy of the users, so it is kept out of the disposable .cache/
+CREDENTIAL_STORE_PATH = "data/credentials.sqlite3"
+# Fields with their own column; any other field of a user is kept in `extra` as JSON
+USER_FIELDS = ("name", "email", "password", "failed_login_attempts", "logged_in")
+MIGRATION_BATCH = 5000
+# Set by the reverse proxy in front of Streamlit; its last entry is the client it saw
+CLIENT_ADDRESS_HEADER = "X-Forwarded-For"
+
+logger = logging.getLogger(__name__)
+
+
+def client_address():
+    """
+    Return the address of the client of the current session, if a proxy reports it.
+
+    Only the last entry of the header is used: earlier ones are sent by the client
+    and can be forged to dodge the failed login limit.
+
+    Returns:
+        address (str): Client address, or None without a proxy header.
+    """
+    # Outside a session (benchmarks, worker threads) there is no request to look at
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return None
+    forwarded = st.context.headers.get(CLIENT_ADDRESS_HEADER)
+    if not forwarded:
+        return None
+    return forwarded.split(",")[-1].strip() or None
+
+
+def _record_values(values):
+    extra = {key: value for key, value in values.items() if key not in USER_FIELDS}
+    return (
+        values.get("name"),
+        values.get("email"),
+        values.get("password"),
+        int(values.get("failed_login_attempts") or 0),
+        int(bool(values.get("logged_in"))),
+        json.dumps(extra, ensure_ascii=False) if extra else None,
+    )
+
+
+class UserRecord(MutableMapping):
+    """
+    One user's credentials; assigning a field updates only that field of its row.
+    """
+
+    def __init__(self, store, username, values):
+        self.store = store
+        self.username = username
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __setitem__(self, key, value):
+        self.store.update_field(self.username, key, value)
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        raise TypeError("user fields cannot be deleted")
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+
+class UserTable(MutableMapping):
+    """
+    The `credentials["usernames"]` mapping of streamlit-authenticator, backed by SQLite.
+
+    Membership tests and lookups read a single row by primary key; iterating
+    scans the whole table and is avoided by `SQLiteAuthenticationModel`.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __contains__(self, username):
+        return self.store.get_user(username) is not None
+
+    def __getitem__(self, username):
+        values = self.store.get_user(username)
+        if values is None:
+            raise KeyError(username)
+        return UserRecord(self.store, username, values)
+
+    def __setitem__(self, username, values):
+        self.store.put_user(username, values)
+
+    def __delitem__(self, username):
+        if not self.store.delete_user(username):
+            raise KeyError(username)
+
+    def __iter__(self):
+        return self.store.iter_usernames()
+
+    def __len__(self):
+        return self.store.count_users()
+
+
+class CredentialStore:
+    """
+    User credentials in an SQLite table with indexed username and email lookups.
+
+    Replaces `credentials.usernames` of config.yaml: users are imported once by
+    `migrate`, then every change is a row-level update.
+    """
+
+    def __init__(self, path=CREDENTIAL_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._migrated = False
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS users (
+                    username TEXT PRIMARY KEY,
+                    name TEXT,
+                    email TEXT,
+                    password TEXT,
+                    failed_login_attempts INTEGER NOT NULL DEFAULT 0,
+                    logged_in INTEGER NOT NULL DEFAULT 0,
+                    extra TEXT
+                );
+                CREATE INDEX IF NOT EXISTS users_email ON users (email);
+                CREATE INDEX IF NOT EXISTS users_logged_in ON users (logged_in) WHERE logged_in;
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                """
+            )
+        self.users = UserTable(self)
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared across Streamlit session threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get_user(self, username):
+        """
+        Return one user's fields, or None if there is no such user.
+
+        Returns:
+            values (dict): name, email, password, failed_login_attempts, logged_in
+                and any extra fields.
+        """
+        row = self._connection().execute(
+            "SELECT name, email, password, failed_login_attempts, logged_in, extra "
+            "FROM users WHERE username = ?",
+            (username,),
+        ).fetchone()
+        if row is None:
+            return None
+        values = dict(zip(USER_FIELDS, row[:5]))
+        values["logged_in"] = bool(values["logged_in"])
+        if row[5]:
+            values.update(json.loads(row[5]))
+        return values
+
+    def put_user(self, username, values):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO users "
+                "(username, name, email, password, failed_login_attempts, logged_in, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (username, *_record_values(values)),
+            )
+
+    def delete_user(self, username):
+        with self._connection() as conn:
+            return conn.execute("DELETE FROM users WHERE username = ?", (username,)).rowcount > 0
+
+    def update_field(self, username, key, value):
+        """
+        Update one field of one user.
+
+        Args:
+            username (str): User to update.
+            key (str): Field name, e.g. "failed_login_attempts".
+            value: New value.
+        """
+        with self._connection() as conn:
+            if key in USER_FIELDS:
+                if key in ("failed_login_attempts", "logged_in"):
+                    value = int(value)
+                conn.execute(f"UPDATE users SET {key} = ? WHERE username = ?", (value, username))
+            else:
+                conn.execute(
+                    "UPDATE users SET extra = json_set(COALESCE(extra, '{}'), ?, json(?)) "
+                    "WHERE username = ?",
+                    (f'$."{key}"', json.dumps(value, ensure_ascii=False), username),
+                )
+
+    def record_failed_login(self, username, reset=False):
+        """
+        Add one failed login attempt to a user, or reset the count to 0.
+
+        Increments in SQL, so concurrent sessions failing at once all count.
+
+        Args:
+            username (str): User that failed (or succeeded) to log in.
+            reset (bool): Reset the count instead of incrementing it.
+        """
+        with self._connection() as conn:
+            if reset:
+                conn.execute(
+                    "UPDATE users SET failed_login_attempts = 0 WHERE username = ?", (username,)
+                )
+            else:
+                conn.execute(
+                    "UPDATE users SET failed_login_attempts = failed_login_attempts + 1 "
+                    "WHERE username = ?",
+                    (username,),
+                )
+
+    def iter_usernames(self):
+        rows = self._connection().execute("SELECT username FROM users ORDER BY username")
+        for (username,) in rows:
+            yield username
+
+    def count_users(self):
+        return self._connection().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def find_username(self, email):
+        """
+        Return the username registered with an email, or None.
+        """
+        row = self._connection().execute(
+            "SELECT username FROM users WHERE email = ? ORDER BY username LIMIT 1", (email,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def count_logged_in(self):
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM users WHERE logged_in"
+        ).fetchone()[0]
+
+    def migrate(self, credentials, source="config.yaml"):
+        """
+        Import the users of a streamlit-authenticator credentials dict, once.
+
+        The dict is only a seed: after the import the store is the source of truth
+        and changes are not written back, so importing again into an empty store
+        brings back the seed as it was, not the current users.
+
+        Usernames are lowercased and plain-text passwords hashed, as
+        streamlit-authenticator does on start-up, so the store can be used with
+        `auto_hash=False`. Later calls return immediately.
+
+        Args:
+            credentials (dict): `config["credentials"]` with a "usernames" mapping.
+            source (str): Where the credentials came from, recorded in the store.
+
+        Returns:
+            imported (int): Number of users imported by this call.
+        """
+        if self._migrated:
+            return 0
+        with self._connection() as conn:
+            # Take the write lock before checking, so sessions or processes starting
+            # together import once instead of racing on the meta row
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_from'").fetchone():
+                self._migrated = True
+                return 0
+            started = time.perf_counter()
+            batch = []
+            imported = 0
+            for username, values in (credentials.get("usernames") or {}).items():
+                values = dict(values)
+                if values.get("password") and not Hasher._is_hash(values["password"]):
+                    values["password"] = Hasher._hash(values["password"])
+                batch.append((username.lower(), *_record_values(values)))
+                if len(batch) == MIGRATION_BATCH:
+                    imported += self._insert_users(conn, batch)
+                    batch = []
+            imported += self._insert_users(conn, batch)
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('migrated_from', ?)",
+                (json.dumps({"source": source, "users": imported, "at": time.time()}),),
+            )
+        self._migrated = True
+        log_metrics(
+            "credential_migration",
+            source=source,
+            users=imported,
+            seconds=round(time.perf_counter() - started, 4),
+        )
+        return imported
+
+    def _insert_users(self, conn, rows):
+        # Users already in the store (e.g. registered before a re-import) are kept
+        return conn.executemany(
+            "INSERT OR IGNORE INTO users "
+            "(username, name, email, password, failed_login_attempts, logged_in, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        ).rowcount
+
+
+class SQLiteAuthenticationModel(AuthenticationModel):
+    """
+    streamlit-authenticator model answering full-scan questions with indexed queries.
+
+    Passwords are hashed and checked on the shared bounded pool rather than the
+    script thread, and users who keep failing to log in are throttled.
+    """
+
+    def __init__(
+        self,
+        store,
+        pre_authorized=None,
+        validator=None,
+        hasher=password_hasher,
+        limiter=failed_attempts,
+    ):
+        super().__init__({"usernames": {}}, pre_authorized, validator, auto_hash=False)
+        self.store = store
+        self.hasher = hasher
+        self.limiter = limiter
+        self.credentials = {"usernames": store.users}
+
+    def _count_concurrent_users(self):
+        return self.store.count_logged_in()
+
+    def _credentials_contains_value(self, value):
+        # Only used with emails (registration and email updates)
+        return self.store.find_username(value) is not None
+
+    def _get_username(self, key, value):
+        if key == "email":
+            return self.store.find_username(value) or False
+        return super()._get_username(key, value)
+
+    def check_credentials(
+        self, username, password, max_concurrent_users=None, max_login_attempts=None
+    ):
+        if (
+            isinstance(max_concurrent_users, int)
+            and self._count_concurrent_users() > max_concurrent_users - 1
+        ):
+            raise LoginError("Maximum number of concurrent users exceeded")
+        user = self.credentials["usernames"].get(username)
+        if user is None:
+            return False
+        if (
+            isinstance(max_login_attempts, int)
+            and user.get("failed_login_attempts", 0) >= max_login_attempts
+        ):
+            raise LoginError("Maximum number of login attempts exceeded")
+        client = client_address()
+        try:
+            # Throttled users are turned away before they cost a hash
+            self.limiter.check(username, client)
+            valid = self.hasher.check(password, user["password"])
+        except (HashQueueFull, TooManyFailedAttempts) as e:
+            raise LoginError(str(e)) from e
+        except (TypeError, ValueError) as e:
+            logger.warning("Could not check the password of %r: %s", username, e)
+            return None
+        if valid:
+            self.limiter.reset(username, client)
+            return True
+        self.limiter.record_failure(username, client)
+        self._record_failed_login_attempts(username)
+        return False
+
+    def _record_failed_login_attempts(self, username, reset=False):
+        # The base class reads the count and writes it back, losing increments
+        # from sessions that fail at the same time
+        self.store.record_failed_login(username, reset)
+
+    def reset_password(self, username, password, new_password, callback=None):
+        try:
+            return super().reset_password(username, password, new_password, callback)
+        except LoginError as e:
+            raise ResetError(str(e)) from e
+
+    def _hash(self, password, error):
+        try:
+            return self.hasher.hash(password)
+        except HashQueueFull as e:
+            raise error(str(e)) from e
+
+    def _register_credentials(self, username, name, password, email):
+        self.credentials["usernames"][username] = {
+            "name": name,
+            "password": self._hash(password, RegisterError),
+            "email": email,
+            "logged_in": False,
+        }
+
+    def _update_password(self, username, password):
+        self.credentials["usernames"][username]["password"] = self._hash(password, ResetError)
+
+    def _set_random_password(self, username):
+        random_password = Helpers.generate_random_pw()
+        self.credentials["usernames"][username]["password"] = self._hash(
+            random_password, ForgotError
+        )
+        return random_password
+
+
+class SQLiteAuthenticate(Authenticate):
+    """
+    `stauth.Authenticate` reading and updating users in a `CredentialStore`.
+    """
+
+    def __init__(
+        self,
+        store,
+        cookie_name,
+        cookie_key,
+        cookie_expiry_days=30.0,
+        pre_authorized=None,
+        validator=None,
+    ):
+        super().__init__(
+            {"usernames": {}},
+            cookie_name,
+            cookie_key,
+            cookie_expiry_days,
+            pre_authorized,
+            validator,
+            auto_hash=False,
+        )
+        self.authentication_controller.authentication_model = SQLiteAuthenticationModel(
+            store, pre_authorized, validator
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def get_credential_store(path=CREDENTIAL_STORE_PATH):
+    """
+    Return the process-wide credential store for `path`.
+
+    Returns:
+        store (CredentialStore): Shared store.
+    """
+    return CredentialStore(path)
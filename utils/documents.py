@@ -0,0 +1,146 @@
+import hashlib
+
+import streamlit as st
+
+from utils.bm25 import BM25Index
+from utils.ingest import FileDocumentIndex, iter_chunks, iter_file_lines, iter_text_lines
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 200
+DEFAULT_TOP_K = 4
+# Distinct uploads kept decoded and indexed, shared by every session
+DOCUMENT_CACHE_ENTRIES = 32
+# Larger uploads are spooled to disk and indexed with SQLite FTS5
+LARGE_UPLOAD_BYTES = 5 << 20
+# Larger documents are never sent to the model in one prompt
+WHOLE_DOCUMENT_MAX_BYTES = 1 << 20
+# Plain-text formats accepted by the document Q&A uploaders
+UPLOAD_TYPES = ("txt", "md", "log", "csv", "tsv", "json", "srt", "vtt")
+
+
+def chunk_text(text, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_CHUNK_OVERLAP):
+    """
+    Split text into overlapping chunks of roughly `chunk_size` characters.
+
+    Chunks end on line breaks; lines longer than `chunk_size` are split.
+
+    Args:
+        text (str): Document text.
+        chunk_size (int): Target chunk length in characters.
+        overlap (int): Maximum characters shared by consecutive chunks.
+
+    Returns:
+        chunks (list): List of chunk strings.
+    """
+    lines = iter_text_lines(text, max_line_chars=chunk_size)
+    return [chunk for _, _, chunk in iter_chunks(lines, chunk_size, overlap)]
+
+
+class DocumentIndex:
+    """
+    Chunked BM25 index over a single document.
+    """
+
+    def __init__(self, text, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_CHUNK_OVERLAP):
+        self.text = text
+        self.size_bytes = len(text.encode("utf-8"))
+        self.chunks = chunk_text(text, chunk_size, overlap)
+        self.index = BM25Index()
+        for chunk in self.chunks:
+            self.index.add(chunk)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def iter_sections(self, section_size):
+        """
+        Yield consecutive, non-overlapping sections of about `section_size` characters.
+        """
+        lines = iter_text_lines(self.text, max_line_chars=section_size)
+        for _, _, section in iter_chunks(lines, section_size, 0):
+            yield section
+
+    def search(self, question, k=DEFAULT_TOP_K):
+        """
+        Return the chunks most relevant to a question.
+
+        Falls back to the first chunks when no chunk shares a term with the
+        question (e.g. "Can you give me a short summary?").
+
+        Args:
+            question (str): User question.
+            k (int): Maximum number of chunks.
+
+        Returns:
+            hits (list): List of (chunk_no, chunk, score) tuples in document order.
+        """
+        results = self.index.search(question, k=k)
+        if not results:
+            results = [(chunk_no, 0.0) for chunk_no in range(min(k, len(self.chunks)))]
+        return [
+            (chunk_no, self.chunks[chunk_no], score)
+            for chunk_no, score in sorted(results)
+        ]
+
+
+@st.cache_resource(max_entries=DOCUMENT_CACHE_ENTRIES, show_spinner="Indexing document...")
+def _load_document_index(content_hash, _uploaded_file):
+    # Keyed on the content hash only; the upload itself is not hashed by Streamlit
+    if _uploaded_file.size > LARGE_UPLOAD_BYTES:
+        return FileDocumentIndex(_uploaded_file, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP)
+    # Decoded line by line so files mixing UTF-8 and CP949 still load
+    text = "".join(line for _, _, line in iter_file_lines(_uploaded_file))
+    return DocumentIndex(text)
+
+
+def load_uploaded_document(uploaded_file):
+    """
+    Return the decoded and indexed document of an upload.
+
+    Each distinct content is decoded, chunked and indexed once per process and
+    reused across reruns and sessions; the least recently used entries are evicted
+    beyond DOCUMENT_CACHE_ENTRIES. Uploads above LARGE_UPLOAD_BYTES are streamed
+    into a disk-backed `FileDocumentIndex` instead of being decoded in memory.
+
+    Args:
+        uploaded_file (UploadedFile): File returned by `st.file_uploader`.
+
+    Returns:
+        document_index (DocumentIndex or FileDocumentIndex): Index whose `text`
+            is the decoded document.
+    """
+    # Hash each upload once per session instead of on every keystroke
+    digests = st.session_state.setdefault("upload_digests", {})
+    content_hash = digests.get(uploaded_file.file_id)
+    if content_hash is None:
+        content_hash = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+        digests[uploaded_file.file_id] = content_hash
+    return _load_document_index(content_hash, uploaded_file)
+
+
+def format_chunks(hits):
+    """
+    Join retrieved chunks into a prompt context, labelled by chunk number.
+
+    Args:
+        hits (list): Output of `DocumentIndex.search`.
+
+    Returns:
+        context (str): Chunks separated by their labels.
+    """
+    return "\n\n".join(f"[Chunk {chunk_no + 1}]\n{chunk}" for chunk_no, chunk, _ in hits)
+
+
+def render_used_chunks(container, hits, total_chunks):
+    """
+    Show which chunks were sent to the model in a collapsed expander.
+
+    Args:
+        container: Streamlit container to render into (e.g. `st`).
+        hits (list): Output of `DocumentIndex.search`.
+        total_chunks (int): Number of chunks in the document.
+    """
+    expander = container.expander(f"Used {len(hits)} of {total_chunks} chunks")
+    for chunk_no, chunk, score in hits:
+        expander.markdown(f"**Chunk {chunk_no + 1}** · score {score:.2f}")
+        expander.text(chunk)
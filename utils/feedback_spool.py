@@ -0,0 +1,271 @@
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SPOOL_PATH = ".cache/feedback.sqlite3"
+# Records uploaded per worker cycle
+UPLOAD_BATCH = 50
+# Seconds between worker cycles when nobody wakes the worker up
+UPLOAD_INTERVAL = 30
+# Failed records are retried with exponential backoff, up to MAX_UPLOAD_ATTEMPTS times
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 15 * 60
+MAX_UPLOAD_ATTEMPTS = 10
+
+
+class FeedbackSpool:
+    """
+    Durable, append-only local store of user feedback.
+
+    Feedback is written here first and uploaded later, so recording feedback never
+    waits on the network. Rows are only updated to track their upload state.
+    """
+
+    def __init__(self, path=SPOOL_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS feedback (
+                    id INTEGER PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    component TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    score TEXT,
+                    text TEXT,
+                    metadata TEXT NOT NULL,
+                    uploaded_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL DEFAULT 0,
+                    last_error TEXT
+                );
+                CREATE INDEX IF NOT EXISTS feedback_pending
+                    ON feedback (uploaded_at, next_attempt_at);
+                """
+            )
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared across Streamlit session threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, component, model, response, metadata):
+        """
+        Record one feedback response.
+
+        Args:
+            component (str): Feedback component name in Trubrics.
+            model (str): Model that produced the rated answer.
+            response (dict): Value returned by `streamlit_feedback` ("type", "score", "text").
+            metadata (dict): JSON-serializable context, e.g. the chat.
+
+        Returns:
+            feedback_id (int): Row id of the record.
+        """
+        with self._connection() as conn:
+            return conn.execute(
+                "INSERT INTO feedback (created_at, component, model, type, score, text, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    time.time(),
+                    component,
+                    model,
+                    response.get("type", ""),
+                    response.get("score"),
+                    response.get("text"),
+                    json.dumps(metadata, ensure_ascii=False),
+                ),
+            ).lastrowid
+
+    def pending(self, limit=UPLOAD_BATCH):
+        """
+        Return records due for upload, oldest first.
+
+        Returns:
+            records (list): Dictionaries with the stored fields.
+        """
+        rows = self._connection().execute(
+            "SELECT id, component, model, type, score, text, metadata, attempts FROM feedback "
+            "WHERE uploaded_at IS NULL AND attempts < ? AND next_attempt_at <= ? "
+            "ORDER BY id LIMIT ?",
+            (MAX_UPLOAD_ATTEMPTS, time.time(), limit),
+        ).fetchall()
+        return [
+            {
+                "id": row[0],
+                "component": row[1],
+                "model": row[2],
+                "user_response": {"type": row[3], "score": row[4], "text": row[5]},
+                "metadata": json.loads(row[6]),
+                "attempts": row[7],
+            }
+            for row in rows
+        ]
+
+    def mark_uploaded(self, ids):
+        with self._connection() as conn:
+            conn.executemany(
+                "UPDATE feedback SET uploaded_at = ?, last_error = NULL WHERE id = ?",
+                [(time.time(), feedback_id) for feedback_id in ids],
+            )
+
+    def mark_failed(self, ids, error):
+        # Exponential backoff: 5s, 10s, 20s, ... up to RETRY_MAX_SECONDS
+        with self._connection() as conn:
+            conn.executemany(
+                "UPDATE feedback SET attempts = attempts + 1, last_error = ?, "
+                "next_attempt_at = ? + MIN(?, ? * (1 << attempts)) WHERE id = ?",
+                [
+                    (error, time.time(), RETRY_MAX_SECONDS, RETRY_BASE_SECONDS, feedback_id)
+                    for feedback_id in ids
+                ],
+            )
+
+    def summary(self):
+        """
+        Aggregate the spooled feedback for the local feedback view.
+
+        Returns:
+            summary (dict): "scores" maps each score to its count, and "uploaded",
+                "pending" and "failed" count records by upload state.
+        """
+        conn = self._connection()
+        scores = dict(
+            conn.execute(
+                "SELECT COALESCE(score, ''), COUNT(*) FROM feedback GROUP BY score ORDER BY score"
+            ).fetchall()
+        )
+        uploaded, pending, failed = conn.execute(
+            "SELECT COUNT(uploaded_at), "
+            "SUM(uploaded_at IS NULL AND attempts < ?), "
+            "SUM(uploaded_at IS NULL AND attempts >= ?) FROM feedback",
+            (MAX_UPLOAD_ATTEMPTS, MAX_UPLOAD_ATTEMPTS),
+        ).fetchone()
+        return {
+            "scores": scores,
+            "uploaded": uploaded,
+            "pending": pending or 0,
+            "failed": failed or 0,
+        }
+
+    def recent(self, limit=20):
+        """
+        Return the latest feedback with a comment, newest first.
+
+        Returns:
+            records (list): Dictionaries with created_at, score and text.
+        """
+        rows = self._connection().execute(
+            "SELECT created_at, score, text FROM feedback WHERE text IS NOT NULL AND text != '' "
+            "ORDER BY id DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [{"created_at": row[0], "score": row[1], "text": row[2]} for row in rows]
+
+
+class FeedbackUploader:
+    """
+    Background worker uploading spooled feedback in batches.
+
+    The worker connects (and authenticates) once, on its first batch, and
+    reconnects only after a failed batch. `notify()` wakes it up right away.
+    """
+
+    def __init__(self, spool, connect, interval=UPLOAD_INTERVAL):
+        """
+        Args:
+            spool (FeedbackSpool): Spool to upload from.
+            connect (callable): `connect()` -> client with a Trubrics-style
+                `log_feedback(component, model, user_response, metadata=...)`
+                that returns None on failure.
+            interval (float): Seconds between cycles when not notified.
+        """
+        self.spool = spool
+        self.connect = connect
+        self.interval = interval
+        self._client = None
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="feedback_uploader", daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            while self.upload_batch():
+                pass
+
+    def upload_batch(self):
+        """
+        Upload one batch of pending records.
+
+        Returns:
+            uploaded (bool): Whether every record of a full batch was uploaded,
+                i.e. whether another batch may be waiting.
+        """
+        records = self.spool.pending()
+        if not records:
+            return False
+        uploaded = []
+        try:
+            if self._client is None:
+                self._client = self.connect()
+            for record in records:
+                result = self._client.log_feedback(
+                    component=record["component"],
+                    model=record["model"],
+                    user_response=record["user_response"],
+                    metadata=record["metadata"],
+                )
+                if result is None:
+                    raise RuntimeError("Trubrics rejected the feedback")
+                uploaded.append(record["id"])
+        except Exception as e:
+            self._client = None
+            failed = [record["id"] for record in records if record["id"] not in uploaded]
+            self.spool.mark_failed(failed, repr(e))
+            return False
+        finally:
+            self.spool.mark_uploaded(uploaded)
+        return len(records) == UPLOAD_BATCH
+
+
+@functools.lru_cache(maxsize=None)
+def get_feedback_spool(path=SPOOL_PATH):
+    """
+    Return the process-wide feedback spool for `path`.
+
+    Returns:
+        spool (FeedbackSpool): Shared spool.
+    """
+    return FeedbackSpool(path)
+
+
+@functools.lru_cache(maxsize=None)
+def get_trubrics_uploader(email, password, project="default"):
+    """
+    Start the process-wide worker uploading spooled feedback to Trubrics.
+
+    Returns:
+        uploader (FeedbackUploader): Running uploader.
+    """
+
+    def connect():
+        from trubrics import Trubrics
+
+        return Trubrics(email=email, password=password, project=project)
+
+    return FeedbackUploader(get_feedback_spool(), connect)
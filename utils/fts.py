@@ -0,0 +1,102 @@
+import functools
+import sqlite3
+
+from utils.bm25 import WORD_PATTERN, tokenize
+
+# Terms shorter than this have no trigram, so they are matched in a second table
+TRIGRAM_CHARS = 3
+
+
+@functools.lru_cache(maxsize=None)
+def fts_tokenizer():
+    """
+    Return the FTS5 tokenizer to use for Korean and English text.
+
+    The trigram tokenizer (SQLite 3.34+) matches inside Korean words that carry
+    particles; older builds fall back to unicode61.
+
+    Returns:
+        tokenizer (str): "trigram" or "unicode61".
+    """
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE probe USING fts5(text, tokenize='trigram')")
+        return "trigram"
+    except sqlite3.OperationalError:
+        return "unicode61"
+    finally:
+        conn.close()
+
+
+def build_fts_query(question, tokenizer=None):
+    """
+    Turn a free-text question into an FTS5 MATCH expression.
+
+    Terms are OR-ed so that bm25() ranks passages by how many of them they share.
+
+    Args:
+        question (str): User question.
+        tokenizer (str): Tokenizer of the queried table, `fts_tokenizer()` by default.
+
+    Returns:
+        query (str): MATCH expression, or "" if the question has no searchable terms.
+    """
+    tokenizer = tokenizer or fts_tokenizer()
+    terms = []
+    for word in WORD_PATTERN.findall(question.lower()):
+        if tokenizer == "trigram":
+            # Every 3-character window, so "토스페이먼츠를" still matches "토스페이먼츠"
+            terms.extend(word[i : i + 3] for i in range(max(len(word) - 2, 0)))
+        else:
+            terms.append(word)
+    terms = list(dict.fromkeys(term for term in terms if term))
+    return " OR ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def short_terms_text(text):
+    """
+    Return the terms of a text that the trigram index cannot match.
+
+    These are words under three characters, plus the character bigrams of Hangul
+    words (as in `utils.bm25.tokenize`), so "환불" also matches "환불을". They are
+    indexed in a second, unicode61 table next to the trigram one.
+
+    Args:
+        text (str): Chunk text.
+
+    Returns:
+        terms (str): Space-separated terms.
+    """
+    return " ".join(term for term in tokenize(text) if len(term) < TRIGRAM_CHARS)
+
+
+def build_short_term_query(question):
+    """
+    Turn a question into a MATCH expression for the table of `short_terms_text`.
+
+    Args:
+        question (str): User question.
+
+    Returns:
+        query (str): MATCH expression, or "" if the question has no short terms.
+    """
+    terms = dict.fromkeys(short_terms_text(question).split())
+    return " OR ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def merge_ranked(rankings, k):
+    """
+    Combine (id, score) lists from several tables, adding the scores of shared ids.
+
+    Args:
+        rankings (list): Lists of (id, score), higher scores better.
+        k (int): Maximum number of ids to return.
+
+    Returns:
+        ranked (list): (id, score) tuples, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for row_id, score in ranking:
+            scores[row_id] = scores.get(row_id, 0.0) + score
+    return sorted(scores.items(), key=lambda item: -item[1])[:k]
@@ -0,0 +1,306 @@
+import mmap
+import os
+import shutil
+import sqlite3
+import tempfile
+import weakref
+from array import array
+
+from utils.fts import (
+    build_fts_query,
+    build_short_term_query,
+    fts_tokenizer,
+    merge_ranked,
+    short_terms_text,
+)
+
+READ_BLOCK_BYTES = 1 << 20
+# Lines are read at most this many bytes at a time, so minified logs and
+# transcripts without line breaks never load as one huge string.
+MAX_LINE_BYTES = 4096
+# Rows inserted per transaction while indexing
+INSERT_BATCH = 500
+
+
+def decode_bytes(raw):
+    """
+    Decode one line of a document that may mix UTF-8 and CP949.
+
+    Korean documents exported from older Windows tools often switch encoding
+    between lines, so each line is decoded on its own.
+
+    Args:
+        raw (bytes): Encoded line.
+
+    Returns:
+        text (str): Decoded line.
+    """
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        pass
+    try:
+        return raw.decode("cp949")
+    except UnicodeDecodeError:
+        return raw.decode("utf-8", errors="replace")
+
+
+# Bytes below 0x41 (whitespace, digits, punctuation) are never part of a UTF-8 or
+# CP949 multibyte character, so a piece can always end after one of them
+_SAFE_BREAK_BYTE = 0x41
+
+
+def _safe_cut(raw):
+    # Length of the piece to keep: up to the last space, else the last byte that
+    # ends a character in both encodings, else the last whole character
+    space = max(raw.rfind(b" "), raw.rfind(b"\t"))
+    if space > 0:
+        return space + 1
+    for index in range(len(raw) - 1, 0, -1):
+        if raw[index] < _SAFE_BREAK_BYTE:
+            return index + 1
+    cut = _utf8_safe_cut(raw)
+    try:
+        raw[:cut].decode("utf-8")
+        return cut
+    except UnicodeDecodeError:
+        return _cp949_safe_cut(raw)
+
+
+def _cp949_safe_cut(raw):
+    # Length of `raw` without a trailing CP949 lead byte; `raw` starts on a character
+    index = 0
+    while index < len(raw):
+        width = 2 if raw[index] >= 0x81 else 1
+        if index + width > len(raw):
+            return index
+        index += width
+    return index
+
+
+def _utf8_safe_cut(raw):
+    # Length of `raw` without a trailing, incomplete UTF-8 sequence
+    for back in range(1, min(4, len(raw)) + 1):
+        byte = raw[-back]
+        if byte & 0xC0 == 0x80:
+            continue
+        if byte >= 0xF0:
+            needed = 4
+        elif byte >= 0xE0:
+            needed = 3
+        elif byte >= 0xC0:
+            needed = 2
+        else:
+            needed = 1
+        return len(raw) - back if needed > back else len(raw)
+    return len(raw)
+
+
+def iter_file_lines(fileobj, max_line_bytes=MAX_LINE_BYTES):
+    """
+    Read a binary file line by line without loading it into memory.
+
+    Args:
+        fileobj: Binary file object (an upload buffer or an open file).
+        max_line_bytes (int): Longer lines are yielded in pieces.
+
+    Yields:
+        line (tuple): (start_byte, end_byte, text) of each line or line piece.
+    """
+    fileobj.seek(0)
+    offset = 0
+    while True:
+        raw = fileobj.readline(max_line_bytes)
+        if not raw:
+            return
+        if len(raw) == max_line_bytes and not raw.endswith(b"\n"):
+            # Do not split a word, or a UTF-8 or CP949 character, across two pieces
+            cut = _safe_cut(raw)
+            if 0 < cut < len(raw):
+                fileobj.seek(offset + cut)
+                raw = raw[:cut]
+        yield offset, offset + len(raw), decode_bytes(raw)
+        offset += len(raw)
+
+
+def iter_text_lines(text, max_line_chars=MAX_LINE_BYTES):
+    """
+    Split a decoded string the way `iter_file_lines` splits a file.
+
+    Yields:
+        line (tuple): (start_char, end_char, text) of each line or line piece.
+    """
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        for start in range(0, len(line), max_line_chars):
+            piece = line[start : start + max_line_chars]
+            yield offset, offset + len(piece), piece
+            offset += len(piece)
+
+
+def iter_chunks(lines, chunk_size, overlap):
+    """
+    Group lines into overlapping chunks of roughly `chunk_size` characters.
+
+    Consecutive chunks share their trailing lines, up to `overlap` characters.
+
+    Args:
+        lines: Iterable of (start, end, text) from `iter_file_lines` or `iter_text_lines`.
+        chunk_size (int): Target chunk length in characters.
+        overlap (int): Maximum characters shared by consecutive chunks.
+
+    Yields:
+        chunk (tuple): (start, end, text) of each non-empty chunk.
+    """
+    buffer = []
+    size = 0
+    # Whether the buffer holds lines that have not been emitted yet
+    pending = False
+    for line in lines:
+        if pending and size + len(line[2]) > chunk_size:
+            text = "".join(piece for _, _, piece in buffer).strip()
+            if text:
+                yield buffer[0][0], buffer[-1][1], text
+            kept = []
+            kept_size = 0
+            for previous in reversed(buffer):
+                if kept_size + len(previous[2]) > overlap:
+                    break
+                kept.insert(0, previous)
+                kept_size += len(previous[2])
+            buffer, size = kept, kept_size
+        buffer.append(line)
+        size += len(line[2])
+        pending = True
+    if pending:
+        text = "".join(piece for _, _, piece in buffer).strip()
+        if text:
+            yield buffer[0][0], buffer[-1][1], text
+
+
+def spool_upload(uploaded_file, directory):
+    """
+    Copy an upload to a temporary file in fixed-size blocks.
+
+    Args:
+        uploaded_file: File object returned by `st.file_uploader`.
+        directory (str): Directory for the spooled file.
+
+    Returns:
+        path (str): Path of the spooled file.
+    """
+    path = os.path.join(directory, "document")
+    uploaded_file.seek(0)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(uploaded_file, f, READ_BLOCK_BYTES)
+    return path
+
+
+class FileDocumentIndex:
+    """
+    Chunk index over a document spooled to disk, for uploads too large to hold in memory.
+
+    Only chunk byte offsets stay in memory. The full-text index lives in a
+    temporary SQLite FTS5 database, and chunk text is read back through a memory
+    map when it is needed. Temporary files are removed when the index is
+    garbage-collected.
+    """
+
+    def __init__(self, uploaded_file, chunk_size, overlap):
+        self.directory = tempfile.mkdtemp(prefix="document_qa_")
+        weakref.finalize(self, shutil.rmtree, self.directory, True)
+        self.path = spool_upload(uploaded_file, self.directory)
+        self.size_bytes = os.path.getsize(self.path)
+        self.tokenizer = fts_tokenizer()
+        # Flat (start, end) byte offsets of every chunk
+        self.spans = array("Q")
+
+        self.conn = sqlite3.connect(
+            os.path.join(self.directory, "index.sqlite3"), check_same_thread=False
+        )
+        self.conn.execute(
+            f"CREATE VIRTUAL TABLE chunks USING fts5(text, content='', tokenize='{self.tokenizer}')"
+        )
+        # Two-character terms such as "환불" or "go" have no trigram to match
+        self.conn.execute(
+            "CREATE VIRTUAL TABLE short_terms USING fts5(terms, content='', tokenize='unicode61')"
+        )
+        with open(self.path, "rb") as f:
+            lines = iter_file_lines(f, max_line_bytes=chunk_size)
+            batch = []
+            for start, end, text in iter_chunks(lines, chunk_size, overlap):
+                self.spans.extend((start, end))
+                batch.append((len(self.spans) // 2, text))
+                if len(batch) >= INSERT_BATCH:
+                    self._insert(batch)
+                    batch = []
+            self._insert(batch)
+
+    def _insert(self, batch):
+        with self.conn:
+            self.conn.executemany("INSERT INTO chunks (rowid, text) VALUES (?, ?)", batch)
+            self.conn.executemany(
+                "INSERT INTO short_terms (rowid, terms) VALUES (?, ?)",
+                [(rowid, short_terms_text(text)) for rowid, text in batch],
+            )
+
+    def __len__(self):
+        return len(self.spans) // 2
+
+    def chunk(self, chunk_no):
+        """
+        Read one chunk back from the spooled file.
+
+        Args:
+            chunk_no (int): Zero-based chunk number.
+
+        Returns:
+            chunk (str): Decoded chunk text.
+        """
+        start, end = self.spans[chunk_no * 2], self.spans[chunk_no * 2 + 1]
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            raw = mapped[start:end]
+        return "".join(decode_bytes(line) for line in raw.splitlines(keepends=True)).strip()
+
+    def iter_sections(self, section_size):
+        """
+        Yield consecutive, non-overlapping sections of about `section_size` characters.
+        """
+        with open(self.path, "rb") as f:
+            lines = iter_file_lines(f, max_line_bytes=section_size)
+            for _, _, section in iter_chunks(lines, section_size, 0):
+                yield section
+
+    @property
+    def text(self):
+        with open(self.path, "rb") as f:
+            return "".join(text for _, _, text in iter_file_lines(f))
+
+    def search(self, question, k):
+        """
+        Return the chunks most relevant to a question.
+
+        Args:
+            question (str): User question.
+            k (int): Maximum number of chunks.
+
+        Returns:
+            hits (list): List of (chunk_no, chunk, score) tuples in document order.
+        """
+        rankings = []
+        for table, query in (
+            ("chunks", build_fts_query(question, self.tokenizer)),
+            ("short_terms", build_short_term_query(question)),
+        ):
+            if query:
+                rows = self.conn.execute(
+                    f"SELECT rowid, bm25({table}) FROM {table} WHERE {table} MATCH ? "
+                    f"ORDER BY bm25({table}) LIMIT ?",
+                    (query, k),
+                ).fetchall()
+                # bm25() is lower-is-better; flip it to match BM25Index scores
+                rankings.append([(rowid - 1, -score) for rowid, score in rows])
+        results = merge_ranked(rankings, k)
+        if not results:
+            results = [(chunk_no, 0.0) for chunk_no in range(min(k, len(self)))]
+        return [(chunk_no, self.chunk(chunk_no), score) for chunk_no, score in sorted(results)]
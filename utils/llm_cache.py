@@ -0,0 +1,257 @@
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from utils.singleflight import llm_flight
+
+CACHE_PATH = ".cache/llm_cache.sqlite3"
+DEFAULT_MAX_ENTRIES = 5000
+# Requests sampled above this temperature are not cached unless the caller opts in
+DETERMINISTIC_TEMPERATURE = 0.0
+# OpenAI and Anthropic both sample at temperature 1 when none is given
+DEFAULT_TEMPERATURE = 1.0
+
+
+def normalize_messages(messages):
+    """
+    Normalize chat messages so that trivially different prompts share a cache key.
+
+    Args:
+        messages (list): List of {"role", "content"} dictionaries.
+
+    Returns:
+        normalized (list): Messages with NFC-normalized, stripped text content.
+    """
+    normalized = []
+    for message in messages:
+        message = dict(message)
+        if isinstance(message.get("content"), str):
+            content = unicodedata.normalize("NFC", message["content"])
+            message["content"] = content.replace("\r\n", "\n").strip()
+        normalized.append(message)
+    return normalized
+
+
+def _json_default(value):
+    # Pydantic models passed as response_format are keyed on their schema
+    if hasattr(value, "model_json_schema"):
+        return value.model_json_schema()
+    return str(value)
+
+
+def make_key(model, messages, **params):
+    """
+    Build the cache key of an LLM request.
+
+    Args:
+        model (str): Model name.
+        messages (list): Chat messages.
+        **params: Sampling and formatting parameters that change the response.
+
+    Returns:
+        key (str): Hex SHA-256 digest of the request.
+    """
+    payload = json.dumps(
+        {"model": model, "messages": normalize_messages(messages), "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=_json_default,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    On-disk LLM response cache shared by every page and script in the process.
+
+    Entries are evicted least-recently-used once `max_entries` is exceeded, and
+    each caller decides how old an entry it is willing to accept (`ttl`).
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS responses_last_access
+                    ON responses (last_access);
+                CREATE TABLE IF NOT EXISTS stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                """
+            )
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared across Streamlit session threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, conn, name):
+        conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key, ttl=None):
+        """
+        Look up a cached response.
+
+        Args:
+            key (str): Key built by `make_key`.
+            ttl (float): Maximum accepted age in seconds, or None for no limit.
+
+        Returns:
+            value: The cached response, or None on a miss.
+        """
+        now = time.time()
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (ttl is not None and now - row[1] > ttl):
+                self._count(conn, "misses")
+                return None
+            conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._count(conn, "hits")
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """
+        Store a response and evict the least recently used entries over the limit.
+
+        Args:
+            key (str): Key built by `make_key`.
+            value: JSON-serializable response.
+        """
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def get_or_call(
+        self, model, messages, call, ttl=None, cache_nondeterministic=False, scope=None, **params
+    ):
+        """
+        Return the cached response of a request, calling the API on a miss.
+
+        Args:
+            model (str): Model name.
+            messages (list): Chat messages.
+            call (callable): Zero-argument function that performs the request and
+                returns a JSON-serializable response.
+            ttl (float): Maximum accepted age in seconds, or None for no limit.
+            cache_nondeterministic (bool): Cache the response even if it was sampled
+                with a temperature above DETERMINISTIC_TEMPERATURE.
+            scope (str): Who the request is made for, usually
+                `utils.clients.key_fingerprint(api_key)`. Concurrent misses are only
+                shared within a scope, so one key's answer or error never reaches
+                a caller using another key.
+            **params: Parameters that change the response, part of the key.
+
+        Returns:
+            value: The cached or freshly computed response.
+        """
+        temperature = params.get("temperature", DEFAULT_TEMPERATURE)
+        if temperature > DETERMINISTIC_TEMPERATURE and not cache_nondeterministic:
+            with self._connection() as conn:
+                self._count(conn, "bypassed")
+            return call()
+
+        key = make_key(model, messages, **params)
+        value = self.get(key, ttl=ttl)
+        if value is None:
+            # Concurrent misses for the same request and scope share one upstream call
+            flight_key = f"{scope}:{key}" if scope else key
+            value = llm_flight.do(flight_key, lambda: self._call_and_store(key, call))
+        return value
+
+    def _call_and_store(self, key, call):
+        value = call()
+        self.set(key, value)
+        return value
+
+    def stats(self):
+        """
+        Return hit-rate statistics.
+
+        Returns:
+            stats (dict): hits, misses, bypassed, hit_rate and entries.
+        """
+        conn = self._connection()
+        stats = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "bypassed": stats.get("bypassed", 0),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0],
+        }
+
+    def clear(self):
+        """
+        Remove every cached response and reset the statistics.
+        """
+        with self._connection() as conn:
+            conn.execute("DELETE FROM responses")
+            conn.execute("DELETE FROM stats")
+
+
+@functools.lru_cache(maxsize=None)
+def get_llm_cache(path=CACHE_PATH):
+    """
+    Return the process-wide cache for `path`.
+
+    Returns:
+        cache (LLMCache): Shared LLM response cache.
+    """
+    return LLMCache(path)
+
+
+def render_cache_stats(container, cache=None):
+    """
+    Show the cache hit rate in a Streamlit container (e.g. `st.sidebar`).
+
+    Args:
+        container: Streamlit container to render into.
+        cache (LLMCache): Cache to report on, the shared one by default.
+    """
+    stats = (cache or get_llm_cache()).stats()
+    container.metric(
+        "LLM cache hit rate",
+        f"{stats['hit_rate']:.0%}",
+        help=(
+            f"{stats['hits']} hits · {stats['misses']} misses · "
+            f"{stats['bypassed']} not cacheable · {stats['entries']} entries"
+        ),
+    )
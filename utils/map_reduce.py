@@ -0,0 +1,75 @@
+import asyncio
+
+DEFAULT_CONCURRENCY = 4
+# Partial results combined by one reduce prompt
+DEFAULT_FAN_IN = 5
+
+
+async def map_reduce(
+    items,
+    map_fn,
+    reduce_fn,
+    concurrency=DEFAULT_CONCURRENCY,
+    fan_in=DEFAULT_FAN_IN,
+    on_progress=None,
+    on_map_error=None,
+):
+    """
+    Map every item concurrently, then reduce the results hierarchically.
+
+    At most `concurrency` map or reduce calls run at once, so wall-clock time
+    grows with len(items) / concurrency rather than len(items).
+
+    Args:
+        items (list): Inputs of the map step (e.g. document sections).
+        map_fn (coroutine function): `await map_fn(index, item)` -> partial result.
+        reduce_fn (coroutine function): `await reduce_fn(partials)` -> combined result.
+        concurrency (int): Maximum number of calls in flight.
+        fan_in (int): Maximum number of partial results per reduce call.
+        on_progress (callable): Called as `on_progress(stage, done, total, index, result)`
+            each time a map ("map") or reduce ("reduce N") call succeeds.
+        on_map_error (callable): Called as `on_map_error(index, error)` when a map
+            call raises; the item is then left out of the reduce. Without it, the
+            first error is raised.
+
+    Returns:
+        result: The single reduced result (the map result if there is one item), or
+            None if no map call succeeded.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(index, fn, *args, on_error=None):
+        async with semaphore:
+            try:
+                return index, await fn(*args), None
+            except Exception as e:
+                if on_error is None:
+                    raise
+                return index, None, e
+
+    async def run_stage(stage, calls, on_error=None):
+        results = [None] * len(calls)
+        failed = set()
+        tasks = [
+            bounded(index, fn, *args, on_error=on_error) for index, (fn, args) in enumerate(calls)
+        ]
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            index, result, error = await task
+            if error is not None:
+                failed.add(index)
+                on_error(index, error)
+                continue
+            results[index] = result
+            if on_progress:
+                on_progress(stage, done, len(calls), index, result)
+        return [result for index, result in enumerate(results) if index not in failed]
+
+    partials = await run_stage(
+        "map", [(map_fn, (index, item)) for index, item in enumerate(items)], on_map_error
+    )
+    level = 1
+    while len(partials) > 1:
+        groups = [partials[i : i + fan_in] for i in range(0, len(partials), fan_in)]
+        partials = await run_stage(f"reduce {level}", [(reduce_fn, (group,)) for group in groups])
+        level += 1
+    return partials[0] if partials else None
@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+import time
+
+METRICS_PATH = ".cache/metrics.jsonl"
+
+_write_lock = threading.Lock()
+
+
+def log_metrics(event, **fields):
+    """
+    Append one metrics record to the local metrics log.
+
+    Args:
+        event (str): Name of the measured operation.
+        **fields: JSON-serializable measurements.
+    """
+    record = {"event": event, "ts": time.time(), **fields}
+    os.makedirs(os.path.dirname(METRICS_PATH), exist_ok=True)
+    with _write_lock, open(METRICS_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+class StreamTimer:
+    """
+    Wrap a stream of text pieces and time it.
+
+    The clock starts when the wrapper is created unless `started` (a
+    `time.perf_counter()` value taken before the request) is given. `metrics` is
+    complete once the stream is exhausted. The output rate is only reported once
+    `usage["output_tokens"]` is known, e.g. filled in by `iter_openai_text`.
+    """
+
+    def __init__(self, stream, started=None, usage=None):
+        self.stream = stream
+        self.started = started if started is not None else time.perf_counter()
+        self.usage = usage if usage is not None else {}
+        self.first_token_at = None
+        self.finished_at = None
+        self.chunks = 0
+
+    def __iter__(self):
+        for piece in self.stream:
+            if self.first_token_at is None and piece:
+                self.first_token_at = time.perf_counter()
+            self.chunks += 1
+            yield piece
+        self.finished_at = time.perf_counter()
+
+    @property
+    def metrics(self):
+        finished_at = self.finished_at or time.perf_counter()
+        first_token_at = self.first_token_at or finished_at
+        output_tokens = self.usage.get("output_tokens")
+        return {
+            "time_to_first_token": round(first_token_at - self.started, 4),
+            "total_latency": round(finished_at - self.started, 4),
+            "chunks": self.chunks,
+            "output_tokens": output_tokens,
+            "tokens_per_second": tokens_per_second(output_tokens, finished_at - first_token_at),
+        }
+
+
+def tokens_per_second(output_tokens, seconds):
+    """
+    Return the output rate, or None when the token count or time is unknown.
+
+    Args:
+        output_tokens (int): Tokens generated, as reported by the API.
+        seconds (float): Time spent generating them.
+    """
+    if not output_tokens or seconds <= 0:
+        return None
+    return round(output_tokens / seconds, 2)
+
+
+def iter_openai_text(stream, usage=None):
+    """
+    Yield the text deltas of an OpenAI chat completion stream.
+
+    Args:
+        stream: Iterator returned by `chat.completions.create(stream=True)`.
+        usage (dict): Receives "output_tokens" from the final chunk when the
+            request set `stream_options={"include_usage": True}`.
+    """
+    for chunk in stream:
+        if usage is not None and chunk.usage:
+            usage["output_tokens"] = chunk.usage.completion_tokens
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def iter_anthropic_text(stream):
+    """
+    Yield the text pieces of an Anthropic text completion stream.
+
+    Args:
+        stream: Iterator returned by `completions.create(stream=True)`.
+    """
+    for event in stream:
+        if event.completion:
+            yield event.completion
@@ -0,0 +1,217 @@
+import collections
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from utils.metrics import log_metrics
+
+# bcrypt releases the GIL, so threads hash in parallel; one per core keeps a burst of
+# logins from oversubscribing the CPU that every session's reruns also need
+HASH_WORKERS = os.cpu_count() or 1
+# Hashes queued or running before new requests are turned away
+MAX_HASH_QUEUE = 32
+BCRYPT_ROUNDS = 12
+# A user with MAX_FAILED_ATTEMPTS failures from one client within FAILED_ATTEMPT_WINDOW
+# seconds must wait on that client until the oldest one leaves the window
+MAX_FAILED_ATTEMPTS = 5
+FAILED_ATTEMPT_WINDOW = 5 * 60
+# Recent timings kept for the percentiles shown in the sidebar
+TIMING_SAMPLES = 1024
+
+
+class HashQueueFull(Exception):
+    """
+    Too many password hashes are already queued.
+    """
+
+
+class TooManyFailedAttempts(Exception):
+    """
+    The user failed to log in too often recently.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many failed login attempts, try again in {retry_after:.0f} seconds")
+        self.retry_after = retry_after
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+class PasswordHasher:
+    """
+    Bounded worker pool for bcrypt hashing and verification.
+
+    Callers still wait for their own result, but at most HASH_WORKERS hashes run
+    at once and at most `max_queue` wait, so a burst of logins neither starves
+    other sessions of CPU nor builds an unbounded backlog.
+    """
+
+    def __init__(self, workers=HASH_WORKERS, max_queue=MAX_HASH_QUEUE, rounds=BCRYPT_ROUNDS):
+        self.rounds = rounds
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password_hash")
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._lock = threading.Lock()
+        self._queue_waits = collections.deque(maxlen=TIMING_SAMPLES)
+        self._hash_times = collections.deque(maxlen=TIMING_SAMPLES)
+        self.completed = 0
+        self.rejected = 0
+
+    def _run(self, operation, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            log_metrics("password_hash_rejected", operation=operation)
+            raise HashQueueFull("The server is busy, please try again in a moment")
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            result = fn(*args)
+            return result, started - submitted, time.perf_counter() - started
+
+        try:
+            result, queue_wait, hash_time = self._pool.submit(timed).result()
+        finally:
+            self._slots.release()
+        with self._lock:
+            self.completed += 1
+            self._queue_waits.append(queue_wait)
+            self._hash_times.append(hash_time)
+        log_metrics(
+            "password_hash",
+            operation=operation,
+            queue_wait=round(queue_wait, 4),
+            hash_time=round(hash_time, 4),
+        )
+        return result
+
+    def hash(self, password):
+        """
+        Hash a plain-text password.
+
+        Returns:
+            hashed_password (str): bcrypt hash.
+
+        Raises:
+            HashQueueFull: Too many hashes are already queued.
+        """
+        salt = bcrypt.gensalt(self.rounds)
+        return self._run("hash", bcrypt.hashpw, password.encode(), salt).decode()
+
+    def check(self, password, hashed_password):
+        """
+        Check a plain-text password against its hash.
+
+        Returns:
+            valid (bool): Whether the password matches.
+
+        Raises:
+            HashQueueFull: Too many hashes are already queued.
+        """
+        return self._run("check", bcrypt.checkpw, password.encode(), hashed_password.encode())
+
+    def stats(self):
+        """
+        Return hashing counts and recent queue wait and hash time percentiles.
+
+        Returns:
+            stats (dict): completed, rejected, and queue_wait_p50/p95 and
+                hash_time_p50/p95 in seconds.
+        """
+        with self._lock:
+            queue_waits = list(self._queue_waits)
+            hash_times = list(self._hash_times)
+            return {
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "queue_wait_p50": _percentile(queue_waits, 0.5),
+                "queue_wait_p95": _percentile(queue_waits, 0.95),
+                "hash_time_p50": _percentile(hash_times, 0.5),
+                "hash_time_p95": _percentile(hash_times, 0.95),
+            }
+
+
+class FailedAttemptLimiter:
+    """
+    Sliding window of failed login attempts per (user, client), shared by every session.
+
+    Keying on the client keeps someone guessing a password from locking the real
+    user out everywhere. When the client is unknown (None), every such attempt
+    shares the user's window: guessing stays throttled, but failed attempts from
+    anyone can also delay the user's own login until the window passes.
+    """
+
+    def __init__(self, max_attempts=MAX_FAILED_ATTEMPTS, window=FAILED_ATTEMPT_WINDOW):
+        self.max_attempts = max_attempts
+        self.window = window
+        self._failures = {}
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def _recent(self, key, now):
+        failures = self._failures.get(key)
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+        if failures is not None and not failures:
+            del self._failures[key]
+            return None
+        return failures
+
+    def check(self, username, client=None):
+        """
+        Raise if the user must wait before trying again from this client.
+
+        Args:
+            username (str): User logging in.
+            client (str): Client address, or None when it is unknown.
+
+        Raises:
+            TooManyFailedAttempts: With the seconds left until the next attempt.
+        """
+        now = time.monotonic()
+        with self._lock:
+            failures = self._recent((username, client), now)
+            if failures is not None and len(failures) >= self.max_attempts:
+                self.limited += 1
+                raise TooManyFailedAttempts(failures[0] + self.window - now)
+
+    def record_failure(self, username, client=None):
+        now = time.monotonic()
+        with self._lock:
+            failures = self._recent((username, client), now)
+            if failures is None:
+                failures = self._failures[(username, client)] = collections.deque()
+            failures.append(now)
+
+    def reset(self, username, client=None):
+        with self._lock:
+            self._failures.pop((username, client), None)
+
+
+password_hasher = PasswordHasher()
+failed_attempts = FailedAttemptLimiter()
+
+
+def render_password_hash_stats(container, hasher=password_hasher, limiter=failed_attempts):
+    """
+    Show password hashing load: queue wait, hash time and turned-away attempts.
+
+    Args:
+        container: Streamlit container to render into (e.g. `st.sidebar`).
+        hasher (PasswordHasher): Pool to report on.
+        limiter (FailedAttemptLimiter): Limiter to report on.
+    """
+    stats = hasher.stats()
+    container.caption(
+        f"Password hashing: {stats['completed']} done · queue wait p95 "
+        f"{stats['queue_wait_p95'] * 1000:.0f} ms · hash p95 {stats['hash_time_p95'] * 1000:.0f} ms"
+        f" · {stats['rejected']} busy · {limiter.limited} rate-limited"
+    )
@@ -0,0 +1,192 @@
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from cachetools import TTLCache
+
+from utils.bm25 import BM25Index
+from utils.singleflight import SingleFlight
+
+# Search results are shared by every session for half an hour
+SEARCH_CACHE_TTL = 30 * 60
+SEARCH_CACHE_ENTRIES = 1024
+FIXTURE_PATH = "data/search_fixture.json"
+FIXTURE_RESULTS = 3
+# "duckduckgo" searches the web; "fixture" answers from FIXTURE_PATH, for offline runs
+SEARCH_BACKENDS = ("duckduckgo", "fixture")
+DEFAULT_SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "duckduckgo")
+if DEFAULT_SEARCH_BACKEND not in SEARCH_BACKENDS:
+    logging.getLogger(__name__).warning(
+        "Unknown SEARCH_BACKEND %r, using 'duckduckgo' (expected one of %s)",
+        DEFAULT_SEARCH_BACKEND,
+        ", ".join(SEARCH_BACKENDS),
+    )
+    DEFAULT_SEARCH_BACKEND = "duckduckgo"
+SEARCH_DESCRIPTION = (
+    "A wrapper around web search. Useful for when you need to answer questions "
+    "about current events. Input should be a search query."
+)
+NO_RESULT = "No good search result found"
+
+_TRIM_PATTERN = re.compile(r"^[\W_]+|[\W_]+$")
+_SPACE_PATTERN = re.compile(r"\s+")
+
+_current_stats = contextvars.ContextVar("search_stats", default=None)
+
+
+def normalize_query(query):
+    """
+    Normalize a search query into its cache key.
+
+    "Who won the Women's U.S. Open in 2018?" and "who won the women's u.s. open
+    in 2018" share a key.
+
+    Args:
+        query (str): Query written by the agent.
+
+    Returns:
+        key (str): NFC, lowercased, whitespace-collapsed query without outer punctuation.
+    """
+    query = unicodedata.normalize("NFC", query).lower()
+    query = _SPACE_PATTERN.sub(" ", query).strip()
+    return _TRIM_PATTERN.sub("", query)
+
+
+class SearchStats:
+    """
+    Search calls, cache hits and time spent searching during one conversation.
+    """
+
+    def __init__(self):
+        self.searches = 0
+        self.hits = 0
+        self.seconds = 0.0
+
+    def record(self, hit, elapsed):
+        self.searches += 1
+        self.hits += hit
+        self.seconds += elapsed
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.searches if self.searches else 0.0
+
+
+@contextlib.contextmanager
+def track_search_stats(stats):
+    """
+    Record every search made inside the block into `stats`.
+
+    Searching tools are shared by every session, so the conversation is
+    identified through a context variable rather than the tool itself.
+    """
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+class FixtureSearch:
+    """
+    Offline search backend ranking a fixed corpus of results with BM25.
+    """
+
+    def __init__(self, path=FIXTURE_PATH, k=FIXTURE_RESULTS):
+        with open(path, "r", encoding="utf-8") as f:
+            self.results = json.load(f)
+        self.k = k
+        self.index = BM25Index()
+        for result in self.results:
+            self.index.add(f"{result['title']}\n{result['snippet']}")
+
+    def run(self, query):
+        hits = self.index.search(query, k=self.k)
+        if not hits:
+            return NO_RESULT
+        return "\n\n".join(
+            f"{self.results[doc_id]['title']}: {self.results[doc_id]['snippet']} "
+            f"({self.results[doc_id]['url']})"
+            for doc_id, _ in hits
+        )
+
+
+class CachedSearch:
+    """
+    Search function with a process-wide TTL cache keyed on the normalized query.
+
+    Concurrent identical searches from different sessions share one backend call.
+    """
+
+    def __init__(self, search, ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_ENTRIES):
+        self.search = search
+        self._cache = TTLCache(maxsize=max_entries, ttl=ttl)
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def _fetch(self, key, query):
+        result = self.search(query)
+        with self._lock:
+            self._cache[key] = result
+        return result
+
+    def run(self, query):
+        """
+        Search for `query`, answering from the cache when possible.
+
+        Args:
+            query (str): Query written by the agent.
+
+        Returns:
+            result (str): Search results as text.
+        """
+        key = normalize_query(query)
+        started = time.perf_counter()
+        with self._lock:
+            result = self._cache.get(key)
+        hit = result is not None
+        if not hit:
+            result = self._flight.do(key, lambda: self._fetch(key, query))
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.record(hit, time.perf_counter() - started)
+        return result
+
+
+@functools.lru_cache(maxsize=None)
+def get_cached_search(backend=DEFAULT_SEARCH_BACKEND):
+    """
+    Return the process-wide cached search for a backend.
+
+    Args:
+        backend (str): One of SEARCH_BACKENDS.
+
+    Returns:
+        search (CachedSearch): Shared cached search.
+    """
+    if backend == "fixture":
+        return CachedSearch(FixtureSearch().run)
+    if backend == "duckduckgo":
+        from langchain.tools import DuckDuckGoSearchRun
+
+        return CachedSearch(DuckDuckGoSearchRun().run)
+    raise ValueError(f"Unknown search backend: {backend}")
+
+
+def search_tool(backend=DEFAULT_SEARCH_BACKEND):
+    """
+    Return a LangChain tool searching through the shared cache.
+
+    Returns:
+        tool (langchain.tools.Tool): Tool named "Search".
+    """
+    from langchain.tools import Tool
+
+    return Tool(name="Search", func=get_cached_search(backend).run, description=SEARCH_DESCRIPTION)
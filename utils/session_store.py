@@ -0,0 +1,314 @@
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+import zlib
+
+import streamlit as st
+
+SESSION_STORE_PATH = ".cache/sessions.sqlite3"
+# Latest items of each conversation kept in memory; older ones are read on demand
+MEMORY_TAIL_ITEMS = 50
+# Total size of in-memory tails across all sessions before idle ones are spilled
+SESSION_MEMORY_BUDGET_BYTES = 32 << 20
+COMPRESSION_LEVEL = 6
+
+
+def _size(item):
+    return len(json.dumps(item, ensure_ascii=False).encode("utf-8"))
+
+
+def _pack(item):
+    return zlib.compress(json.dumps(item, ensure_ascii=False).encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(blob))
+
+
+class ConversationLog:
+    """
+    Append-only, list-like conversation backed by the session store.
+
+    Every item is written through to disk when it is appended. Only the latest
+    MEMORY_TAIL_ITEMS items stay in memory; indexing, slicing or iterating over
+    older items reads them back from disk, a page at a time when iterating.
+    Items must not be modified after they are appended.
+    """
+
+    def __init__(self, store, conversation_id):
+        self.store = store
+        self.conversation_id = conversation_id
+        self._lock = threading.Lock()
+        self._length = store._count(conversation_id)
+        self._load_tail()
+
+    def _load_tail(self):
+        start = max(self._length - MEMORY_TAIL_ITEMS, 0)
+        self._tail = self.store._load(self.conversation_id, start, self._length)
+        self._tail_start = start
+        self._tail_bytes = sum(_size(item) for item in self._tail)
+        self.last_access = time.monotonic()
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        # Read a page at a time so a partial walk does not load the whole conversation
+        length = self._length
+        for start in range(0, length, MEMORY_TAIL_ITEMS):
+            yield from self[start : min(start + MEMORY_TAIL_ITEMS, length)]
+
+    def __reversed__(self):
+        # Newest first: the in-memory tail, then older pages only if the caller keeps going
+        stop = self._length
+        while stop > 0:
+            start = max(stop - MEMORY_TAIL_ITEMS, 0)
+            yield from reversed(self[start:stop])
+            stop = start
+
+    def __getitem__(self, index):
+        with self._lock:
+            if isinstance(index, int):
+                if index < 0:
+                    index += self._length
+                if not 0 <= index < self._length:
+                    raise IndexError("conversation index out of range")
+                return self._slice(index, index + 1)[0]
+            start, stop, step = index.indices(self._length)
+            if step != 1:
+                return self._slice(0, self._length)[index]
+            return self._slice(start, stop)
+
+    def _slice(self, start, stop):
+        if stop <= start:
+            return []
+        if self._tail_start == self._length and self._length:
+            # Spilled to disk while idle
+            self._load_tail()
+        self.last_access = time.monotonic()
+        if start >= self._tail_start:
+            return self._tail[start - self._tail_start : stop - self._tail_start]
+        older = self.store._load(self.conversation_id, start, min(stop, self._tail_start))
+        return older + self._tail[: max(stop - self._tail_start, 0)]
+
+    def append(self, item):
+        """
+        Append an item (e.g. a chat message) and persist it.
+
+        Args:
+            item (dict): JSON-serializable item.
+        """
+        with self._lock:
+            self.store._append(self.conversation_id, self._length, item)
+            if self._tail_start == self._length:
+                self._tail, self._tail_bytes = [], 0
+                self._tail_start = self._length
+            self._tail.append(item)
+            self._tail_bytes += _size(item)
+            self._length += 1
+            if len(self._tail) > MEMORY_TAIL_ITEMS:
+                dropped = self._tail.pop(0)
+                self._tail_bytes -= _size(dropped)
+                self._tail_start += 1
+            self.last_access = time.monotonic()
+        self.store.enforce_budget()
+
+    @property
+    def memory_bytes(self):
+        return self._tail_bytes
+
+    def spill(self):
+        """
+        Drop the in-memory tail; it is read back from disk on next access.
+
+        Returns:
+            freed (int): Approximate bytes released.
+        """
+        with self._lock:
+            freed = self._tail_bytes
+            self._tail, self._tail_bytes = [], 0
+            self._tail_start = self._length
+            return freed
+
+
+class SessionStore:
+    """
+    Compressed on-disk store of conversations keyed by page, user and session.
+
+    Open conversations share a server-wide memory budget: when their in-memory
+    tails exceed it, the least recently used ones are spilled.
+    """
+
+    def __init__(self, path=SESSION_STORE_PATH, memory_budget=SESSION_MEMORY_BUDGET_BYTES):
+        self.path = path
+        self.memory_budget = memory_budget
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open = weakref.WeakValueDictionary()
+        self.spilled = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS items (
+                    conversation TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (conversation, seq)
+                );
+                """
+            )
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared across Streamlit session threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, conversation_id):
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM items WHERE conversation = ?", (conversation_id,)
+        ).fetchone()[0]
+
+    def _load(self, conversation_id, start, stop):
+        rows = self._connection().execute(
+            "SELECT data FROM items WHERE conversation = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (conversation_id, start, stop),
+        ).fetchall()
+        return [_unpack(row[0]) for row in rows]
+
+    def _append(self, conversation_id, seq, item):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO items (conversation, seq, created_at, data) VALUES (?, ?, ?, ?)",
+                (conversation_id, seq, time.time(), _pack(item)),
+            )
+
+    def open(self, conversation_id):
+        """
+        Return the conversation log for an id, shared by every session that opens it.
+
+        Args:
+            conversation_id (str): "<page>/<user>/<session>".
+
+        Returns:
+            log (ConversationLog): The conversation.
+        """
+        with self._lock:
+            log = self._open.get(conversation_id)
+            if log is None:
+                log = self._open[conversation_id] = ConversationLog(self, conversation_id)
+        return log
+
+    def enforce_budget(self):
+        """
+        Spill the least recently used conversations until memory fits the budget.
+        """
+        with self._lock:
+            logs = list(self._open.values())
+        total = sum(log.memory_bytes for log in logs)
+        for log in sorted(logs, key=lambda log: log.last_access):
+            if total <= self.memory_budget:
+                break
+            if log.memory_bytes:
+                total -= log.spill()
+                self.spilled += 1
+
+    def stats(self):
+        """
+        Return the memory held by open conversations.
+
+        Returns:
+            stats (dict): open conversations, memory_bytes of their tails and
+                spilled (number of spills so far).
+        """
+        with self._lock:
+            logs = list(self._open.values())
+        return {
+            "open": len(logs),
+            "memory_bytes": sum(log.memory_bytes for log in logs),
+            "spilled": self.spilled,
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def get_session_store(path=SESSION_STORE_PATH):
+    """
+    Return the process-wide session store for `path`.
+
+    Returns:
+        store (SessionStore): Shared store.
+    """
+    return SessionStore(path)
+
+
+def current_session_id():
+    """
+    Return this browser tab's session id, kept in the URL so reloads restore it.
+
+    Returns:
+        session_id (str): Session id.
+    """
+    session_id = st.session_state.get("chat_session_id") or st.query_params.get("session")
+    if not session_id:
+        session_id = uuid.uuid4().hex[:16]
+    st.session_state["chat_session_id"] = session_id
+    if st.query_params.get("session") != session_id:
+        st.query_params["session"] = session_id
+    return session_id
+
+
+def load_conversation(page):
+    """
+    Return the persisted conversation of a page for the current user and session.
+
+    Conversations are keyed on the logged-in username as well as the session id,
+    so a shared URL does not open someone else's conversation. Without a login
+    every visitor is "anonymous" and the session id in the URL is the only key:
+    anyone who has the URL can read that conversation.
+
+    Args:
+        page (str): Page name, part of the conversation id.
+
+    Returns:
+        log (ConversationLog): The conversation, restored after a reload.
+    """
+    user = st.session_state.get("username") or "anonymous"
+    conversation_id = f"{page}/{user}/{current_session_id()}"
+    key = f"conversation_{page}"
+    log = st.session_state.get(key)
+    if log is None or log.conversation_id != conversation_id:
+        log = st.session_state[key] = get_session_store().open(conversation_id)
+    return log
+
+
+def start_new_session():
+    """
+    Start new conversations on every page; previous ones stay on disk.
+    """
+    st.session_state["chat_session_id"] = uuid.uuid4().hex[:16]
+    st.query_params["session"] = st.session_state["chat_session_id"]
+
+
+def render_session_stats(container, store=None):
+    """
+    Show the memory held by open conversations.
+
+    Args:
+        container: Streamlit container to render into (e.g. `st.sidebar`).
+        store (SessionStore): Store to report on, the shared one by default.
+    """
+    stats = (store or get_session_store()).stats()
+    container.caption(
+        f"Open conversations: {stats['open']} · {stats['memory_bytes'] / 1024:.0f} KB in memory · "
+        f"{stats['spilled']} spilled"
+    )
@@ -0,0 +1,180 @@
+import threading
+
+
+class _Call:
+    """
+    State of one in-flight call shared by its leader and every waiter.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Stream:
+    """
+    Buffered output of one in-flight streamed call.
+
+    A pump thread appends upstream items; every consumer replays the buffer from
+    the start, so late joiners still see the whole response.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.finished = False
+        self.error = None
+        self.condition = threading.Condition()
+
+    def pump(self, iterator):
+        try:
+            for item in iterator:
+                with self.condition:
+                    self.items.append(item)
+                    self.condition.notify_all()
+        except BaseException as e:
+            self.error = e
+        finally:
+            with self.condition:
+                self.finished = True
+                self.condition.notify_all()
+
+    def replay(self):
+        position = 0
+        while True:
+            with self.condition:
+                while position >= len(self.items) and not self.finished:
+                    self.condition.wait()
+                if position >= len(self.items):
+                    if self.error is not None:
+                        raise self.error
+                    return
+                item = self.items[position]
+            position += 1
+            yield item
+
+
+class SingleFlight:
+    """
+    Coalesce identical in-flight calls within the process.
+
+    Streamlit runs every session in a thread of the same process, so while one
+    session waits on an upstream request, other sessions asking for the same key
+    wait on that request instead of sending their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """
+        Run `fn` once for all concurrent callers with the same key.
+
+        Args:
+            key (str): Identity of the call, e.g. `llm_cache.make_key(...)`.
+            fn (callable): Zero-argument function performing the call.
+
+        Returns:
+            result: The return value of the leader's `fn`.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def do_stream(self, key, fn):
+        """
+        Stream the output of `fn` to all concurrent callers with the same key.
+
+        The upstream stream is consumed by a background thread, so a caller that
+        stops reading early does not stall the others.
+
+        Args:
+            key (str): Identity of the call.
+            fn (callable): Zero-argument function returning an iterator.
+
+        Returns:
+            iterator: The upstream items, replayed for this caller.
+        """
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is None:
+                stream = self._streams[key] = _Stream()
+                self.executed += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if leader:
+            try:
+                iterator = iter(fn())
+            except BaseException as e:
+                with self._lock:
+                    del self._streams[key]
+                with stream.condition:
+                    stream.error = e
+                    stream.finished = True
+                    stream.condition.notify_all()
+                raise
+
+            def pump():
+                stream.pump(iterator)
+                with self._lock:
+                    del self._streams[key]
+
+            threading.Thread(target=pump, daemon=True).start()
+        return stream.replay()
+
+    def stats(self):
+        """
+        Return call counters.
+
+        Returns:
+            stats (dict): Upstream calls executed and duplicate calls saved.
+        """
+        return {"executed": self.executed, "coalesced": self.coalesced}
+
+
+# Shared by every page in front of the OpenAI and Anthropic clients
+llm_flight = SingleFlight()
+
+
+def render_flight_stats(container, flight=llm_flight):
+    """
+    Show how many upstream calls were saved by coalescing.
+
+    Args:
+        container: Streamlit container to render into (e.g. `st.sidebar`).
+        flight (SingleFlight): Flight group to report on.
+    """
+    stats = flight.stats()
+    container.caption(
+        f"Coalesced LLM calls: {stats['coalesced']} saved / "
+        f"{stats['executed']} sent"
+    )
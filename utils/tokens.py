@@ -0,0 +1,249 @@
+import functools
+import itertools
+
+from utils.metrics import log_metrics
+
+CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-3.5-turbo-0613": 4096,
+    "gpt-4": 8192,
+    "claude-2": 100000,
+}
+DEFAULT_CONTEXT_WINDOW = 4096
+DEFAULT_MODEL = "gpt-3.5-turbo"
+# Tokens reserved for the answer when a request sets no max_tokens
+DEFAULT_RESPONSE_TOKENS = 1024
+# Role and separator tokens added by the chat format for every message
+MESSAGE_OVERHEAD_TOKENS = 4
+# Longer texts are estimated instead of tokenized; encoding 1MB takes about a second
+EXACT_COUNT_MAX_CHARS = 100_000
+# Only short texts (messages, questions, instructions) are worth remembering;
+# caching whole documents would pin megabytes per entry
+CACHED_COUNT_MAX_CHARS = 2_000
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model=DEFAULT_MODEL):
+    """
+    Load the tiktoken encoding of an OpenAI model once per process, on first use.
+
+    Args:
+        model (str): Model name.
+
+    Returns:
+        encoding (tiktoken.Encoding or None): None for models tiktoken does not
+            know (e.g. Claude), or if tiktoken or its encoding file is not
+            available, in which case token counts are estimated.
+    """
+    try:
+        import tiktoken
+
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return None
+
+
+def estimate_tokens(text):
+    """
+    Estimate a token count without a tokenizer.
+
+    ASCII text averages about four characters per token, while Hangul and other
+    non-ASCII characters are roughly one token each.
+
+    Args:
+        text (str): Text to measure.
+
+    Returns:
+        tokens (int): Estimated token count.
+    """
+    chars = len(text)
+    # Hangul takes 3 bytes in UTF-8, so every extra 2 bytes is one non-ASCII character
+    non_ascii = min((len(text.encode("utf-8")) - chars) // 2, chars)
+    return (chars - non_ascii + 3) // 4 + non_ascii
+
+
+def _count_tokens(text, model):
+    encoding = get_encoding(model)
+    if encoding is None or len(text) > EXACT_COUNT_MAX_CHARS:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+_count_short_tokens = functools.lru_cache(maxsize=4096)(_count_tokens)
+
+
+def count_tokens(text, model=DEFAULT_MODEL):
+    """
+    Count the tokens of a text, estimating when no tokenizer is available.
+
+    Args:
+        text (str): Text to measure.
+        model (str): Model whose tokenizer to count with.
+
+    Returns:
+        tokens (int): Token count.
+    """
+    if len(text) <= CACHED_COUNT_MAX_CHARS:
+        return _count_short_tokens(text, model)
+    return _count_tokens(text, model)
+
+
+def truncate_tokens(text, max_tokens, model=DEFAULT_MODEL):
+    """
+    Keep the beginning of a text that fits in `max_tokens`.
+
+    Args:
+        text (str): Text to truncate.
+        max_tokens (int): Token limit.
+        model (str): Model whose tokenizer to count with.
+
+    Returns:
+        text (str): The whole text if it fits, otherwise its longest fitting prefix.
+    """
+    if max_tokens <= 0:
+        return ""
+    tokens = count_tokens(text, model)
+    if tokens <= max_tokens:
+        return text
+    encoding = get_encoding(model)
+    if encoding is None or len(text) > EXACT_COUNT_MAX_CHARS:
+        end = len(text) * max_tokens // tokens
+        while end and estimate_tokens(text[:end]) > max_tokens:
+            end = end * 9 // 10
+        return text[:end]
+    # A token can end inside a multi-byte character; drop that partial character
+    prefix = encoding.decode_bytes(encoding.encode(text, disallowed_special=())[:max_tokens])
+    return prefix.decode("utf-8", errors="ignore")
+
+
+def count_message_tokens(messages, model=DEFAULT_MODEL):
+    """
+    Count the tokens of chat messages, including the per-message overhead.
+
+    Args:
+        messages (list): Chat messages with "content" strings.
+        model (str): Model whose tokenizer to count with.
+
+    Returns:
+        tokens (int): Token count of the prompt.
+    """
+    return sum(
+        count_tokens(message.get("content") or "", model) + MESSAGE_OVERHEAD_TOKENS
+        for message in messages
+    )
+
+
+def prompt_budget(model, response_tokens=DEFAULT_RESPONSE_TOKENS, reserved=0):
+    """
+    Return the number of prompt tokens available for a request.
+
+    Args:
+        model (str): Model name.
+        response_tokens (int): Tokens reserved for the answer (max_tokens).
+        reserved (int): Tokens reserved for text outside the measured sections,
+            e.g. instructions or an agent's scaffolding.
+
+    Returns:
+        budget (int): Prompt token budget.
+    """
+    context_window = CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+    return context_window - response_tokens - reserved
+
+
+def fit_sections(sections, budget, model=DEFAULT_MODEL):
+    """
+    Trim prompt sections by priority until they fit in a token budget.
+
+    Sections with the lowest priority are trimmed first, from their end; among
+    equal priorities the later section is trimmed first. A section trimmed to
+    nothing becomes "".
+
+    Args:
+        sections (list): (text, priority) pairs in prompt order.
+        budget (int): Token budget for all sections together.
+        model (str): Model whose tokenizer to count with.
+
+    Returns:
+        texts (list): Fitted section texts, in the same order.
+        tokens (int): Token count of the fitted sections.
+    """
+    texts = [text for text, _ in sections]
+    counts = [count_tokens(text, model) for text in texts]
+    overflow = sum(counts) - budget
+    order = sorted(range(len(sections)), key=lambda i: (sections[i][1], -i))
+    for i in order:
+        if overflow <= 0:
+            break
+        keep = max(counts[i] - overflow, 0)
+        texts[i] = truncate_tokens(texts[i], keep, model)
+        overflow -= counts[i] - count_tokens(texts[i], model)
+        counts[i] = count_tokens(texts[i], model)
+    return texts, sum(counts)
+
+
+def fit_messages(messages, budget, model=DEFAULT_MODEL):
+    """
+    Drop the oldest chat turns until the messages fit in a token budget.
+
+    Leading system messages and the latest message are always kept; the latest
+    message is truncated if it does not fit on its own. Turns are walked from the
+    newest and the walk stops once the budget is full, so older turns of a long
+    conversation are never read.
+
+    Args:
+        messages (list): Chat messages, oldest first (a list or a ConversationLog).
+        budget (int): Token budget for the messages.
+        model (str): Model whose tokenizer to count with.
+
+    Returns:
+        messages (list): The messages that fit, in their original order.
+    """
+    if not len(messages):
+        return []
+    latest = messages[-1]
+    system = []
+    while len(system) < len(messages) - 1 and messages[len(system)]["role"] == "system":
+        system.append(messages[len(system)])
+    tokens = count_message_tokens([*system, latest], model)
+    history = []
+    newest_first = reversed(messages)
+    next(newest_first)
+    for message in itertools.islice(newest_first, len(messages) - 1 - len(system)):
+        message_tokens = count_message_tokens([message], model)
+        if tokens + message_tokens > budget:
+            break
+        history.append(message)
+        tokens += message_tokens
+    history.reverse()
+    overflow = tokens - budget
+    if overflow > 0:
+        content = latest["content"]
+        latest = {
+            **latest,
+            "content": truncate_tokens(content, count_tokens(content, model) - overflow, model),
+        }
+    return [*system, *history, latest]
+
+
+def log_prompt_tokens(event, model, messages, budget):
+    """
+    Log the token count of a request before it is sent.
+
+    Args:
+        event (str): Name of the request (e.g. "document_qa_prompt").
+        model (str): Model name.
+        messages (list): Chat messages about to be sent.
+        budget (int): Prompt token budget the messages were fitted to.
+
+    Returns:
+        tokens (int): Token count of the messages.
+    """
+    tokens = count_message_tokens(messages, model)
+    log_metrics(
+        event,
+        model=model,
+        prompt_tokens=tokens,
+        budget=budget,
+        tokenizer="tiktoken" if get_encoding(model) else "estimate",
+    )
+    return tokens